@@ -9,8 +9,6 @@ cálculo determinista, simulaciones Monte Carlo, visualizaciones y dashboard glo
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import plotly.graph_objects as go
 import plotly.express as px
 import json
@@ -23,10 +21,18 @@ import os
 from modules.data_config import (tabla_tipo_impacto_global, matriz_probabilidad, matriz_impacto,
                                   factor_exposicion, factor_probabilidad, efectividad_controles,
                                   criticidad_límites, textos, PERFILES_BASE) # <-- HIERARCHY_TRANSLATIONS NO SE IMPORTA AQUÍ
-from modules.calculations import clasificar_criticidad, calcular_criticidad, simular_montecarlo, calcular_max_theoretical_risk
-from modules.plotting import create_heatmap, create_pareto_chart, plot_montecarlo_histogram, create_sensitivity_plot
+from modules.calculations import clasificar_criticidad, distribucion_criticidad, calcular_criticidad, simular_montecarlo, calcular_max_theoretical_risk, simular_montecarlo_streaming, simular_montecarlo_paralelo, simular_montecarlo_adaptativo, simular_montecarlo_reduccion_varianza, admite_muestras_por_riesgo, FACTORES_MUESTREADOS_MC, sensibilidad_resultado, simular_portafolio
+from modules.streaming_stats import histograma_precalculado
+from modules.risk_metrics import calcular_metricas_riesgo
+from modules.sim_cache import clave_simulacion, obtener_cache_simulaciones
+from modules.sampling import METODOS_MUESTREO, etiqueta_metodo_muestreo, metodo_muestreo_efectivo
+from modules.plotting import create_heatmap, create_pareto_chart, plot_montecarlo_histogram, create_sensitivity_plot, PARETO_TOP_N
 from modules.utils import reset_form_fields, format_risk_dataframe, get_text, render_impact_sliders # Utilidades
-from modules.profile_manager import load_profiles, save_profiles, get_profile_data, delete_profile, update_profile, add_profile # Gestor de perfiles
+from modules.risk_register import RegistroRiesgos
+from modules.sample_store import AlmacenMuestras
+from modules.risk_import import importar_registro
+from modules.risk_export import FORMATOS_EXPORTACION, exportar_a_bytes, exportar_registro, exportar_muestras
+from modules.profile_manager import load_profiles, refresh_profiles, save_profiles, get_profile_data, delete_profile, update_profile, add_profile # Gestor de perfiles
 
 # --- Configuración de la página ---
 st.set_page_config(layout="wide", page_title="Calculadora de Riesgos Integral", icon="🛡️")
@@ -54,18 +60,11 @@ st.markdown("""
 
 # --- Inicialización de Session State ---
 if 'idioma' not in st.session_state: st.session_state.idioma = 'es'
-if 'riesgos' not in st.session_state:
-    st.session_state.riesgos = pd.DataFrame(columns=[
-        "ID", "Nombre del Riesgo", "Descripción", "Tipo de Impacto",
-        "Probabilidad", "Exposición", "Impacto Numérico General",
-        "Efectividad del Control (%)", "Amenaza Deliberada",
-        "Min Loss USD", "Max Loss USD",
-        "Perfil", "Categoria", "Subcategoria",
-        "Impactos Detallados",
-        "Amenaza Inherente", "Amenaza Residual", "Amenaza Residual Ajustada",
-        "Riesgo Residual", "Clasificación", "Color"
-    ])
-if 'current_edit_index' not in st.session_state: st.session_state.current_edit_index = -1
+if 'registro_riesgos' not in st.session_state: st.session_state.registro_riesgos = RegistroRiesgos()
+registro_riesgos = st.session_state.registro_riesgos
+if 'almacen_muestras' not in st.session_state: st.session_state.almacen_muestras = AlmacenMuestras()
+almacen_muestras = st.session_state.almacen_muestras
+if 'current_edit_index' not in st.session_state: st.session_state.current_edit_index = -1 # ID del riesgo en edición (-1 = ninguno)
 
 # Valores por defecto
 if 'default_type_impact' not in st.session_state: st.session_state['default_type_impact'] = tabla_tipo_impacto_global['Tipo de Impacto'].iloc[0]
@@ -78,6 +77,7 @@ if 'default_max_loss' not in st.session_state: st.session_state['default_max_los
 
 # Gestión de Perfiles Personalizados
 if 'perfiles_usuario' not in st.session_state: st.session_state.perfiles_usuario = load_profiles()
+else: refresh_profiles() # Solo los cambios guardados por otras sesiones
 if 'perfil_seleccionado_user' not in st.session_state: st.session_state.perfil_seleccionado_user = list(st.session_state.perfiles_usuario.keys())[0] if st.session_state.perfiles_usuario else ""
 if 'current_editing_profile' not in st.session_state: st.session_state.current_editing_profile = None
 if 'profile_categories_data' not in st.session_state: st.session_state.profile_categories_data = {}
@@ -179,15 +179,13 @@ with st.sidebar:
                     }
 
                     old_profile_name = st.session_state.current_editing_profile
-                    if old_profile_name and old_profile_name != profile_name_input:
-                        if old_profile_name in st.session_state.perfiles_usuario and old_profile_name not in PERFILES_BASE:
-                            del st.session_state.perfiles_usuario[old_profile_name]
-                    
                     if profile_name_input in st.session_state.perfiles_usuario and old_profile_name != profile_name_input:
                         st.error(get_text("profile_name_exists", context="app"))
                     else:
+                        if old_profile_name and old_profile_name != profile_name_input:
+                            delete_profile(old_profile_name) # Renombrado: solo elimina perfiles que no son base
                         st.session_state.perfiles_usuario[profile_name_input] = updated_profile_data
-                        save_profiles(st.session_state.perfiles_usuario)
+                        save_profiles({profile_name_input: updated_profile_data})
                         st.success(get_text("profile_saved", context="app"))
                         
                         st.session_state.current_editing_profile = None
@@ -322,36 +320,26 @@ with col_form:
                     
                     clasificacion_det, color_det = clasificar_criticidad(riesgo_residual_det, st.session_state.idioma)
 
+                    datos_riesgo = {
+                        "Nombre del Riesgo": risk_name, "Descripción": risk_description, "Tipo de Impacto": selected_type_impact,
+                        "Probabilidad": probabilidad_factor, "Exposición": exposicion_factor, "Impacto Numérico": impacto_numerico_slider,
+                        "Efectividad del Control (%)": control_effectiveness_slider, "Amenaza Deliberada": "Sí" if deliberate_threat_checkbox else "No",
+                        "Min Loss USD": min_loss_input, "Max Loss USD": max_loss_input,
+                        "Perfil": selected_profile_for_input, "Categoria": selected_category_for_input, "Subcategoria": selected_subcategory_for_input,
+                        "Impactos Detallados": severidades_impacto_para_calculo,
+                        "Amenaza Inherente": amenaza_inherente_det, "Amenaza Residual": amenaza_residual_det,
+                        "Amenaza Residual Ajustada": amenaza_residual_ajustada_det,
+                        "Riesgo Residual": riesgo_residual_det, "Clasificación": clasificacion_det, "Color": color_det
+                    }
+
                     # Lógica de Guardar/Actualizar Riesgo
                     if st.session_state.current_edit_index != -1:
-                        idx = st.session_state.current_edit_index
-                        st.session_state.riesgos.loc[idx] = [
-                            st.session_state.riesgos.loc[idx, 'ID'], risk_name, risk_description, selected_type_impact,
-                            probabilidad_factor, exposicion_factor, impacto_numerico_slider,
-                            control_effectiveness_slider, "Sí" if deliberate_threat_checkbox else "No",
-                            min_loss_input, max_loss_input,
-                            selected_profile_for_input, selected_category_for_input, selected_subcategory_for_input,
-                            severidades_impacto_para_calculo, # Guardar el diccionario de impactos
-                            f"{amenaza_inherente_det:.2f}", f"{análisis_residual_det:.2f}", f"{análisis_residual_ajustada_det:.2f}",
-                            riesgo_residual_det, clasificacion_det, color_det
-                        ]
+                        registro_riesgos.actualizar(st.session_state.current_edit_index, datos_riesgo)
                         st.success(f"'{risk_name}' actualizado exitosamente.")
                         st.session_state.current_edit_index = -1
                         reset_form_fields()
                     else:
-                        new_risk_id = len(st.session_state.riesgos) + 1
-                        new_risk = {
-                            "ID": new_risk_id, "Nombre del Riesgo": risk_name, "Descripción": risk_description, "Tipo de Impacto": selected_type_impact,
-                            "Probabilidad": probabilidad_factor, "Exposición": exposicion_factor, "Impacto Numérico": impacto_numerico_slider,
-                            "Efectividad del Control (%)": control_effectiveness_slider, "Amenaza Deliberada": "Sí" if deliberate_threat_checkbox else "No",
-                            "Min Loss USD": min_loss_input, "Max Loss USD": max_loss_input,
-                            "Perfil": selected_profile_for_input, "Categoria": selected_category_for_input, "Subcategoria": selected_subcategory_for_input,
-                            "Impactos Detallados": severidades_impacto_para_calculo,
-                            "Amenaza Inherente": f"{amenaza_inherente_det:.2f}", "Amenaza Residual": f"{análisis_residual_det:.2f}",
-                            "Amenaza Residual Ajustada": f"{análisis_residual_ajustada_det:.2f}",
-                            "Riesgo Residual": riesgo_residual_det, "Clasificación": clasificacion_det, "Color": color_det
-                        }
-                        st.session_state.riesgos = pd.concat([st.session_state.riesgos, pd.DataFrame([new_risk])], ignore_index=True)
+                        registro_riesgos.agregar(datos_riesgo)
                         st.success(get_text("success_risk_added", context="app"))
                         reset_form_fields()
             elif submitted and not valid_loss_range:
@@ -365,9 +353,9 @@ with col_form:
         col1_det, col2_det = st.columns(2)
         with col1_det:
             st.markdown(f"<div class='metric-box'><h3>{get_text('inherent_threat', context='app')}</h3><p>{amenaza_inherente_det:.2f}</p></div>", unsafe_allow_html=True)
-            st.markdown(f"<div class='metric-box'><h3>{get_text('residual_threat', context='app')}</h3><p>{análisis_residual_det:.2f}</p></div>", unsafe_allow_html=True)
+            st.markdown(f"<div class='metric-box'><h3>{get_text('residual_threat', context='app')}</h3><p>{amenaza_residual_det:.2f}</p></div>", unsafe_allow_html=True)
         with col2_det:
-            st.markdown(f"<div class='metric-box'><h3>{get_text('adjusted_residual_threat', context='app')}</h3><p>{análisis_residual_ajustada_det:.2f}</p></div>", unsafe_allow_html=True)
+            st.markdown(f"<div class='metric-box'><h3>{get_text('adjusted_residual_threat', context='app')}</h3><p>{amenaza_residual_ajustada_det:.2f}</p></div>", unsafe_allow_html=True)
             st.markdown(f"<div class='metric-box'><h3>{get_text('residual_risk', context='app')}</h3><p>{riesgo_residual_det:.2f}</p></div>", unsafe_allow_html=True)
         
         st.markdown(f"<p style='text-align: center; font-size: 1.2em; font-weight: bold;'>{get_text('classification', context='app')}: <span style='color:{color_det};'>{clasificacion_det}</span></p>", unsafe_allow_html=True)
@@ -383,13 +371,21 @@ with col_form:
             
     else: st.info("Ingresa los datos del riesgo para ver los resultados deterministas aquí.")
 
+    # Importación masiva de riesgos
+    with st.expander(get_text("import_title", context="app")):
+        archivo_importacion = st.file_uploader(get_text("import_file_label", context="app"), type=["csv", "parquet"], key="import_file")
+        if archivo_importacion is not None and st.button(get_text("import_button", context="app"), key="import_btn"):
+            with st.spinner('Importando riesgos...'):
+                resultado_importacion = importar_registro(archivo_importacion, registro_riesgos, idioma=st.session_state.idioma)
+            st.success(f"{get_text('import_success', context='app')}: {resultado_importacion['importados']:,}")
+            if not resultado_importacion['errores'].empty:
+                st.warning(f"{get_text('import_errors', context='app')}: {len(resultado_importacion['errores']):,}")
+                st.dataframe(resultado_importacion['errores'], hide_index=True, use_container_width=True)
+
     st.markdown("---")
     st.header(get_text("added_risks_title", context="app"))
-    if not st.session_state.riesgos.empty:
-        df_display = st.session_state.riesgos.copy()
-        # Asegurarse de que las columnas necesarias existan
-        for col in ["Perfil", "Categoria", "Subcategoria", "Impactos Detallados"]:
-            if col not in df_display.columns: df_display[col] = ''
+    if len(registro_riesgos) > 0:
+        df_display = registro_riesgos.a_dataframe()
         
         for i, row in df_display.iterrows():
             edit_button_key = f"edit_btn_{row['ID']}"
@@ -397,7 +393,7 @@ with col_form:
             col_btns = st.columns([1,1,10])
             with col_btns[0]:
                 if st.button(get_text("edit_risk", context="app"), key=edit_button_key):
-                    st.session_state.current_edit_index = i
+                    st.session_state.current_edit_index = row['ID']
                     st.session_state.risk_name_input = row['Nombre del Riesgo']
                     st.session_state.risk_description_input = row['Descripción']
                     st.session_state.selected_type_impact = row['Tipo de Impacto']
@@ -420,24 +416,30 @@ with col_form:
             with col_btns[1]:
                 if st.button(get_text("delete_risk", context="app"), key=delete_button_key):
                     if st.warning(get_text("confirm_delete", context="app"), icon="⚠️"):
-                        st.session_state.riesgos = st.session_state.riesgos.drop(i).reset_index(drop=True)
+                        registro_riesgos.eliminar(row['ID'])
                         st.success(get_text("risk_deleted", context="app"))
                         st.rerun()
 
-        st.dataframe(format_risk_dataframe(st.session_state.riesgos, st.session_state.idioma), hide_index=True)
+        st.dataframe(format_risk_dataframe(df_display, st.session_state.idioma), hide_index=True)
         
-        csv_data = st.session_state.riesgos.to_csv(index=False).encode('utf-8')
-        st.download_button(label=get_text("download_excel_button", context="app"), data=csv_data, file_name="riesgos_evaluados.csv", mime="text/csv", help="Descargar los datos de los riesgos evaluados en formato CSV.")
+        # El archivo se genera solo al pedirlo y se conserva mientras el registro no cambie
+        formato_export_registro = st.selectbox(get_text("export_format", context="app"), list(FORMATOS_EXPORTACION), key="export_format_register")
+        if st.button(get_text("export_prepare", context="app"), key="export_register_btn"):
+            st.session_state.exportacion_registro = (registro_riesgos.version, exportar_a_bytes(exportar_registro, df_display, formato=formato_export_registro))
+        exportacion_registro = st.session_state.get('exportacion_registro')
+        if exportacion_registro and exportacion_registro[0] == registro_riesgos.version:
+            contenido, formato_usado, extension, mime = exportacion_registro[1]
+            if formato_usado != formato_export_registro: st.info(get_text("export_fallback_csv", context="app"))
+            st.download_button(label=get_text("download_excel_button", context="app"), data=contenido, file_name=f"riesgos_evaluados.{extension}", mime=mime, help="Descargar los datos de los riesgos evaluados.")
     else: st.info(get_text("no_risks_yet", context="app"))
 
     st.markdown("---")
     st.header(get_text("montecarlo_input_title", context="app"))
 
     # Selección de riesgos para simular
-    risk_names_options = [""] + st.session_state.riesgos['Nombre del Riesgo'].tolist()
+    risk_names_options = [""] + registro_riesgos.columna('Nombre del Riesgo').tolist()
     all_risks_option_name = get_text("all_risks_for_simulation", context="app")
-    risks_for_multiselect = [{"ID": "all", "Nombre del Riesgo": all_risks_option_name}] + st.session_state.riesgos.to_dict('records')
-    risk_names_for_multiselect = [r.get('Nombre del Riesgo', 'N/A') for r in risks_for_multiselect]
+    risk_names_for_multiselect = [all_risks_option_name] + registro_riesgos.columna('Nombre del Riesgo').tolist()
     
     default_multiselect = [get_text("all_risks_for_simulation", context="app")] if get_text("all_risks_for_simulation", context="app") in risk_names_for_multiselect else []
 
@@ -451,10 +453,10 @@ with col_form:
     if st.button(get_text("simulate_button", context="app")) and selected_risks_multiselect:
         risks_to_simulate = []
         if get_text("all_risks_for_simulation", context="app") in selected_risks_multiselect:
-            risks_to_simulate = st.session_state.riesgos.to_dict('records')
+            risks_to_simulate = registro_riesgos.a_registros()
         else:
             selected_names = selected_risks_multiselect
-            risks_to_simulate = [r for r in st.session_state.riesgos.to_dict('records') if r['Nombre del Riesgo'] in selected_names]
+            risks_to_simulate = [r for r in registro_riesgos.a_registros() if r['Nombre del Riesgo'] in selected_names]
 
         if not risks_to_simulate:
             st.warning(get_text("no_risks_to_simulate", context="app"))
@@ -462,19 +464,107 @@ with col_form:
             valor_economico_global = st.session_state.get('global_economic_value', 100000.0)
             num_iteraciones_mc = st.session_state.get('montecarlo_iterations', 10000)
 
-            with st.spinner('Ejecutando simulación Monte Carlo...'):
-                riesgo_residual_sim_data_agg, perdidas_usd_sim_data_agg, correlations_agg, sim_data_per_risk_results = simular_montecarlo(
-                    risks_to_simulate, valor_economico_global, num_iteraciones_mc
-                )
-                
-                if perdidas_usd_sim_data_agg is not None and len(perdidas_usd_sim_data_agg) > 0:
-                    st.session_state.riesgo_residual_sim_data_agg = riesgo_residual_sim_data_agg
-                    st.session_state.perdidas_usd_sim_data_agg = perdidas_usd_sim_data_agg
-                    st.session_state.montecarlo_correlations_agg = correlations_agg
-                    st.session_state.sim_data_per_risk = sim_data_per_risk_results
+            modo_mc = st.session_state.get('montecarlo_mode', 'estandar')
+            if modo_mc != 'streaming' and not admite_muestras_por_riesgo(len(risks_to_simulate), num_iteraciones_mc):
+                # Conservar riesgos x iteraciones muestras no cabe en memoria: solo los agregados del portafolio
+                st.warning(get_text("samples_memory_fallback", context="app"))
+                modo_mc = 'portafolio'
+            if modo_mc == 'streaming':
+                with st.spinner('Ejecutando simulación Monte Carlo (streaming)...'):
+                    resumen_streaming = simular_montecarlo_streaming(risks_to_simulate, valor_economico_global, num_iteraciones_mc,
+                                                                     semilla=st.session_state.get('montecarlo_seed', 42))
+                if resumen_streaming and resumen_streaming['perdidas']:
+                    # En modo streaming no se conservan las muestras, solo las métricas del sketch
+                    for key in ['riesgo_residual_sim_data_agg', 'perdidas_usd_sim_data_agg', 'montecarlo_correlations_agg', 'sim_data_per_risk',
+                                'montecarlo_riesgos_simulados', 'montecarlo_clave_cache']:
+                        st.session_state.pop(key, None)
+                    almacen_muestras.liberar()
+                    st.session_state.pop('exportacion_muestras', None)
+                    st.session_state.montecarlo_metricas = resumen_streaming['metricas_perdidas']
+                    st.session_state.histograma_perdidas = resumen_streaming['histograma_perdidas']
+                    st.session_state.montecarlo_metodo_usado = 'aleatorio'
+                    st.session_state.montecarlo_info_convergencia = None
+                    st.session_state.montecarlo_informe_reduccion = None
                     st.success("Simulación Monte Carlo completada.")
                 else:
                     st.error("No se pudieron generar resultados de Monte Carlo. Verifique los valores de entrada.")
+            elif modo_mc == 'portafolio':
+                with st.spinner('Ejecutando simulación Monte Carlo (portafolio)...'):
+                    riesgo_residual_sim_data_agg, perdidas_usd_sim_data_agg = simular_portafolio(
+                        risks_to_simulate, valor_economico_global, num_iteraciones_mc, semilla=st.session_state.get('montecarlo_seed', 42))
+                if len(perdidas_usd_sim_data_agg) > 0:
+                    # Métricas exactas sobre los agregados; sin muestras por riesgo ni sensibilidad
+                    st.session_state.histograma_perdidas = histograma_precalculado(perdidas_usd_sim_data_agg)
+                    st.session_state.montecarlo_metricas = calcular_metricas_riesgo(perdidas_usd_sim_data_agg)
+                    for key in ['montecarlo_correlations_agg', 'sim_data_per_risk', 'montecarlo_riesgos_simulados', 'montecarlo_clave_cache', 'exportacion_muestras']:
+                        st.session_state.pop(key, None)
+                    st.session_state.riesgo_residual_sim_data_agg, st.session_state.perdidas_usd_sim_data_agg, _, _ = \
+                        almacen_muestras.guardar_resultado((riesgo_residual_sim_data_agg, perdidas_usd_sim_data_agg, None, {}))
+                    st.session_state.montecarlo_metodo_usado = 'aleatorio'
+                    st.session_state.montecarlo_info_convergencia = None
+                    st.session_state.montecarlo_informe_reduccion = None
+                    st.success("Simulación Monte Carlo completada.")
+                else:
+                    st.error("No se pudieron generar resultados de Monte Carlo. Verifique los valores de entrada.")
+            else:
+                with st.spinner('Ejecutando simulación Monte Carlo...'):
+                    semilla_mc = st.session_state.get('montecarlo_seed', 42)
+                    metodo_muestreo_mc = st.session_state.get('montecarlo_sampling_method', 'aleatorio')
+                    metodo_muestreo_elegido = metodo_muestreo_mc
+                    metodo_muestreo_mc = metodo_muestreo_efectivo(metodo_muestreo_mc, FACTORES_MUESTREADOS_MC * len(risks_to_simulate))
+                    if metodo_muestreo_mc != metodo_muestreo_elegido and modo_mc != 'reduccion_varianza':
+                        st.info(get_text("sobol_dimension_fallback", context="app"))
+                    cache_simulaciones = obtener_cache_simulaciones()
+                    clave_cache_mc = clave_simulacion(risks_to_simulate, valor_economico_global, num_iteraciones_mc, semilla_mc,
+                                                      metodo_muestreo=metodo_muestreo_mc)
+                    info_convergencia, informe_reduccion = None, None
+                    if modo_mc == 'adaptativo':
+                        # Modo adaptativo: `num_iteraciones_mc` actúa como techo de iteraciones
+                        objetivo_error = st.session_state.get('montecarlo_target_error_pct', 1.0) / 100.0
+                        resultado_mc, info_convergencia = simular_montecarlo_adaptativo(
+                            risks_to_simulate, valor_economico_global, {'media': objetivo_error, 'cvar95': objetivo_error},
+                            iteraciones_max=num_iteraciones_mc, tiempo_max_s=st.session_state.get('montecarlo_time_limit_s', 30.0),
+                            semilla=semilla_mc, metodo_muestreo=metodo_muestreo_mc
+                        )
+                    elif modo_mc == 'reduccion_varianza':
+                        metodo_muestreo_mc = 'aleatorio' # Las antitéticas usan muestreo pseudoaleatorio
+                        resultado_mc, informe_reduccion = simular_montecarlo_reduccion_varianza(
+                            risks_to_simulate, valor_economico_global, num_iteraciones_mc, semilla=semilla_mc
+                        )
+                    else:
+                        resultado_mc = cache_simulaciones.obtener(clave_cache_mc)
+                    if resultado_mc is None:
+                        resultado_mc = simular_montecarlo_paralelo(
+                            risks_to_simulate, valor_economico_global, num_iteraciones_mc,
+                            semilla=semilla_mc, num_procesos=st.session_state.get('montecarlo_workers', 1),
+                            metodo_muestreo=metodo_muestreo_mc
+                        )
+                        if resultado_mc[1] is not None and len(resultado_mc[1]) > 0:
+                            cache_simulaciones.guardar(clave_cache_mc, resultado_mc)
+                    riesgo_residual_sim_data_agg, perdidas_usd_sim_data_agg, correlations_agg, sim_data_per_risk_results = resultado_mc
+                    
+                    if perdidas_usd_sim_data_agg is not None and len(perdidas_usd_sim_data_agg) > 0:
+                        # Métricas e histograma sobre las muestras float64, una sola vez por simulación;
+                        # los reruns (p. ej. cambio de idioma) reutilizan los resultados
+                        st.session_state.histograma_perdidas = histograma_precalculado(perdidas_usd_sim_data_agg)
+                        st.session_state.montecarlo_metricas = calcular_metricas_riesgo(perdidas_usd_sim_data_agg)
+                        # La sesión conserva las muestras en float32 (o en disco, según el presupuesto)
+                        riesgo_residual_sim_data_agg, perdidas_usd_sim_data_agg, correlations_agg, sim_data_per_risk_results = \
+                            almacen_muestras.guardar_resultado(resultado_mc)
+                        st.session_state.riesgo_residual_sim_data_agg = riesgo_residual_sim_data_agg
+                        st.session_state.perdidas_usd_sim_data_agg = perdidas_usd_sim_data_agg
+                        st.session_state.montecarlo_correlations_agg = correlations_agg
+                        st.session_state.sim_data_per_risk = sim_data_per_risk_results
+                        # La sensibilidad se calcula bajo demanda desde estas muestras (y se añade a la caché)
+                        st.session_state.montecarlo_riesgos_simulados = risks_to_simulate
+                        st.session_state.montecarlo_clave_cache = clave_cache_mc if modo_mc == 'estandar' else None
+                        st.session_state.pop('exportacion_muestras', None)
+                        st.session_state.montecarlo_metodo_usado = metodo_muestreo_mc
+                        st.session_state.montecarlo_info_convergencia = info_convergencia
+                        st.session_state.montecarlo_informe_reduccion = informe_reduccion
+                        st.success("Simulación Monte Carlo completada.")
+                    else:
+                        st.error("No se pudieron generar resultados de Monte Carlo. Verifique los valores de entrada.")
     elif st.button(get_text("simulate_button", context="app")) and not selected_risks_multiselect:
         st.warning(get_text("select_at_least_one_risk", context="app"))
 
@@ -485,33 +575,67 @@ with col_form:
         help="Valor monetario general para la simulación agregada."
     )
     num_iteraciones_mc = st.slider(
-        get_text("num_iterations", context="app"), min_value=1000, max_value=50000, value=st.session_state.get('montecarlo_iterations', 10000),
+        get_text("num_iterations", context="app"), min_value=1000, max_value=1000000, value=st.session_state.get('montecarlo_iterations', 10000),
         step=1000, key="montecarlo_iterations", help="Número de simulaciones para el cálculo Monte Carlo."
     )
+    # Modos de simulación excluyentes: clave de sesión -> clave de texto
+    modos_simulacion_mc = {'estandar': "standard_mode", 'adaptativo': "adaptive_mode",
+                           'reduccion_varianza': "variance_reduction_mode", 'streaming': "streaming_mode"}
+    modo_mc = st.radio(
+        get_text("simulation_mode", context="app"), list(modos_simulacion_mc.keys()),
+        format_func=lambda modo: get_text(modos_simulacion_mc[modo], context="app"), key="montecarlo_mode",
+        help="Adaptativo: simula por lotes hasta la precisión objetivo (las iteraciones actúan como techo). "
+             "Reducción de varianza: antitéticas y variable de control basada en la criticidad determinista. "
+             "Streaming: métricas en flujo (t-digest) sin guardar muestras."
+    )
+    col_seed, col_workers = st.columns(2)
+    with col_seed:
+        st.number_input(
+            get_text("montecarlo_seed", context="app"), min_value=0, value=st.session_state.get('montecarlo_seed', 42), step=1,
+            key="montecarlo_seed", help="La misma semilla reproduce los mismos resultados con cualquier número de procesos."
+        )
+    with col_workers:
+        st.number_input(
+            get_text("montecarlo_workers", context="app"), min_value=1, max_value=os.cpu_count() or 1,
+            value=st.session_state.get('montecarlo_workers', 1), step=1, key="montecarlo_workers",
+            disabled=(modo_mc != 'estandar') # Solo el modo estándar reparte tareas entre procesos
+        )
+    st.selectbox(
+        get_text("sampling_method", context="app"), list(METODOS_MUESTREO.keys()),
+        format_func=lambda metodo: etiqueta_metodo_muestreo(metodo, st.session_state.idioma), key="montecarlo_sampling_method",
+        disabled=modo_mc in ('reduccion_varianza', 'streaming'), # Estos modos usan muestreo pseudoaleatorio
+        help="Sobol y el Hipercubo Latino alcanzan la misma precisión en la cola con muchas menos iteraciones."
+    )
+    if modo_mc == 'adaptativo':
+        col_target, col_time = st.columns(2)
+        with col_target:
+            st.number_input(
+                get_text("adaptive_target_error", context="app"), min_value=0.01, max_value=10.0,
+                value=st.session_state.get('montecarlo_target_error_pct', 1.0), step=0.1, format="%.2f", key="montecarlo_target_error_pct"
+            )
+        with col_time:
+            st.number_input(
+                get_text("adaptive_time_limit", context="app"), min_value=1.0, max_value=600.0,
+                value=st.session_state.get('montecarlo_time_limit_s', 30.0), step=5.0, key="montecarlo_time_limit_s"
+            )
 
     # Histograma de Monte Carlo (Distribución de Pérdida Económica Agregada)
     st.markdown("---")
-    if 'perdidas_usd_sim_data_agg' in st.session_state and len(st.session_state.perdidas_usd_sim_data_agg) > 0:
+    if st.session_state.get('histograma_perdidas') is not None:
         st.header(get_text("economic_loss_distribution_title", context="app"))
-        fig_loss = plot_montecarlo_histogram(st.session_state.perdidas_usd_sim_data_agg, get_text("economic_loss_distribution_title", context="app"), get_text("economic_value_asset", context="app"), st.session_state.idioma)
-        if fig_loss:
-            col_left_hist, col_center_hist, col_right_hist = st.columns([1,3,1])
-            with col_center_hist:
-                st.pyplot(fig_loss)
-                plt.close(fig_loss)
+        fig_loss = plot_montecarlo_histogram(None, get_text("economic_loss_distribution_title", context="app"), get_text("economic_value_asset", context="app"), st.session_state.idioma,
+                                             histograma=st.session_state.histograma_perdidas)
+        if fig_loss: st.plotly_chart(fig_loss, use_container_width=True)
     else: st.info("Ejecuta la simulación Monte Carlo para ver la distribución de pérdidas económicas.")
 
 
 with col_graf:
     # --- Dashboard de Riesgos Global ---
     st.header("Dashboard de Riesgos Global")
-    if not st.session_state.riesgos.empty:
-        df_display = st.session_state.riesgos.copy()
-        # Asegurarse de que las columnas necesarias existan
-        for col in ["Perfil", "Categoria", "Subcategoria", "Impactos Detallados"]:
-            if col not in df_display.columns: df_display[col] = ''
+    if len(registro_riesgos) > 0:
+        agregados_portafolio = registro_riesgos.agregados # Mantenidos de forma incremental en cada alta/edición/baja
         
-        average_risk_residual = df_display['Riesgo Residual'].mean() if 'Riesgo Residual' in df_display.columns else 0.0
+        average_risk_residual = agregados_portafolio.riesgo_promedio()
         avg_classification, avg_color = clasificar_criticidad(average_risk_residual, st.session_state.idioma)
         
         col_dash1, col_dash2 = st.columns(2)
@@ -521,22 +645,25 @@ with col_graf:
         
         with col_dash2:
             st.subheader("Distribución de Criticidad")
-            if 'Clasificacion' in df_display.columns:
-                risk_counts = df_display['Clasificacion'].value_counts().to_frame()
-                st.dataframe(risk_counts, use_container_width=True)
+            risk_counts = agregados_portafolio.distribucion_clasificacion(st.session_state.idioma)
+            risk_counts = risk_counts[risk_counts > 0].to_frame()
+            if not risk_counts.empty: st.dataframe(risk_counts, use_container_width=True)
             else: st.info("No hay suficientes datos para mostrar distribución de criticidad.")
         
         # Mostrar Mapa de Calor y Pareto
         st.markdown("---")
         st.header(get_text("risk_heatmap_title", context="app"))
-        fig_heatmap = create_heatmap(st.session_state.riesgos, matriz_probabilidad, matriz_impacto, st.session_state.idioma)
+        fig_heatmap = create_heatmap(None, matriz_probabilidad, matriz_impacto, st.session_state.idioma,
+                                     agregados_celdas=agregados_portafolio.celdas_mapa_calor())
         if fig_heatmap: st.plotly_chart(fig_heatmap, use_container_width=True)
         else: st.info("Agrega riesgos para generar el mapa de calor.")
 
         st.markdown("---")
         st.header(get_text("risk_pareto_chart_title", context="app"))
-        if not st.session_state.riesgos.empty:
-            fig_pareto = create_pareto_chart(st.session_state.riesgos, st.session_state.idioma)
+        if len(registro_riesgos) > 0:
+            pareto_top_n = st.number_input(get_text("pareto_top_n", context="app"), min_value=1, max_value=500, value=st.session_state.get('pareto_top_n', PARETO_TOP_N), step=1, key="pareto_top_n")
+            fig_pareto = create_pareto_chart(None, st.session_state.idioma, top_n=pareto_top_n,
+                                             agregados_pareto=registro_riesgos.principales_pareto(pareto_top_n))
             if fig_pareto: st.plotly_chart(fig_pareto, use_container_width=True)
         else: st.info("Agrega riesgos para generar el gráfico de Pareto.")
 
@@ -545,32 +672,79 @@ with col_graf:
     st.markdown("---")
     # Resultados y Métricas de Monte Carlo (Agregado)
     st.header(get_text("montecarlo_results_title", context="app"))
-    if 'perdidas_usd_sim_data_agg' in st.session_state and len(st.session_state.perdidas_usd_sim_data_agg) > 0:
-        perdidas_agg = st.session_state.perdidas_usd_sim_data_agg
-        
-        alpha = 0.95
-        sorted_losses = np.sort(perdidas_agg)
-        index_cvar_float = len(sorted_losses) * alpha
-        if index_cvar_float >= len(sorted_losses):
-            cvar_95_val = sorted_losses[-1]
-        else:
-            index_cvar = int(np.floor(index_cvar_float))
-            cvar_95_val = sorted_losses[index_cvar:].mean()
-
+    # Métricas calculadas una sola vez por simulación (una partición de las muestras o el t-digest)
+    metricas_mc = st.session_state.get('montecarlo_metricas')
+    metricas_perdidas = metricas_mc.como_diccionario() if metricas_mc else None
+
+    if metricas_perdidas:
+        st.caption(f"{get_text('sampling_method', context='app')}: {etiqueta_metodo_muestreo(st.session_state.get('montecarlo_metodo_usado', 'aleatorio'), st.session_state.idioma)}")
+        info_convergencia = st.session_state.get('montecarlo_info_convergencia')
+        if info_convergencia:
+            errores_txt = ", ".join(f"{metrica}: {error*100:.2f}%" if np.isfinite(error) else f"{metrica}: —" # Sin lotes suficientes para estimarlo
+                                    for metrica, error in info_convergencia['errores_relativos'].items())
+            estado_txt = get_text("adaptive_converged", context="app") if info_convergencia['convergido'] else get_text("adaptive_not_converged", context="app")
+            st.caption(f"{estado_txt} — {info_convergencia['iteraciones']:,} {get_text('adaptive_iterations_used', context='app')} ({errores_txt})")
         col_mc1, col_mc2 = st.columns(2)
         with col_mc1:
-            st.markdown(f"<div class='metric-box'><h3>{get_text('expected_loss', context='app')}</h3><p>${np.mean(perdidas_agg):,.2f}</p></div>", unsafe_allow_html=True)
-            st.markdown(f"<div class='metric-box'><h3>{get_text('median_loss', context='app')}</h3><p>${np.median(perdidas_agg):,.2f}</p></div>", unsafe_allow_html=True)
-            st.markdown(f"<div class='metric-box'><h3>{get_text('p5_loss', context='app')}</h3><p>${np.percentile(perdidas_agg, 5):,.2f}</p></div>", unsafe_allow_html=True)
+            st.markdown(f"<div class='metric-box'><h3>{get_text('expected_loss', context='app')}</h3><p>${metricas_perdidas['media']:,.2f}</p></div>", unsafe_allow_html=True)
+            st.markdown(f"<div class='metric-box'><h3>{get_text('median_loss', context='app')}</h3><p>${metricas_perdidas['mediana']:,.2f}</p></div>", unsafe_allow_html=True)
+            st.markdown(f"<div class='metric-box'><h3>{get_text('p5_loss', context='app')}</h3><p>${metricas_perdidas['p5']:,.2f}</p></div>", unsafe_allow_html=True)
         with col_mc2:
-            st.markdown(f"<div class='metric-box'><h3>{get_text('p90_loss', context='app')}</h3><p>${np.percentile(perdidas_agg, 90):,.2f}</p></div>", unsafe_allow_html=True)
-            st.markdown(f"<div class='metric-box'><h3>{get_text('max_loss', context='app')}</h3><p>${np.max(perdidas_agg):,.2f}</p></div>", unsafe_allow_html=True)
-            st.markdown(f"<div class='metric-box'><h3>{get_text('cvar_95', context='app')}</h3><p>${cvar_95_val:,.2f}</p></div>", unsafe_allow_html=True)
+            st.markdown(f"<div class='metric-box'><h3>{get_text('p90_loss', context='app')}</h3><p>${metricas_perdidas['p90']:,.2f}</p></div>", unsafe_allow_html=True)
+            st.markdown(f"<div class='metric-box'><h3>{get_text('max_loss', context='app')}</h3><p>${metricas_perdidas['max']:,.2f}</p></div>", unsafe_allow_html=True)
+            st.markdown(f"<div class='metric-box'><h3>{get_text('cvar_95', context='app')}</h3><p>${metricas_perdidas['cvar95']:,.2f}</p></div>", unsafe_allow_html=True)
+
+        st.subheader(get_text("tail_metrics_title", context="app"))
+        st.dataframe(pd.DataFrame(
+            [{get_text("confidence_level", context="app"): f"{nivel*100:g}%", "VaR": f"${var:,.2f}", "CVaR": f"${cvar:,.2f}"}
+             for nivel, var, cvar in metricas_mc.tabla_colas()]
+        ), hide_index=True, use_container_width=True)
+
+        if 'perdidas_usd_sim_data_agg' in st.session_state and len(st.session_state.perdidas_usd_sim_data_agg) > 0:
+            col_export_fmt, col_export_btn = st.columns(2)
+            with col_export_fmt:
+                formato_export_muestras = st.selectbox(get_text("export_format", context="app"), list(FORMATOS_EXPORTACION), key="export_format_samples")
+            with col_export_btn:
+                if st.button(get_text("export_prepare_samples", context="app"), key="export_samples_btn"):
+                    with st.spinner('Exportando muestras...'):
+                        st.session_state.exportacion_muestras = exportar_a_bytes(
+                            exportar_muestras, st.session_state.perdidas_usd_sim_data_agg, st.session_state.riesgo_residual_sim_data_agg,
+                            st.session_state.get('sim_data_per_risk'), formato=formato_export_muestras
+                        )
+            if st.session_state.get('exportacion_muestras'):
+                contenido, formato_usado, extension, mime = st.session_state.exportacion_muestras
+                if formato_usado != formato_export_muestras: st.info(get_text("export_fallback_csv", context="app"))
+                st.download_button(label=get_text("export_download_samples", context="app"), data=contenido, file_name=f"muestras_montecarlo.{extension}", mime=mime)
+
+        if 'riesgo_residual_sim_data_agg' in st.session_state and len(st.session_state.riesgo_residual_sim_data_agg) > 0:
+            st.subheader(get_text("simulated_criticality_distribution", context="app"))
+            distribucion_simulada = distribucion_criticidad(st.session_state.riesgo_residual_sim_data_agg, st.session_state.idioma)
+            st.dataframe(distribucion_simulada.map(lambda p: f"{p*100:.1f}%").to_frame(get_text("probability_label", context="app")), use_container_width=True)
+
+        informe_reduccion = st.session_state.get('montecarlo_informe_reduccion')
+        if informe_reduccion:
+            st.subheader(get_text("variance_reduction_title", context="app"))
+            st.dataframe(pd.DataFrame([
+                {"Métrica": metrica,
+                 "Estimación Cruda": datos['estimacion_cruda'], "IC95 Crudo": f"[{datos['ic95_crudo'][0]:,.6g}, {datos['ic95_crudo'][1]:,.6g}]",
+                 "Estimación Reducida": datos['estimacion'], "IC95 Reducido": f"[{datos['ic95'][0]:,.6g}, {datos['ic95'][1]:,.6g}]",
+                 "Factor de Reducción de Varianza": "∞" if np.isinf(datos['factor_reduccion_varianza']) else f"{datos['factor_reduccion_varianza']:,.2f}"}
+                for metrica, datos in informe_reduccion.items()
+            ]), hide_index=True, use_container_width=True)
 
         st.markdown("---")
         st.header(get_text("sensitivity_analysis_title", context="app"))
-        if 'montecarlo_correlations_agg' in st.session_state and st.session_state.montecarlo_correlations_agg is not None:
+        hay_muestras_por_riesgo = bool(st.session_state.get('sim_data_per_risk')) and st.session_state.get('montecarlo_riesgos_simulados')
+        if (st.session_state.get('montecarlo_correlations_agg') is None and hay_muestras_por_riesgo
+                and st.button(get_text("compute_sensitivity", context="app"), key="compute_sensitivity_btn")):
+            with st.spinner('Calculando análisis de sensibilidad...'):
+                st.session_state.montecarlo_correlations_agg = sensibilidad_resultado(
+                    st.session_state.montecarlo_riesgos_simulados,
+                    (None, st.session_state.perdidas_usd_sim_data_agg, None, st.session_state.sim_data_per_risk))
+                obtener_cache_simulaciones().guardar_sensibilidad(st.session_state.get('montecarlo_clave_cache'),
+                                                                  st.session_state.montecarlo_correlations_agg)
+        if st.session_state.get('montecarlo_correlations_agg') is not None:
             fig_sensitivity = create_sensitivity_plot(st.session_state.montecarlo_correlations_agg, st.session_state.idioma)
             if fig_sensitivity: st.plotly_chart(fig_sensitivity, use_container_width=True)
-        else: st.info("Ejecuta la simulación Monte Carlo para ver el análisis de sensibilidad.")
+        elif not hay_muestras_por_riesgo: st.info("Ejecuta la simulación Monte Carlo para ver el análisis de sensibilidad.")
     else: st.info("Ejecuta la simulación Monte Carlo para ver los resultados aquí.")
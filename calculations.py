@@ -4,16 +4,19 @@ Este módulo contiene la lógica para los cálculos del modelo de riesgo determi
 y la simulación Monte Carlo, incluyendo soporte para múltiples impactos ponderados
 y cálculo de máximo riesgo teórico.
 """
-import streamlit as st
 import pandas as pd
 import numpy as np
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from scipy.special import ndtr
 from typing import Dict, List, Tuple, Any
 
 # --- Importaciones ---
-from modules.data_config import (tabla_tipo_impacto_global, matriz_probabilidad, matriz_impacto,
-                                  factor_exposicion, factor_probabilidad, efectividad_controles,
-                                  criticidad_límites, textos, PERFILES_BASE)
+from modules import data_config
+from modules.data_config import criticidad_límites # Las tablas base se leen de `data_config` al usarlas (construcción diferida)
+from modules.streaming_stats import EstadisticasStreaming, COMPRESION_TDIGEST
+from modules.sampling import crear_generador, metodo_muestreo_efectivo, GeneradorAntitetico
 # HIERARCHY_TRANSLATIONS no se usa directamente aquí, se maneja en app.py/utils.py
 
 # --- Mapeos ---
@@ -24,6 +27,55 @@ factor_exposicion_vals = {
     'Muy Baja': 0.1, 'Baja': 0.3, 'Media': 0.6, 'Alta': 0.9, 'Muy Alta': 1.0
 }
 
+# --- Índice Precompilado de Ponderaciones de Impacto ---
+class IndiceImpactos:
+    """
+    Índice compilado a partir de `tabla_tipo_impacto_global`: cada tipo de impacto recibe un código
+    entero y su ponderación se guarda en un vector, de modo que las búsquedas son un acceso a array.
+    El código -1 (tipo desconocido) apunta a una ponderación 0.
+    """
+    def __init__(self, tabla):
+        self.tabla = tabla
+        self.tipos = [str(tipo) for tipo in tabla['Tipo de Impacto']]
+        self.codigos = {tipo: codigo for codigo, tipo in enumerate(self.tipos)}
+        self.ponderaciones = tabla['Ponderación'].to_numpy(dtype=float)
+        self._ponderaciones_ext = np.append(self.ponderaciones, 0.0)
+
+    def codificar(self, tipos):
+        """Convierte tipos de impacto a códigos enteros (-1 si no existen)."""
+        return np.fromiter((self.codigos.get(tipo, -1) for tipo in tipos), dtype=np.int64)
+
+    def ponderacion(self, tipo):
+        """Ponderación global (0-100) de un tipo de impacto; 0 si no existe."""
+        return self._ponderaciones_ext[self.codigos.get(tipo, -1)]
+
+    def ponderaciones_de(self, tipos):
+        """Vector de ponderaciones para una secuencia de tipos (o de códigos enteros)."""
+        codigos = np.asarray(tipos) if np.issubdtype(np.asarray(tipos).dtype, np.integer) else self.codificar(tipos)
+        return self._ponderaciones_ext[codigos]
+
+    def como_diccionario(self):
+        return dict(zip(self.tipos, self.ponderaciones.tolist()))
+
+_indice_impactos = None
+
+def obtener_indice_impactos():
+    """
+    Devuelve el índice de ponderaciones compilado. Se recompila automáticamente cuando
+    `data_config.tabla_tipo_impacto_global` se reemplaza por otra tabla; tras editarla
+    en el mismo objeto, llamar a `invalidar_indice_impactos()`.
+    """
+    global _indice_impactos
+    tabla_actual = data_config.tabla_tipo_impacto_global
+    if _indice_impactos is None or _indice_impactos.tabla is not tabla_actual:
+        _indice_impactos = IndiceImpactos(tabla_actual)
+    return _indice_impactos
+
+def invalidar_indice_impactos():
+    """Fuerza la recompilación del índice en el próximo uso."""
+    global _indice_impactos
+    _indice_impactos = None
+
 def clasificar_criticidad(valor, idioma="es"):
     """Clasifica un valor numérico de riesgo (0-1) en una categoría y color."""
     for v_min, v_max, clasificacion_es, color, clasificacion_en in criticidad_límites:
@@ -32,6 +84,75 @@ def clasificar_criticidad(valor, idioma="es"):
             else: return clasificacion_en, color
     return "DESCONOCIDO", "#cccccc"
 
+def clasificar_criticidad_vectorizado(valores, idioma="es"):
+    """
+    Clasifica un array de valores de riesgo (0-1) con búsqueda binaria sobre los límites
+    superiores ordenados de `criticidad_límites`, con la misma semántica que `clasificar_criticidad`.
+
+    Returns:
+        tuple: (codigos, etiquetas, colores) como arrays del mismo tamaño que `valores`.
+               El código -1 corresponde a valores fuera de rango ("DESCONOCIDO").
+    """
+    valores = np.asarray(valores, dtype=float)
+    limites_inf = np.array([limite[0] for limite in criticidad_límites], dtype=float)
+    limites_sup = np.array([limite[1] for limite in criticidad_límites], dtype=float)
+    etiquetas = np.array([limite[2] if idioma == "es" else limite[4] for limite in criticidad_límites] + ["DESCONOCIDO"], dtype=object)
+    colores = np.array([limite[3] for limite in criticidad_límites] + ["#cccccc"], dtype=object)
+
+    codigos = np.searchsorted(limites_sup, valores, side='left')
+    codigos_seguros = np.minimum(codigos, len(limites_sup) - 1)
+    fuera_de_rango = (codigos >= len(limites_sup)) | (valores < limites_inf[codigos_seguros]) | np.isnan(valores)
+    codigos = np.where(fuera_de_rango, -1, codigos)
+    return codigos, etiquetas[codigos], colores[codigos]
+
+def distribucion_criticidad(valores, idioma="es"):
+    """
+    Calcula la proporción de valores (p. ej. muestras Monte Carlo del riesgo residual) en cada
+    clase de criticidad.
+
+    Returns:
+        pd.Series: Probabilidad por clasificación, en el orden de `criticidad_límites`.
+    """
+    codigos, _, _ = clasificar_criticidad_vectorizado(valores, idioma)
+    conteos = np.bincount(codigos[codigos >= 0], minlength=len(criticidad_límites))
+    etiquetas = [limite[2] if idioma == "es" else limite[4] for limite in criticidad_límites]
+    return pd.Series(conteos / max(len(codigos), 1), index=etiquetas, dtype=float)
+
+# --- Agrupación en Celdas del Mapa de Calor ---
+BORDES_IMPACTO_MAPA_CALOR = [20, 40, 60, 80] # Límites superiores (inclusive) de las 4 primeras columnas de impacto (0-100)
+
+def celdas_mapa_calor(probabilidades, impactos):
+    """
+    Asigna cada riesgo a una celda de la cuadrícula probabilidad x impacto.
+    Las filas usan los valores de `matriz_probabilidad` como límites superiores inclusive
+    (lo que supere el último va a la última fila) y las columnas `BORDES_IMPACTO_MAPA_CALOR`.
+
+    Returns:
+        np.ndarray: Índice plano de celda (fila * num_columnas + columna) o -1 si el valor es inválido.
+    """
+    probabilidades = np.asarray(probabilidades, dtype=float)
+    impactos = np.asarray(impactos, dtype=float)
+    bordes_probabilidad = data_config.matriz_probabilidad['Valor'].to_numpy(dtype=float)
+    filas = np.minimum(np.digitize(probabilidades, bordes_probabilidad, right=True), len(bordes_probabilidad) - 1)
+    columnas = np.digitize(impactos, BORDES_IMPACTO_MAPA_CALOR, right=True)
+    validos = (probabilidades >= 0) & (probabilidades <= 1) & (impactos >= 0) & (impactos <= 100)
+    return np.where(validos, filas * (len(BORDES_IMPACTO_MAPA_CALOR) + 1) + columnas, -1)
+
+def agregar_celdas_mapa_calor(probabilidades, impactos, valores):
+    """
+    Suma y cuenta `valores` por celda del mapa de calor con `np.bincount`.
+
+    Returns:
+        tuple: (sumas, conteos) como matrices (filas de probabilidad x columnas de impacto).
+    """
+    forma = (len(data_config.matriz_probabilidad), len(BORDES_IMPACTO_MAPA_CALOR) + 1)
+    celdas = celdas_mapa_calor(probabilidades, impactos)
+    validas = celdas >= 0
+    valores = np.asarray(valores, dtype=float)[validas]
+    sumas = np.bincount(celdas[validas], weights=valores, minlength=forma[0] * forma[1])
+    conteos = np.bincount(celdas[validas], minlength=forma[0] * forma[1])
+    return sumas.reshape(forma), conteos.reshape(forma)
+
 def calcular_criticidad(probabilidad_clasificacion, exposicion_clasificacion, amenaza_deliberada_factor, efectividad, severidades_impacto_dict):
     """
     Calcula las métricas de riesgo determinista considerando múltiples tipos de impacto
@@ -57,10 +178,10 @@ def calcular_criticidad(probabilidad_clasificacion, exposicion_clasificacion, am
 
         # Calcular el Impacto Total Ponderado
         impacto_total_ponderado = 0.0
-        ponderaciones_globales = dict(zip(tabla_tipo_impacto_global['Tipo de Impacto'], tabla_tipo_impacto_global['Ponderación']))
+        indice_impactos = obtener_indice_impactos()
 
         for tipo_impacto, severidad_valor in severidades_impacto_dict.items():
-            ponderacion_global = ponderaciones_globales.get(tipo_impacto, 0)
+            ponderacion_global = indice_impactos.ponderacion(tipo_impacto)
             severidad_norm = float(severidad_valor) / 100.0
             ponderacion_norm = float(ponderacion_global) / 100.0
             impacto_ponderado_i = severidad_norm * ponderacion_norm
@@ -81,6 +202,79 @@ def calcular_criticidad(probabilidad_clasificacion, exposicion_clasificacion, am
         print(f"Error en calcular_criticidad: {e}")
         return 0.0, 0.0, 0.0, 0.0
 
+# --- Puntuación Determinista por Lotes ---
+COLUMNAS_METRICAS_CRITICIDAD = ['Amenaza Inherente', 'Amenaza Residual', 'Amenaza Residual Ajustada', 'Riesgo Residual']
+
+def _factores_desde_clasificacion(valores, mapeo, valor_defecto):
+    """Convierte clasificaciones a factores con `mapeo`; los valores ya numéricos se usan tal cual."""
+    serie = pd.Series(valores)
+    if pd.api.types.is_numeric_dtype(serie): return serie.to_numpy(dtype=float)
+    return serie.map(mapeo).fillna(valor_defecto).to_numpy(dtype=float)
+
+def _matriz_severidades(severidades_impacto, tipos_impacto=None):
+    """Normaliza las severidades a una matriz (riesgos x tipos) y la lista de tipos de impacto."""
+    if isinstance(severidades_impacto, pd.DataFrame):
+        return severidades_impacto.fillna(0).to_numpy(dtype=float), list(severidades_impacto.columns)
+    if tipos_impacto is not None:
+        return np.asarray(severidades_impacto, dtype=float).reshape(-1, len(tipos_impacto)), list(tipos_impacto)
+    # Secuencia de diccionarios { 'TipoImpacto': Severidad }
+    df_severidades = pd.DataFrame([dict(d) if isinstance(d, dict) else {} for d in severidades_impacto]).fillna(0)
+    return df_severidades.to_numpy(dtype=float), list(df_severidades.columns)
+
+def calcular_criticidad_batch(probabilidad_clasificacion, exposicion_clasificacion=None, amenaza_deliberada_factor=None,
+                              efectividad=None, severidades_impacto=None, tipos_impacto=None):
+    """
+    Versión vectorizada de `calcular_criticidad` para registros completos.
+
+    Acepta un DataFrame como primer argumento (columnas 'Probabilidad', 'Exposición', 'Amenaza Deliberada',
+    'Efectividad del Control (%)' e 'Impactos Detallados') o arrays por separado.
+
+    Args:
+        probabilidad_clasificacion: Clasificaciones de probabilidad (o factores numéricos), o DataFrame.
+        exposicion_clasificacion: Clasificaciones de exposición (o factores numéricos).
+        amenaza_deliberada_factor: 1/0, True/False o 'Sí'/'No' por riesgo.
+        efectividad: Efectividad del control (0-100) por riesgo.
+        severidades_impacto: Matriz (riesgos x tipos) de severidades 0-100, DataFrame con un tipo de
+            impacto por columna, o secuencia de diccionarios { 'TipoImpacto': Severidad }.
+        tipos_impacto (list, opcional): Nombres de las columnas si `severidades_impacto` es una matriz.
+
+    Returns:
+        pd.DataFrame: Columnas 'Amenaza Inherente', 'Amenaza Residual', 'Amenaza Residual Ajustada'
+                      y 'Riesgo Residual', una fila por riesgo. Vacío en caso de error.
+    """
+    try:
+        if isinstance(probabilidad_clasificacion, pd.DataFrame):
+            df_riesgos = probabilidad_clasificacion
+            probabilidad_clasificacion = df_riesgos['Probabilidad']
+            exposicion_clasificacion = df_riesgos['Exposición']
+            amenaza_deliberada_factor = df_riesgos['Amenaza Deliberada']
+            efectividad = df_riesgos['Efectividad del Control (%)']
+            severidades_impacto = df_riesgos['Impactos Detallados'].tolist()
+            tipos_impacto = None
+
+        probabilidad = _factores_desde_clasificacion(probabilidad_clasificacion, matriz_probabilidad_vals, 0.5)
+        exposicion = _factores_desde_clasificacion(exposicion_clasificacion, factor_exposicion_vals, 0.6)
+        deliberada = pd.Series(amenaza_deliberada_factor).replace({'Sí': 1, 'No': 0}).astype(float).to_numpy()
+        efectividad_factor = np.asarray(efectividad, dtype=float) / 100.0
+
+        # Impacto total ponderado: producto matriz (riesgos x tipos) por vector de ponderaciones
+        matriz_severidades, tipos = _matriz_severidades(severidades_impacto, tipos_impacto)
+        vector_ponderaciones = obtener_indice_impactos().ponderaciones_de(tipos)
+        if matriz_severidades.shape[1] == 0: matriz_severidades = np.zeros((len(probabilidad), 0))
+        impacto_total_ponderado = (matriz_severidades / 100.0) @ (vector_ponderaciones / 100.0)
+
+        amenaza_inherente = probabilidad * exposicion
+        amenaza_residual = amenaza_inherente * (1 - efectividad_factor)
+        amenaza_residual_ajustada = amenaza_residual * (1 + deliberada)
+        riesgo_residual = np.clip(amenaza_residual_ajustada * impacto_total_ponderado, 0, 1)
+
+        return pd.DataFrame(dict(zip(COLUMNAS_METRICAS_CRITICIDAD,
+                                     (amenaza_inherente, amenaza_residual, amenaza_residual_ajustada, riesgo_residual))))
+
+    except Exception as e:
+        print(f"Error en calcular_criticidad_batch: {e}")
+        return pd.DataFrame(columns=COLUMNAS_METRICAS_CRITICIDAD)
+
 def calcular_max_theoretical_risk(probabilidad_clasificacion, exposicion_clasificacion, amenaza_deliberada_factor, efectividad_control_pct, perfil_data, categoria_seleccionada):
     """
     Calcula el máximo riesgo residual teórico posible para una combinación dada de
@@ -101,10 +295,10 @@ def calcular_max_theoretical_risk(probabilidad_clasificacion, exposicion_clasifi
                 severidades_maximas[tipo_impacto] = 100.0
 
         max_impacto_total_ponderado = 0.0
-        ponderaciones_globales = dict(zip(tabla_tipo_impacto_global['Tipo de Impacto'], tabla_tipo_impacto_global['Ponderación']))
+        indice_impactos = obtener_indice_impactos()
 
         for tipo_impacto, severidad_max in severidades_maximas.items():
-            ponderacion_global = ponderaciones_globales.get(tipo_impacto, 0)
+            ponderacion_global = indice_impactos.ponderacion(tipo_impacto)
             severidad_norm = float(severidad_max) / 100.0
             ponderacion_norm = float(ponderacion_global) / 100.0
             impacto_ponderado_i = severidad_norm * ponderacion_norm
@@ -126,105 +320,568 @@ def calcular_max_theoretical_risk(probabilidad_clasificacion, exposicion_clasifi
         print(f"Error en calcular_max_theoretical_risk: {e}")
         return 0.0
 
-def simular_montecarlo(riesgos_para_simular, valor_economico_global, iteraciones=10000):
+# --- Motor Monte Carlo Vectorizado ---
+SIGMA_FACTOR_MC = 0.1 # Sigma para factores (0-1)
+MEMORIA_MAX_MB_MC = 256 # Presupuesto de memoria por bloque para la simulación de portafolio
+BYTES_POR_CELDA_MC = 80 # ~10 arrays float64 temporales por celda (riesgo, iteración)
+MEMORIA_MAX_MB_MUESTRAS_MC = 1024 # Presupuesto para conservar las muestras por riesgo de una simulación
+BYTES_POR_CELDA_MUESTRAS_MC = 120 # 5 factores float64 conservados + copias para gráficos y rangos de Spearman
+FACTORES_MUESTREADOS_MC = 4 # Probabilidad, exposición, efectividad y pérdida
+
+def admite_muestras_por_riesgo(num_riesgos, iteraciones, memoria_max_mb=MEMORIA_MAX_MB_MUESTRAS_MC):
+    """
+    Indica si una simulación que conserva las muestras por riesgo (riesgos x iteraciones) cabe en
+    el presupuesto de memoria. Si no, debe usarse `simular_portafolio` (solo agregados) o
+    `simular_montecarlo_streaming`, cuya memoria no depende del número de riesgos ni de iteraciones.
+    """
+    return num_riesgos * iteraciones * BYTES_POR_CELDA_MUESTRAS_MC <= memoria_max_mb * 1024 * 1024
+
+def _preparar_parametros_montecarlo(riesgos_para_simular, valor_economico_global):
+    """
+    Convierte los registros de riesgo en arrays de parámetros (uno por riesgo)
+    para el motor Monte Carlo vectorizado. Aplica el fallback de rangos de pérdida
+    basado en el riesgo residual determinista.
+    """
+    num_riesgos = len(riesgos_para_simular)
+    params = {clave: np.zeros(num_riesgos) for clave in
+              ('prob', 'exp', 'eff', 'deliberada', 'min_loss', 'max_loss', 'loss_mid', 'loss_std', 'ponderacion')}
+
+    for idx_risk, riesgo in enumerate(riesgos_para_simular):
+        min_loss_usd = riesgo.get('Min Loss USD', 0.0)
+        max_loss_usd = riesgo.get('Max Loss USD', 0.0)
+
+        # Fallback para rangos de pérdida monetaria
+        if min_loss_usd <= 0 and max_loss_usd <= 0:
+            riesgo_residual_det = float(riesgo['Riesgo Residual'])
+            fallback_mid = riesgo_residual_det * valor_economico_global
+            fallback_std = fallback_mid * 0.20
+            if fallback_mid == 0: fallback_std = 1000
+            min_loss_usd = max(0, fallback_mid - fallback_std)
+            max_loss_usd = fallback_mid + fallback_std
+
+        if min_loss_usd > max_loss_usd: min_loss_usd, max_loss_usd = max_loss_usd, min_loss_usd
+
+        params['prob'][idx_risk] = float(riesgo['Probabilidad'])
+        params['exp'][idx_risk] = float(riesgo['Exposición'])
+        params['eff'][idx_risk] = riesgo['Efectividad del Control (%)'] / 100.0
+        params['deliberada'][idx_risk] = 1 if riesgo['Amenaza Deliberada'] == 'Sí' else 0
+        params['min_loss'][idx_risk] = min_loss_usd
+        params['max_loss'][idx_risk] = max_loss_usd
+        params['loss_mid'][idx_risk] = (min_loss_usd + max_loss_usd) / 2
+        params['loss_std'][idx_risk] = (max_loss_usd - min_loss_usd) / 4 if max_loss_usd > min_loss_usd else 0
+
+    params['ponderacion'] = obtener_indice_impactos().ponderaciones_de(
+        [riesgo.get('Tipo de Impacto', 'Económico') for riesgo in riesgos_para_simular])
+    return params
+
+def _muestrear_riesgos(params, valor_economico_global, size, generador=np.random):
+    """
+    Muestrea en bloque los factores de uno o varios riesgos y calcula el riesgo residual
+    y la pérdida en USD con operaciones de arrays.
+
+    Args:
+        params (dict): Parámetros por riesgo; escalares o arrays que se difunden contra `size`.
+        valor_economico_global (float): Valor económico del activo bajo riesgo (USD).
+        size (int | tuple): Forma de las muestras (iteraciones,) o (riesgos, iteraciones).
+        generador: Objeto con método `normal` (np.random o np.random.Generator).
+
+    Returns:
+        tuple: (probabilidad, exposicion, efectividad, perdida_usd, riesgo_residual) como arrays.
+    """
+    probabilidad_sim = np.clip(generador.normal(params['prob'], SIGMA_FACTOR_MC, size), 0.01, 1.0)
+    exposicion_sim = np.clip(generador.normal(params['exp'], SIGMA_FACTOR_MC, size), 0.01, 1.0)
+    efectividad_sim = np.clip(generador.normal(params['eff'], SIGMA_FACTOR_MC, size), 0.0, 1.0)
+    perdida_usd_sim = np.clip(generador.normal(params['loss_mid'], params['loss_std'], size), params['min_loss'], params['max_loss'])
+
+    impacto_norm_sim = np.clip(perdida_usd_sim / valor_economico_global, 0, 1)
+    amenaza_residual_ajustada_sim = probabilidad_sim * exposicion_sim * (1 - efectividad_sim) * (1 + params['deliberada'])
+    riesgo_residual_sim = np.clip(amenaza_residual_ajustada_sim * impacto_norm_sim * (params['ponderacion'] / 100.0), 0, 1)
+
+    return probabilidad_sim, exposicion_sim, efectividad_sim, perdida_usd_sim, riesgo_residual_sim
+
+# --- Sensibilidad por Correlación de Rangos ---
+FACTORES_SENSIBILIDAD = ['Probabilidad', 'Exposición', 'Efectividad', 'Pérdida']
+CLAVES_SENSIBILIDAD = ['prob', 'exp', 'eff', 'loss'] # Prefijos de las muestras por riesgo en `sim_data_per_risk`
+ITERACIONES_MAX_SENSIBILIDAD = 20000 # Iteraciones (submuestra equiespaciada) sobre las que se calculan los rangos
+
+def correlaciones_spearman(factores, objetivo):
+    """
+    Correlación de rangos de Spearman de cada fila de `factores` (k x iteraciones) con `objetivo`.
+    Todas las filas se ordenan en un único `rankdata(axis=1)` (rangos promedio en empates) y las
+    correlaciones salen de un producto matriz-vector sobre los rangos centrados.
+
+    Returns:
+        np.ndarray: k correlaciones en [-1, 1]; NaN para filas constantes.
+    """
+    from scipy.stats import rankdata # scipy.stats es costoso de importar; solo se carga al analizar sensibilidad
+    rangos = rankdata(np.atleast_2d(factores), axis=1)
+    rangos -= rangos.mean(axis=1, keepdims=True)
+    rangos_objetivo = rankdata(objetivo)
+    rangos_objetivo -= rangos_objetivo.mean()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (rangos @ rangos_objetivo) / (np.linalg.norm(rangos, axis=1) * np.linalg.norm(rangos_objetivo))
+
+def sensibilidad_por_riesgo(riesgos_para_simular, probabilidad_sim, exposicion_sim, efectividad_sim, perdidas_usd_sim, perdidas_usd_agg,
+                            iteraciones_max=ITERACIONES_MAX_SENSIBILIDAD):
+    """
+    Sensibilidad de la pérdida agregada a cada factor muestreado de cada riesgo (probabilidad,
+    exposición, efectividad y pérdida propia), como correlación de Spearman con signo.
+    Los rangos se calculan sobre una submuestra equiespaciada de como máximo `iteraciones_max`
+    iteraciones, de modo que el coste no crece con la longitud de la simulación.
+
+    Returns:
+        pd.Series: Correlaciones indexadas por "Riesgo - Factor", ordenadas por magnitud descendente.
+    """
+    paso = max(1, -(-len(perdidas_usd_agg) // iteraciones_max))
+    etiquetas, correlaciones = [], []
+    # Un lote por factor (riesgos x iteraciones submuestreadas) para acotar la memoria de los rangos
+    for factor, muestras in zip(FACTORES_SENSIBILIDAD, (probabilidad_sim, exposicion_sim, efectividad_sim, perdidas_usd_sim)):
+        correlaciones.append(correlaciones_spearman(np.stack([fila[::paso] for fila in muestras]), perdidas_usd_agg[::paso]))
+        etiquetas.extend(f"{idx_risk+1}. {riesgo['Nombre del Riesgo']} - {factor}" for idx_risk, riesgo in enumerate(riesgos_para_simular))
+    correlaciones = pd.Series(np.concatenate(correlaciones), index=etiquetas, dtype=float).dropna()
+    return correlaciones.iloc[np.argsort(-correlaciones.abs().to_numpy(), kind='stable')]
+
+def sensibilidad_resultado(riesgos_para_simular, resultado, iteraciones_max=ITERACIONES_MAX_SENSIBILIDAD):
+    """
+    Sensibilidad (`sensibilidad_por_riesgo`) de un resultado de `simular_montecarlo` y variantes,
+    a partir de sus muestras por riesgo. Se calcula solo cuando se pide el gráfico de tornado.
+    """
+    _, perdidas_usd_agg, _, sim_data_per_risk = resultado
+    if not sim_data_per_risk or perdidas_usd_agg is None or len(perdidas_usd_agg) == 0: return None
+    datos_riesgos = list(sim_data_per_risk.values())
+    factores = [[datos[f"{clave}_{idx_risk}"] for idx_risk, datos in enumerate(datos_riesgos)] for clave in CLAVES_SENSIBILIDAD]
+    return sensibilidad_por_riesgo(riesgos_para_simular, *factores, np.asarray(perdidas_usd_agg), iteraciones_max)
+
+def _ensamblar_resultados_montecarlo(riesgos_para_simular, probabilidad_sim, exposicion_sim, efectividad_sim,
+                                     perdidas_usd_sim, riesgo_residual_sim, iteraciones):
+    """
+    Construye la estructura de retorno de la simulación a partir de las muestras por riesgo
+    (una fila por riesgo): arrays agregados y datos por riesgo. Las correlaciones quedan en None:
+    la sensibilidad se calcula bajo demanda con `sensibilidad_resultado`.
+    """
+    num_riesgos = len(riesgos_para_simular)
+    riesgo_residual_sim_agg = np.sum(riesgo_residual_sim, axis=0) / num_riesgos
+    perdidas_usd_sim_agg = np.sum(perdidas_usd_sim, axis=0)
+
+    sim_data_per_risk = {}
+    for idx_risk, riesgo in enumerate(riesgos_para_simular):
+        sim_data_per_risk[f"Riesgo {idx_risk+1} ({riesgo['Nombre del Riesgo']})"] = {
+            f"prob_{idx_risk}": probabilidad_sim[idx_risk] * 100,
+            f"exp_{idx_risk}": exposicion_sim[idx_risk] * 100,
+            f"eff_{idx_risk}": efectividad_sim[idx_risk] * 100,
+            f"loss_{idx_risk}": perdidas_usd_sim[idx_risk]
+        }
+
+    return riesgo_residual_sim_agg, perdidas_usd_sim_agg, None, sim_data_per_risk
+
+def simular_montecarlo(riesgos_para_simular, valor_economico_global, iteraciones=10000, metodo_muestreo='aleatorio', semilla=None):
     """
     Ejecuta una simulación Monte Carlo para uno o varios riesgos.
     Utiliza parámetros base de probabilidad, exposición, efectividad y rangos de pérdida monetaria.
+    Cada factor se muestrea como un array completo de `iteraciones` valores por riesgo.
+
+    Args:
+        metodo_muestreo (str): 'aleatorio', 'sobol' (cuasi-Monte Carlo) o 'lhs' (Hipercubo Latino).
+        semilla (int, opcional): Semilla del muestreo. None usa el estado global de `np.random`
+            en el método 'aleatorio'.
     """
     if valor_economico_global <= 0 or not riesgos_para_simular:
         return np.array([]), np.array([]), None, {}
 
     try:
-        num_riesgos = len(riesgos_para_simular)
-        riesgo_residual_sim_agg = np.zeros(iteraciones)
-        perdidas_usd_sim_agg = np.zeros(iteraciones)
-        sim_data_per_risk = {}
-
-        sigma_comun_factor = 0.1 # Sigma para factores (0-1)
-
-        for idx_risk, riesgo in enumerate(riesgos_para_simular):
-            probabilidad_base_factor = float(riesgo['Probabilidad'])
-            exposicion_base_factor = float(riesgo['Exposición'])
-            efectividad_base_pct = riesgo['Efectividad del Control (%)']
-            efectividad_base = efectividad_base_pct / 100.0
-            amenaza_deliberada_factor_base = 1 if riesgo['Amenaza Deliberada'] == 'Sí' else 0
-            
-            min_loss_usd = riesgo.get('Min Loss USD', 0.0)
-            max_loss_usd = riesgo.get('Max Loss USD', 0.0)
-
-            # Fallback para rangos de pérdida monetaria
-            if min_loss_usd <= 0 and max_loss_usd <= 0:
-                riesgo_residual_det = float(riesgo['Riesgo Residual'])
-                fallback_mid = riesgo_residual_det * valor_economico_global
-                fallback_std = fallback_mid * 0.20
-                if fallback_mid == 0: fallback_std = 1000
-                min_loss_usd = max(0, fallback_mid - fallback_std)
-                max_loss_usd = fallback_mid + fallback_std
-            
-            if min_loss_usd > max_loss_usd: min_loss_usd, max_loss_usd = max_loss_usd, min_loss_usd
-
-            loss_range_mid = (min_loss_usd + max_loss_usd) / 2
-            loss_range_std = (max_loss_usd - min_loss_usd) / 4 if max_loss_usd > min_loss_usd else 0
-
-            riesgo_residual_sim_risk = np.zeros(iteraciones)
-            perdidas_usd_sim_risk = np.zeros(iteraciones)
-            sim_data_risk_dict = {}
-
-            for i in range(iteraciones):
-                probabilidad_sim = np.clip(np.random.normal(probabilidad_base_factor, sigma_comun_factor), 0.01, 1.0)
-                exposicion_sim = np.clip(np.random.normal(exposicion_base_factor, sigma_comun_factor), 0.01, 1.0)
-                efectividad_sim = np.clip(np.random.normal(efectividad_base, sigma_comun_factor), 0.0, 1.0)
-
-                sim_loss_usd = np.clip(np.random.normal(loss_range_mid, loss_range_std), min_loss_usd, max_loss_usd)
-                perdidas_usd_sim_risk[i] = sim_loss_usd
-                
-                impacto_norm_sim = sim_loss_usd / valor_economico_global if valor_economico_global > 0 else 0
-                impacto_norm_sim = np.clip(impacto_norm_sim, 0, 1)
-
-                tipo_impacto_principal = riesgo.get('Tipo de Impacto', 'Económico')
-                ponderacion_impacto_principal = dict(zip(tabla_tipo_impacto_global['Tipo de Impacto'], tabla_tipo_impacto_global['Ponderación'])).get(tipo_impacto_principal, 0)
-                
-                amenaza_inherente_sim = probabilidad_sim * exposicion_sim
-                amenaza_residual_sim_iter = amenaza_inherente_sim * (1 - efectividad_sim)
-                amenaza_residual_ajustada_sim = amenaza_residual_sim_iter * (1 + amenaza_deliberada_factor_base)
-                
-                riesgo_residual_sim_iter_calc = amenaza_residual_ajustada_sim * impacto_norm_sim * (ponderacion_impacto_principal / 100.0)
-                riesgo_residual_sim_risk[i] = np.clip(riesgo_residual_sim_iter_calc, 0, 1)
-
-                sim_data_risk_dict[f"prob_{idx_risk}"] = probabilidad_sim * 100
-                sim_data_risk_dict[f"exp_{idx_risk}"] = exposicion_sim * 100
-                sim_data_risk_dict[f"eff_{idx_risk}"] = efectividad_sim * 100
-                sim_data_risk_dict[f"loss_{idx_risk}"] = sim_loss_usd
-
-            riesgo_residual_sim_agg += riesgo_residual_sim_risk
-            perdidas_usd_sim_agg += perdidas_usd_sim_risk
-            sim_data_per_risk[f"Riesgo {idx_risk+1} ({riesgo['Nombre del Riesgo']})"] = sim_data_risk_dict
-
-        if num_riesgos > 0: riesgo_residual_sim_agg /= num_riesgos
-        else: riesgo_residual_sim_agg = np.zeros(iteraciones)
-
-        df_sim_agg_final = pd.DataFrame()
-        if sim_data_per_risk:
-            # Promediar los arrays simulados para el análisis de sensibilidad agregado
-            avg_prob_100 = np.mean([data.get('prob_0', np.zeros(iteraciones)) for data in sim_data_per_risk.values() if 'prob_0' in data], axis=0)
-            avg_exp_100 = np.mean([data.get('exp_0', np.zeros(iteraciones)) for data in sim_data_per_risk.values() if 'exp_0' in data], axis=0)
-            avg_eff_100 = np.mean([data.get('eff_0', np.zeros(iteraciones)) for data in sim_data_per_risk.values() if 'eff_0' in data], axis=0)
-
-            df_sim_agg_final = pd.DataFrame({
-                'probabilidad_avg_%': avg_prob_100,
-                'exposicion_avg_%': avg_exp_100,
-                'efectividad_avg_%': avg_eff_100,
-                'perdida_usd_agg': perdidas_usd_sim_agg
-            })
-
-        correlations_agg = pd.Series(dtype=float)
-        if not df_sim_agg_final.empty:
-            valid_cols_agg = [col for col in ['probabilidad_avg_%', 'exposicion_avg_%', 'efectividad_avg_%'] if df_sim_agg_final[col].std() > 0]
-            if valid_cols_agg:
-                correlations_agg = df_sim_agg_final[valid_cols_agg + ['perdida_usd_agg']].corr(method='pearson')['perdida_usd_agg'].drop('perdida_usd_agg').abs().sort_values(ascending=False)
-
-        return riesgo_residual_sim_agg, perdidas_usd_sim_agg, correlations_agg, sim_data_per_risk
+        params = _preparar_parametros_montecarlo(riesgos_para_simular, valor_economico_global)
+        metodo_muestreo = metodo_muestreo_efectivo(metodo_muestreo, FACTORES_MUESTREADOS_MC * len(riesgos_para_simular))
+        if metodo_muestreo == 'aleatorio':
+            generador = np.random if semilla is None else np.random.default_rng(semilla)
+            muestras_por_riesgo = []
+            for idx_risk in range(len(riesgos_para_simular)):
+                params_riesgo = {clave: valores[idx_risk] for clave, valores in params.items()}
+                muestras_por_riesgo.append(_muestrear_riesgos(params_riesgo, valor_economico_global, iteraciones, generador))
+            probabilidad_sim, exposicion_sim, efectividad_sim, perdidas_usd_sim, riesgo_residual_sim = zip(*muestras_por_riesgo)
+        else:
+            # Cuasi-Monte Carlo / LHS: una dimensión por factor y riesgo, un punto por iteración
+            forma = (len(riesgos_para_simular), iteraciones)
+            params_columna = {clave: valores[:, np.newaxis] for clave, valores in params.items()}
+            generador = crear_generador(metodo_muestreo, FACTORES_MUESTREADOS_MC, forma, semilla)
+            probabilidad_sim, exposicion_sim, efectividad_sim, perdidas_usd_sim, riesgo_residual_sim = \
+                _muestrear_riesgos(params_columna, valor_economico_global, forma, generador)
+
+        return _ensamblar_resultados_montecarlo(riesgos_para_simular, probabilidad_sim, exposicion_sim, efectividad_sim,
+                                                perdidas_usd_sim, riesgo_residual_sim, iteraciones)
 
     except Exception as e:
         print(f"Error en simular_montecarlo: {e}")
         return np.array([]), np.array([]), None, None
+
+# --- Ejecución Paralela con Semillas Reproducibles ---
+ITERACIONES_POR_TAREA_MC = 8192 # Tamaño fijo de tarea (potencia de 2 para Sobol): no depende del número de procesos
+
+def _ejecutar_tarea_montecarlo(tarea):
+    """Muestrea la matriz (riesgos x iteraciones) de una tarea con su propio flujo de semilla."""
+    params, valor_economico_global, iteraciones_tarea, semilla_tarea, metodo_muestreo = tarea
+    forma = (len(params['prob']), iteraciones_tarea)
+    generador = crear_generador(metodo_muestreo, FACTORES_MUESTREADOS_MC, forma, semilla_tarea)
+    params_columna = {clave: valores[:, np.newaxis] for clave, valores in params.items()}
+    return _muestrear_riesgos(params_columna, valor_economico_global, forma, generador)
+
+def _crear_tareas_montecarlo(params, valor_economico_global, iteraciones, semilla=None, tamano_tarea=ITERACIONES_POR_TAREA_MC,
+                             metodo_muestreo='aleatorio'):
+    """
+    Divide las iteraciones en tareas de tamaño fijo, cada una con un flujo hijo
+    independiente de `np.random.SeedSequence(semilla)`.
+    """
+    num_tareas = -(-iteraciones // tamano_tarea)
+    semillas_tareas = np.random.SeedSequence(semilla).spawn(num_tareas)
+    return [(params, valor_economico_global, min(tamano_tarea, iteraciones - i * tamano_tarea), semillas_tareas[i], metodo_muestreo)
+            for i in range(num_tareas)]
+
+def simular_montecarlo_paralelo(riesgos_para_simular, valor_economico_global, iteraciones=10000, semilla=None,
+                                num_procesos=None, tamano_tarea=ITERACIONES_POR_TAREA_MC, metodo_muestreo='aleatorio'):
+    """
+    Ejecuta la simulación Monte Carlo repartiendo bloques de iteraciones entre un pool de procesos.
+    Las tareas y sus semillas dependen solo de `semilla`, `iteraciones` y `tamano_tarea`, por lo que
+    la misma semilla produce agregados idénticos bit a bit con cualquier número de procesos.
+
+    Args:
+        semilla (int, opcional): Semilla raíz de `np.random.SeedSequence`. None usa entropía del sistema.
+        num_procesos (int, opcional): Procesos del pool. 1 ejecuta en el proceso actual; None usa todos los núcleos.
+        metodo_muestreo (str): 'aleatorio', 'sobol' o 'lhs'. En los métodos cuasi-aleatorios cada tarea
+            es una secuencia aleatorizada independiente.
+
+    Returns:
+        tuple: Misma estructura que `simular_montecarlo`.
+    """
+    if valor_economico_global <= 0 or not riesgos_para_simular:
+        return np.array([]), np.array([]), None, {}
+
+    try:
+        params = _preparar_parametros_montecarlo(riesgos_para_simular, valor_economico_global)
+        metodo_muestreo = metodo_muestreo_efectivo(metodo_muestreo, FACTORES_MUESTREADOS_MC * len(riesgos_para_simular))
+        tareas = _crear_tareas_montecarlo(params, valor_economico_global, iteraciones, semilla, tamano_tarea, metodo_muestreo)
+
+        if num_procesos == 1 or len(tareas) == 1:
+            resultados_tareas = [_ejecutar_tarea_montecarlo(tarea) for tarea in tareas]
+        else:
+            with ProcessPoolExecutor(max_workers=num_procesos) as executor:
+                resultados_tareas = list(executor.map(_ejecutar_tarea_montecarlo, tareas))
+
+        # Unir las tareas en orden a lo largo del eje de iteraciones
+        muestras = [np.concatenate(factor, axis=1) for factor in zip(*resultados_tareas)]
+        return _ensamblar_resultados_montecarlo(riesgos_para_simular, *muestras, iteraciones)
+
+    except Exception as e:
+        print(f"Error en simular_montecarlo_paralelo: {e}")
+        return np.array([]), np.array([]), None, None
+
+# --- Reducción de Varianza ---
+Z_IC95 = 1.959963984540054 # Cuantil normal para intervalos de confianza al 95%
+TOLERANCIA_VARIANZA_RELATIVA = 1e-12 # Varianza reducida por debajo de esta fracción de la cruda = cero (ruido de coma flotante)
+
+def _esperanza_normal_recortada(media, sigma, limite_inf, limite_sup):
+    """E[clip(X, limite_inf, limite_sup)] en forma cerrada para X ~ N(media, sigma), vectorizado."""
+    media, sigma, limite_inf, limite_sup = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (media, sigma, limite_inf, limite_sup)))
+    sigma_segura = np.where(sigma > 0, sigma, 1.0)
+    alfa = (limite_inf - media) / sigma_segura
+    beta = (limite_sup - media) / sigma_segura
+    phi_alfa, phi_beta = np.exp(-0.5 * alfa ** 2) / np.sqrt(2 * np.pi), np.exp(-0.5 * beta ** 2) / np.sqrt(2 * np.pi)
+    cdf_alfa, cdf_beta = ndtr(alfa), ndtr(beta)
+    esperanza = (limite_inf * cdf_alfa + limite_sup * (1 - cdf_beta)
+                 + media * (cdf_beta - cdf_alfa) + sigma_segura * (phi_alfa - phi_beta))
+    return np.where(sigma > 0, esperanza, np.clip(media, limite_inf, limite_sup))
+
+def _variable_control_criticidad(params, valor_economico_global, probabilidad_sim, exposicion_sim, efectividad_sim, perdidas_usd_sim,
+                                 incluir_impacto=True):
+    """
+    Variable de control: puntuación determinista de `calcular_criticidad` (amenaza residual ajustada
+    por impacto ponderado) evaluada sobre los factores simulados, promediada entre riesgos.
+    Como los factores son independientes, su esperanza exacta es la misma fórmula evaluada en las
+    esperanzas en forma cerrada de cada factor recortado.
+    Sin `incluir_impacto` se omite el término de pérdida: es el control del riesgo residual, que
+    con el término completo coincidiría con el propio estimando (regresión degenerada).
+
+    Returns:
+        tuple: (control por iteración, esperanza exacta del control).
+    """
+    peso_riesgo = (1 + params['deliberada']) * params['ponderacion'] / 100.0
+    amenaza_sim = probabilidad_sim * exposicion_sim * (1 - efectividad_sim) * peso_riesgo[:, np.newaxis]
+    esperanza_prob = _esperanza_normal_recortada(params['prob'], SIGMA_FACTOR_MC, 0.01, 1.0)
+    esperanza_exp = _esperanza_normal_recortada(params['exp'], SIGMA_FACTOR_MC, 0.01, 1.0)
+    esperanza_eff = _esperanza_normal_recortada(params['eff'], SIGMA_FACTOR_MC, 0.0, 1.0)
+    esperanza_amenaza = esperanza_prob * esperanza_exp * (1 - esperanza_eff) * peso_riesgo
+    if not incluir_impacto:
+        return np.mean(amenaza_sim, axis=0), float(np.mean(esperanza_amenaza))
+
+    control = np.mean(amenaza_sim * np.clip(perdidas_usd_sim / valor_economico_global, 0, 1), axis=0)
+    # clip(clip(x, a, b), 0, V) == clip(x, clip(a, 0, V), clip(b, 0, V))
+    esperanza_impacto = _esperanza_normal_recortada(
+        params['loss_mid'], params['loss_std'],
+        np.clip(params['min_loss'], 0, valor_economico_global), np.clip(params['max_loss'], 0, valor_economico_global)
+    ) / valor_economico_global
+    return control, float(np.mean(esperanza_amenaza * esperanza_impacto))
+
+def _estimar_con_reduccion(muestras, control, esperanza_control, antiteticas, usar_control):
+    """
+    Estima la media de `muestras` con el estimador crudo y con el reducido (pares antitéticos
+    y/o variable de control), devolviendo estimaciones, IC95 y el factor de reducción de varianza.
+    """
+    iteraciones = len(muestras)
+    var_cruda = muestras.var(ddof=1) / iteraciones
+    unidades, unidades_control = muestras, control
+    if antiteticas:
+        # Cada par antitético (i, i + mitad) es una observación independiente
+        mitad = iteraciones // 2
+        unidades = (muestras[:mitad] + muestras[mitad:2 * mitad]) / 2
+        unidades_control = (control[:mitad] + control[mitad:2 * mitad]) / 2
+    if usar_control and unidades_control.var() > 0:
+        beta = np.cov(unidades, unidades_control)[0, 1] / unidades_control.var(ddof=1)
+        unidades = unidades - beta * (unidades_control - esperanza_control)
+    var_reducida = unidades.var(ddof=1) / len(unidades)
+    if var_reducida <= TOLERANCIA_VARIANZA_RELATIVA * var_cruda:
+        var_reducida = 0.0 # Residuo de redondeo: la reducción eliminó la varianza
+
+    media_cruda, media_reducida = float(muestras.mean()), float(unidades.mean())
+    return {
+        'estimacion_cruda': media_cruda,
+        'ic95_crudo': (media_cruda - Z_IC95 * np.sqrt(var_cruda), media_cruda + Z_IC95 * np.sqrt(var_cruda)),
+        'estimacion': media_reducida,
+        'ic95': (media_reducida - Z_IC95 * np.sqrt(var_reducida), media_reducida + Z_IC95 * np.sqrt(var_reducida)),
+        'factor_reduccion_varianza': float(var_cruda / var_reducida) if var_reducida > 0 else (np.inf if var_cruda > 0 else 1.0)
+    }
+
+def simular_montecarlo_reduccion_varianza(riesgos_para_simular, valor_economico_global, iteraciones=10000, semilla=None,
+                                          antiteticas=True, variable_control=True):
+    """
+    Ejecuta la simulación con variables antitéticas para las normales de los factores y/o un
+    estimador de variable de control basado en la puntuación determinista de criticidad
+    (para el riesgo residual, sin el término de pérdida).
+
+    Returns:
+        tuple: (resultado, informe). `resultado` tiene la misma estructura que `simular_montecarlo`;
+               `informe` contiene, para 'perdida_usd' y 'riesgo_residual', las estimaciones cruda y
+               reducida de la media, sus IC95 y el factor de reducción de varianza.
+    """
+    if valor_economico_global <= 0 or not riesgos_para_simular:
+        return (np.array([]), np.array([]), None, {}), {}
+
+    try:
+        if antiteticas: iteraciones += iteraciones % 2 # Pares completos
+        params = _preparar_parametros_montecarlo(riesgos_para_simular, valor_economico_global)
+        forma = (len(riesgos_para_simular), iteraciones)
+        params_columna = {clave: valores[:, np.newaxis] for clave, valores in params.items()}
+        generador = np.random.default_rng(semilla)
+        if antiteticas: generador = GeneradorAntitetico(generador)
+
+        probabilidad_sim, exposicion_sim, efectividad_sim, perdidas_usd_sim, riesgo_residual_sim = \
+            _muestrear_riesgos(params_columna, valor_economico_global, forma, generador)
+        resultado = _ensamblar_resultados_montecarlo(riesgos_para_simular, probabilidad_sim, exposicion_sim, efectividad_sim,
+                                                     perdidas_usd_sim, riesgo_residual_sim, iteraciones)
+
+        muestras_factores = (probabilidad_sim, exposicion_sim, efectividad_sim, perdidas_usd_sim)
+        control, esperanza_control = _variable_control_criticidad(params, valor_economico_global, *muestras_factores)
+        control_residual, esperanza_control_residual = _variable_control_criticidad(params, valor_economico_global, *muestras_factores,
+                                                                                    incluir_impacto=False)
+        informe = {
+            'perdida_usd': _estimar_con_reduccion(resultado[1], control, esperanza_control, antiteticas, variable_control),
+            'riesgo_residual': _estimar_con_reduccion(resultado[0], control_residual, esperanza_control_residual,
+                                                      antiteticas, variable_control)
+        }
+        return resultado, informe
+
+    except Exception as e:
+        print(f"Error en simular_montecarlo_reduccion_varianza: {e}")
+        return (np.array([]), np.array([]), None, None), {}
+
+# --- Parada Adaptativa por Convergencia ---
+OBJETIVOS_CONVERGENCIA_MC = {'media': 0.01, 'cvar95': 0.02} # Error estándar relativo objetivo por métrica
+LOTES_MINIMOS_MC = 4 # Lotes mínimos antes de evaluar la convergencia (medias por lotes)
+LOTES_POR_TECHO_MC = 32 # Lotes en que se divide el techo de iteraciones si no se fija `tamano_lote`
+TAMANO_LOTE_MINIMO_MC = 128
+
+def _cvar_muestral(perdidas, alpha=0.95):
+    """CVaR empírico: media de las pérdidas desde el índice floor(n * alpha) de la muestra ordenada."""
+    indice = int(np.floor(len(perdidas) * alpha))
+    if indice >= len(perdidas): return float(np.max(perdidas))
+    return float(np.partition(perdidas, indice)[indice:].mean())
+
+def _tamano_lote_adaptativo(iteraciones_max):
+    """
+    Tamaño de lote derivado del techo: potencia de 2 (apta para Sobol) cercana a
+    `iteraciones_max / LOTES_POR_TECHO_MC`, acotada a [TAMANO_LOTE_MINIMO_MC, ITERACIONES_POR_TAREA_MC],
+    de modo que la convergencia se evalúa mucho antes de alcanzar el techo.
+    """
+    objetivo = max(iteraciones_max // LOTES_POR_TECHO_MC, 1)
+    return int(min(max(1 << (objetivo.bit_length() - 1), TAMANO_LOTE_MINIMO_MC), ITERACIONES_POR_TAREA_MC))
+
+def _errores_relativos_lotes(estimaciones_lotes, tamanos_lotes):
+    """
+    Error estándar relativo por medias de lotes para cada métrica. Cada lote pesa según su
+    número de iteraciones (el último puede estar recortado por el techo); con lotes iguales
+    coincide con `std(ddof=1) / sqrt(lotes)`.
+    """
+    pesos = np.asarray(tamanos_lotes, dtype=float)
+    pesos /= pesos.sum()
+    num_lotes = len(pesos)
+    errores = {}
+    for metrica, estimaciones in estimaciones_lotes.items():
+        estimaciones = np.asarray(estimaciones)
+        media = np.dot(pesos, estimaciones)
+        error_estandar = np.sqrt(num_lotes / (num_lotes - 1) * np.dot(pesos ** 2, (estimaciones - media) ** 2))
+        errores[metrica] = float(error_estandar / abs(media)) if media != 0 else (0.0 if error_estandar == 0 else np.inf)
+    return errores
+
+def simular_montecarlo_adaptativo(riesgos_para_simular, valor_economico_global, objetivos=OBJETIVOS_CONVERGENCIA_MC,
+                                  iteraciones_max=1000000, tiempo_max_s=30.0, semilla=None,
+                                  tamano_lote=None, metodo_muestreo='aleatorio'):
+    """
+    Ejecuta la simulación por lotes y se detiene cuando el error estándar relativo de cada métrica
+    de `objetivos` ('media' de la pérdida y/o 'cvar95', estimados por medias de lotes) alcanza su
+    objetivo, o al llegar al techo de iteraciones o de tiempo. Sin `tamano_lote`, el tamaño de
+    lote se deriva del techo (`_tamano_lote_adaptativo`).
+    Cada lote usa el siguiente hijo de `np.random.SeedSequence(semilla)`, igual que las tareas de
+    `simular_montecarlo_paralelo`, por lo que la misma semilla reproduce los mismos lotes.
+
+    Returns:
+        tuple: (resultado, info_convergencia). `resultado` tiene la misma estructura que
+               `simular_montecarlo`; `info_convergencia` es un dict con 'iteraciones', 'lotes',
+               'errores_relativos', 'convergido', 'motivo_parada' y 'tiempo_s'.
+    """
+    if valor_economico_global <= 0 or not riesgos_para_simular:
+        return (np.array([]), np.array([]), None, {}), {}
+
+    try:
+        inicio = time.perf_counter()
+        params = _preparar_parametros_montecarlo(riesgos_para_simular, valor_economico_global)
+        metodo_muestreo = metodo_muestreo_efectivo(metodo_muestreo, FACTORES_MUESTREADOS_MC * len(riesgos_para_simular))
+        secuencia_raiz = np.random.SeedSequence(semilla)
+        resultados_lotes = []
+        estimaciones_lotes = {metrica: [] for metrica in objetivos}
+        errores_relativos = {metrica: np.inf for metrica in objetivos}
+        tamanos_lotes = []
+        tamano_lote = tamano_lote or _tamano_lote_adaptativo(iteraciones_max)
+        iteraciones_usadas = 0
+        motivo_parada = 'iteraciones'
+
+        while iteraciones_usadas < iteraciones_max:
+            iteraciones_lote = min(tamano_lote, iteraciones_max - iteraciones_usadas)
+            semilla_lote = secuencia_raiz.spawn(1)[0]
+            muestras_lote = _ejecutar_tarea_montecarlo((params, valor_economico_global, iteraciones_lote, semilla_lote, metodo_muestreo))
+            resultados_lotes.append(muestras_lote)
+            iteraciones_usadas += iteraciones_lote
+            tamanos_lotes.append(iteraciones_lote)
+
+            perdidas_lote = muestras_lote[3].sum(axis=0)
+            if 'media' in estimaciones_lotes: estimaciones_lotes['media'].append(perdidas_lote.mean())
+            if 'cvar95' in estimaciones_lotes: estimaciones_lotes['cvar95'].append(_cvar_muestral(perdidas_lote, 0.95))
+
+            if len(resultados_lotes) >= LOTES_MINIMOS_MC:
+                errores_relativos = _errores_relativos_lotes(estimaciones_lotes, tamanos_lotes)
+                if all(errores_relativos[metrica] <= objetivo for metrica, objetivo in objetivos.items()):
+                    motivo_parada = 'precision'
+                    break
+            if time.perf_counter() - inicio >= tiempo_max_s:
+                motivo_parada = 'tiempo'
+                break
+
+        muestras = [np.concatenate(factor, axis=1) for factor in zip(*resultados_lotes)]
+        resultado = _ensamblar_resultados_montecarlo(riesgos_para_simular, *muestras, iteraciones_usadas)
+        info_convergencia = {
+            'iteraciones': iteraciones_usadas,
+            'lotes': len(resultados_lotes),
+            'errores_relativos': errores_relativos,
+            'convergido': motivo_parada == 'precision',
+            'motivo_parada': motivo_parada,
+            'tiempo_s': time.perf_counter() - inicio
+        }
+        return resultado, info_convergencia
+
+    except Exception as e:
+        print(f"Error en simular_montecarlo_adaptativo: {e}")
+        return (np.array([]), np.array([]), None, None), {}
+
+def _tamano_bloque_iteraciones(num_riesgos, iteraciones, memoria_max_mb=MEMORIA_MAX_MB_MC):
+    """Calcula cuántas iteraciones caben en un bloque (riesgos x iteraciones) dentro del presupuesto de memoria."""
+    celdas_max = int(memoria_max_mb * 1024 * 1024) // (BYTES_POR_CELDA_MC * max(num_riesgos, 1))
+    return int(min(iteraciones, max(1, celdas_max)))
+
+def _iterar_bloques_portafolio(riesgos_para_simular, valor_economico_global, iteraciones, memoria_max_mb=MEMORIA_MAX_MB_MC, semilla=None):
+    """
+    Genera bloques de iteraciones de la matriz (riesgos x iteraciones) del portafolio.
+    Los bloques son las tareas de `_crear_tareas_montecarlo` (flujos hijos de
+    `np.random.SeedSequence(semilla)`); mientras el presupuesto admite bloques de
+    ITERACIONES_POR_TAREA_MC iteraciones, los agregados coinciden con `simular_montecarlo_paralelo`.
+
+    Yields:
+        tuple: (inicio, fin, riesgo_residual_agg_bloque, perdidas_usd_agg_bloque) con los
+               agregados del portafolio para las iteraciones [inicio, fin).
+    """
+    num_riesgos = len(riesgos_para_simular)
+    params = _preparar_parametros_montecarlo(riesgos_para_simular, valor_economico_global)
+    tamano_bloque = min(ITERACIONES_POR_TAREA_MC, _tamano_bloque_iteraciones(num_riesgos, iteraciones, memoria_max_mb))
+
+    inicio = 0
+    for tarea in _crear_tareas_montecarlo(params, valor_economico_global, iteraciones, semilla, tamano_bloque):
+        _, _, _, perdidas_usd_bloque, riesgo_residual_bloque = _ejecutar_tarea_montecarlo(tarea)
+        fin = inicio + perdidas_usd_bloque.shape[1]
+        yield inicio, fin, np.sum(riesgo_residual_bloque, axis=0) / num_riesgos, np.sum(perdidas_usd_bloque, axis=0)
+        inicio = fin
+
+def simular_portafolio(riesgos_para_simular, valor_economico_global, iteraciones=10000, memoria_max_mb=MEMORIA_MAX_MB_MC, semilla=None):
+    """
+    Simula todos los riesgos seleccionados como una sola matriz (riesgos x iteraciones),
+    procesando las iteraciones por bloques cuyo tamaño respeta `memoria_max_mb`.
+    No conserva los datos por riesgo, por lo que admite registros grandes con muchas iteraciones
+    (las simulaciones que no caben en `admite_muestras_por_riesgo`).
+
+    Args:
+        semilla (int, opcional): Semilla raíz de los bloques. None usa entropía del sistema.
+
+    Returns:
+        tuple: (riesgo_residual_sim_agg, perdidas_usd_sim_agg), equivalentes a los
+               arrays agregados de `simular_montecarlo_paralelo` con la misma semilla.
+    """
+    if valor_economico_global <= 0 or not riesgos_para_simular:
+        return np.array([]), np.array([])
+
+    riesgo_residual_sim_agg = np.zeros(iteraciones)
+    perdidas_usd_sim_agg = np.zeros(iteraciones)
+    for inicio, fin, riesgo_residual_bloque, perdidas_usd_bloque in \
+            _iterar_bloques_portafolio(riesgos_para_simular, valor_economico_global, iteraciones, memoria_max_mb, semilla):
+        perdidas_usd_sim_agg[inicio:fin] = perdidas_usd_bloque
+        riesgo_residual_sim_agg[inicio:fin] = riesgo_residual_bloque
+    return riesgo_residual_sim_agg, perdidas_usd_sim_agg
+
+def simular_montecarlo_streaming(riesgos_para_simular, valor_economico_global, iteraciones=10000,
+                                 memoria_max_mb=MEMORIA_MAX_MB_MC, compresion=COMPRESION_TDIGEST, semilla=None):
+    """
+    Ejecuta la simulación de portafolio por bloques sin conservar las muestras: cada bloque
+    actualiza estadísticas en flujo (media, desviación, máximo, percentiles vía t-digest y CVaR95).
+    La memoria usada es constante respecto al número de iteraciones.
+
+    Args:
+        semilla (int, opcional): Semilla raíz de los bloques, como en `simular_portafolio`.
+
+    Returns:
+        dict: {'perdidas': resumen_perdidas_usd, 'riesgo_residual': resumen_riesgo_residual,
+               'metricas_perdidas': MetricasRiesgo estimadas con el t-digest,
+               'histograma_perdidas': histograma aproximado desde el t-digest},
+              o None si no hay datos válidos para simular.
+    """
+    if valor_economico_global <= 0 or not riesgos_para_simular:
+        return None
+
+    try:
+        estadisticas_perdidas = EstadisticasStreaming(compresion)
+        estadisticas_riesgo = EstadisticasStreaming(compresion)
+
+        for _, _, riesgo_residual_bloque, perdidas_usd_bloque in \
+                _iterar_bloques_portafolio(riesgos_para_simular, valor_economico_global, iteraciones, memoria_max_mb, semilla):
+            estadisticas_perdidas.actualizar(perdidas_usd_bloque)
+            estadisticas_riesgo.actualizar(riesgo_residual_bloque)
+
+        return {'perdidas': estadisticas_perdidas.resumen(), 'riesgo_residual': estadisticas_riesgo.resumen(),
+                'metricas_perdidas': estadisticas_perdidas.metricas(),
+                'histograma_perdidas': estadisticas_perdidas.digest.histograma()}
+
+    except Exception as e:
+        print(f"Error en simular_montecarlo_streaming: {e}")
+        return None
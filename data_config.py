@@ -6,11 +6,6 @@ Incluye la estructura detallada de perfiles de riesgo con múltiples tipos de im
 tablas base para el modelo determinista, y configuraciones de simulación Monte Carlo.
 """
 
-import pandas as pd
-import json
-import os
-import numpy as np
-
 # --- Configuraciones Base de Perfiles de Riesgo ---
 # Los nombres aquí estarán en el idioma que definas como base (ej. español).
 # Si necesitas que los nombres de perfil, categoría, etc. también sean traducibles,
@@ -73,59 +68,71 @@ PERFILES_BASE = {
 }
 
 # --- Tablas Base para el Modelo de Riesgo Determinista ---
-tabla_tipo_impacto_global = pd.DataFrame({
-    'Tipo de Impacto': ['Humano', 'Operacional', 'Económico', 'Reputacional', 'Legal', 'Ambiental', 'Tecnológico', 'Contractual / Legal', 'Organizacional', 'Tiempo', 'Costo', 'Calidad', 'Financiero', 'Externo'],
-    'Ponderación': [25, 20, 30, 15, 10, 5, 10, 4, 7, 15, 15, 10, 3, 3],
-    'Explicación ASIS': [
-        'Afectación a la vida, salud o seguridad de personas.', 'Interrupción o degradación de procesos y funciones del negocio.',
-        'Pérdidas financieras directas o indirectas.', 'Daño a la imagen, confianza o credibilidad de la organización.',
-        'Incumplimiento de leyes, regulaciones o contratos.', 'Impacto en el medio ambiente.',
-        'Impacto en sistemas de información, redes o tecnología.', 'Incumplimiento de contratos o regulaciones.',
-        'Impacto en la estructura u operación interna de la organización.', 'Retraso o fallo en la entrega del proyecto.',
-        'Costos adicionales o pérdida de presupuesto.', 'Degradación de la calidad del producto o servicio.',
-        'Impacto financiero general, como flujo de caja o solvencia.', 'Factores externos no controlables.'
-    ]
-})
-
-matriz_probabilidad = pd.DataFrame({
-    'Clasificacion': ['Muy Baja', 'Baja', 'Media', 'Alta', 'Muy Alta'],
-    'Valor': [0.1, 0.3, 0.5, 0.7, 0.9],
-    'Definicion': [
-        'Probabilidad de ocurrencia menor al 10%', 'Probabilidad de ocurrencia entre 10% y 30%',
-        'Probabilidad de ocurrencia entre 30% y 50%', 'Probabilidad de ocurrencia entre 50% y 70%',
-        'Probabilidad de ocurrencia mayor al 70%'
-    ]
-})
-
-factor_exposicion = pd.DataFrame({
-    'Clasificacion': ['Muy Baja', 'Baja', 'Media', 'Alta', 'Muy Alta'],
-    'Factor': [0.1, 0.3, 0.6, 0.9, 1.0],
-    'Definicion': [
-        'Ocurrencia muy infrecuente (ej. 1-2 veces cada 100 años)',
-        'Ocurrencia infrecuente (ej. 1-2 veces cada 10 años)',
-        'Ocurrencia ocasional (ej. algunas pocas veces al año)',
-        'Ocurrencia frecuente (ej. 1-2 veces por mes)',
-        'Ocurrencia muy frecuente (ej. 1 vez a la semana o más)'
-    ]
-})
+# Definiciones columna a columna; los DataFrames se construyen en el primer acceso (ver __getattr__)
+_DEFINICIONES_TABLAS = {
+    'tabla_tipo_impacto_global': {
+        'Tipo de Impacto': ['Humano', 'Operacional', 'Económico', 'Reputacional', 'Legal', 'Ambiental', 'Tecnológico', 'Contractual / Legal', 'Organizacional', 'Tiempo', 'Costo', 'Calidad', 'Financiero', 'Externo'],
+        'Ponderación': [25, 20, 30, 15, 10, 5, 10, 4, 7, 15, 15, 10, 3, 3],
+        'Explicación ASIS': [
+            'Afectación a la vida, salud o seguridad de personas.', 'Interrupción o degradación de procesos y funciones del negocio.',
+            'Pérdidas financieras directas o indirectas.', 'Daño a la imagen, confianza o credibilidad de la organización.',
+            'Incumplimiento de leyes, regulaciones o contratos.', 'Impacto en el medio ambiente.',
+            'Impacto en sistemas de información, redes o tecnología.', 'Incumplimiento de contratos o regulaciones.',
+            'Impacto en la estructura u operación interna de la organización.', 'Retraso o fallo en la entrega del proyecto.',
+            'Costos adicionales o pérdida de presupuesto.', 'Degradación de la calidad del producto o servicio.',
+            'Impacto financiero general, como flujo de caja o solvencia.', 'Factores externos no controlables.'
+        ]
+    },
+    'matriz_probabilidad': {
+        'Clasificacion': ['Muy Baja', 'Baja', 'Media', 'Alta', 'Muy Alta'],
+        'Valor': [0.1, 0.3, 0.5, 0.7, 0.9],
+        'Definicion': [
+            'Probabilidad de ocurrencia menor al 10%', 'Probabilidad de ocurrencia entre 10% y 30%',
+            'Probabilidad de ocurrencia entre 30% y 50%', 'Probabilidad de ocurrencia entre 50% y 70%',
+            'Probabilidad de ocurrencia mayor al 70%'
+        ]
+    },
+    'factor_exposicion': {
+        'Clasificacion': ['Muy Baja', 'Baja', 'Media', 'Alta', 'Muy Alta'],
+        'Factor': [0.1, 0.3, 0.6, 0.9, 1.0],
+        'Definicion': [
+            'Ocurrencia muy infrecuente (ej. 1-2 veces cada 100 años)',
+            'Ocurrencia infrecuente (ej. 1-2 veces cada 10 años)',
+            'Ocurrencia ocasional (ej. algunas pocas veces al año)',
+            'Ocurrencia frecuente (ej. 1-2 veces por mes)',
+            'Ocurrencia muy frecuente (ej. 1 vez a la semana o más)'
+        ]
+    },
+    'matriz_impacto': {
+        'Clasificacion': ['Insignificante', 'Menor', 'Moderado', 'Mayor', 'Catastrófico'],
+        'Valor': [1, 2, 3, 4, 5],
+        'Definicion': [
+            'Daño mínimo, fácilmente recuperable.', 'Daño localizado, impacto limitado.',
+            'Daño significativo, impacto moderado en áreas clave.', 'Daño extenso, impacto severo en la operación.',
+            'Daño crítico, amenaza la viabilidad de la organización.'
+        ]
+    },
+    'efectividad_controles': {
+        'Efectividad': ['Inefectiva', 'Parcialmente Efectiva', 'Efectiva', 'Muy Efectiva'],
+        'Rango % Min': [0, 26, 51, 76], 'Rango % Max': [25, 50, 75, 100],
+        'Factor': [0.1, 0.3, 0.7, 0.9],
+        'Mitigacion': ['Los controles no reducen significativamente el riesgo.', 'Los controles ofrecen una reducción limitada del riesgo.',
+                       'Los controles reducen el riesgo de manera considerable.', 'Los controles casi eliminan el riesgo.']
+    },
+}
 
-matriz_impacto = pd.DataFrame({
-    'Clasificacion': ['Insignificante', 'Menor', 'Moderado', 'Mayor', 'Catastrófico'],
-    'Valor': [1, 2, 3, 4, 5],
-    'Definicion': [
-        'Daño mínimo, fácilmente recuperable.', 'Daño localizado, impacto limitado.',
-        'Daño significativo, impacto moderado en áreas clave.', 'Daño extenso, impacto severo en la operación.',
-        'Daño crítico, amenaza la viabilidad de la organización.'
-    ]
-})
+def __getattr__(nombre):
+    """Materializa una tabla base en su primer acceso (PEP 562) y la guarda como atributo del módulo."""
+    definicion = _DEFINICIONES_TABLAS.get(nombre)
+    if definicion is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    import pandas as pd # Diferido: importar la configuración (textos, perfiles) no requiere pandas
+    tabla = pd.DataFrame(definicion)
+    globals()[nombre] = tabla # Los accesos siguientes ya no pasan por __getattr__
+    return tabla
 
-efectividad_controles = pd.DataFrame({
-    'Efectividad': ['Inefectiva', 'Parcialmente Efectiva', 'Efectiva', 'Muy Efectiva'],
-    'Rango % Min': [0, 26, 51, 76], 'Rango % Max': [25, 50, 75, 100],
-    'Factor': [0.1, 0.3, 0.7, 0.9],
-    'Mitigacion': ['Los controles no reducen significativamente el riesgo.', 'Los controles ofrecen una reducción limitada del riesgo.',
-                   'Los controles reducen el riesgo de manera considerable.', 'Los controles casi eliminan el riesgo.']
-})
+def __dir__():
+    return sorted(set(globals()) | set(_DEFINICIONES_TABLAS))
 
 # Límites de criticidad para clasificar el Riesgo Residual (0-1)
 criticidad_límites = [
@@ -200,7 +207,38 @@ textos = {
         "max_theoretical_risk": "Máx. Riesgo Teórico del Perfil",
         "impact_type_label": "Tipo de Impacto",
         "impact_severity_label": "Severidad (0-100)",
-        "impact_weight_label": "Ponderación del Impacto"
+        "impact_weight_label": "Ponderación del Impacto",
+        "streaming_mode": "Modo Streaming (métricas sin guardar muestras)",
+        "simulation_mode": "Modo de Simulación", "standard_mode": "Estándar",
+        "samples_memory_fallback": "Riesgos x iteraciones excede la memoria para conservar las muestras por riesgo: se simulan solo los agregados del portafolio (sin muestras por riesgo ni análisis de sensibilidad).",
+        "montecarlo_seed": "Semilla de la Simulación",
+        "montecarlo_workers": "Procesos en Paralelo",
+        "sampling_method": "Método de Muestreo",
+        "compute_sensitivity": "Calcular Análisis de Sensibilidad",
+        "sobol_dimension_fallback": "Demasiados riesgos para Sobol (4 dimensiones por riesgo, máximo 21201): se usa muestreo aleatorio.",
+        "adaptive_mode": "Parada Adaptativa por Convergencia",
+        "adaptive_target_error": "Error Relativo Objetivo (%)",
+        "adaptive_time_limit": "Tiempo Máximo (s)",
+        "adaptive_converged": "Convergencia alcanzada",
+        "adaptive_not_converged": "Detenido por límite sin alcanzar la precisión objetivo",
+        "adaptive_iterations_used": "iteraciones usadas",
+        "variance_reduction_mode": "Reducción de Varianza (Antitéticas + Variable de Control)",
+        "variance_reduction_title": "Estimadores con Reducción de Varianza",
+        "simulated_criticality_distribution": "Distribución de Criticidad Simulada",
+        "probability_label": "Probabilidad",
+        "pareto_top_n": "Riesgos mostrados en el Pareto (resto agrupado en 'Otros')",
+        "tail_metrics_title": "VaR y CVaR por Nivel de Confianza",
+        "confidence_level": "Nivel de Confianza",
+        "import_title": "Importar Riesgos desde Archivo (CSV/Parquet)",
+        "import_file_label": "Archivo con columnas del registro (Nombre del Riesgo, Probabilidad, Exposición, ...)",
+        "import_button": "Importar",
+        "import_success": "Riesgos importados",
+        "import_errors": "Filas descartadas",
+        "export_format": "Formato de exportación",
+        "export_prepare": "Preparar exportación",
+        "export_prepare_samples": "Preparar exportación de muestras",
+        "export_download_samples": "Descargar Muestras Monte Carlo",
+        "export_fallback_csv": "pyarrow no está disponible: se exportó en CSV."
     },
     "en": {
         "sidebar_language_toggle": "Español", "app_title": "Risk Calculator and Monte Carlo Simulator",
@@ -258,6 +296,37 @@ textos = {
         "select_at_least_one_risk": "Please select at least one risk to simulate.",
         "min_loss_input_label": "Min Potential Loss (USD)",
         "max_loss_input_label": "Max Potential Loss (USD)",
-        "max_theoretical_risk": "Max Theoretical Profile Risk"
+        "max_theoretical_risk": "Max Theoretical Profile Risk",
+        "streaming_mode": "Streaming Mode (metrics without storing samples)",
+        "simulation_mode": "Simulation Mode", "standard_mode": "Standard",
+        "samples_memory_fallback": "Risks x iterations exceeds the memory for keeping per-risk samples: only the portfolio aggregates are simulated (no per-risk samples or sensitivity analysis).",
+        "montecarlo_seed": "Simulation Seed",
+        "montecarlo_workers": "Parallel Workers",
+        "sampling_method": "Sampling Method",
+        "compute_sensitivity": "Compute Sensitivity Analysis",
+        "sobol_dimension_fallback": "Too many risks for Sobol (4 dimensions per risk, at most 21201): random sampling is used instead.",
+        "adaptive_mode": "Adaptive Convergence Stopping",
+        "adaptive_target_error": "Target Relative Error (%)",
+        "adaptive_time_limit": "Time Limit (s)",
+        "adaptive_converged": "Converged",
+        "adaptive_not_converged": "Stopped at a limit before reaching the target precision",
+        "adaptive_iterations_used": "iterations used",
+        "variance_reduction_mode": "Variance Reduction (Antithetic + Control Variate)",
+        "variance_reduction_title": "Variance-Reduced Estimators",
+        "simulated_criticality_distribution": "Simulated Criticality Distribution",
+        "probability_label": "Probability",
+        "pareto_top_n": "Risks shown in the Pareto chart (rest grouped as 'Others')",
+        "tail_metrics_title": "VaR and CVaR by Confidence Level",
+        "confidence_level": "Confidence Level",
+        "import_title": "Import Risks from File (CSV/Parquet)",
+        "import_file_label": "File with register columns (Nombre del Riesgo, Probabilidad, Exposición, ...)",
+        "import_button": "Import",
+        "import_success": "Risks imported",
+        "import_errors": "Rows skipped",
+        "export_format": "Export format",
+        "export_prepare": "Prepare export",
+        "export_prepare_samples": "Prepare samples export",
+        "export_download_samples": "Download Monte Carlo Samples",
+        "export_fallback_csv": "pyarrow is not available: exported as CSV."
     }
 }
@@ -0,0 +1,38 @@
+# modules/localization.py
+"""
+Tablas de traducción precompiladas. Los textos de la aplicación (`data_config.textos`) y las
+traducciones de la jerarquía de perfiles (`HIERARCHY_TRANSLATIONS`) se compilan una vez por
+idioma en diccionarios planos de solo lectura; cada búsqueda es un único acceso a diccionario.
+"""
+from types import MappingProxyType
+
+from modules import data_config
+
+IDIOMA_BASE = "es" # Idioma de respaldo de la jerarquía
+
+_tablas = {} # (contexto, idioma) -> MappingProxyType
+
+def _compilar_tabla(contexto, idioma):
+    if contexto == "app":
+        return dict(data_config.textos.get(idioma, {}))
+    if contexto == "hierarchy":
+        # Sin traducción en el idioma pedido se usa la del idioma base y, si tampoco existe, la clave
+        traducciones = getattr(data_config, "HIERARCHY_TRANSLATIONS", {})
+        return {**traducciones.get(IDIOMA_BASE, {}), **traducciones.get(idioma, {})}
+    return {}
+
+def tabla_traducciones(idioma, contexto="app"):
+    """Devuelve la tabla (solo lectura) de `contexto` ('app' o 'hierarchy') para `idioma`, compilándola en el primer uso."""
+    clave = (contexto, idioma)
+    tabla = _tablas.get(clave)
+    if tabla is None:
+        tabla = _tablas[clave] = MappingProxyType(_compilar_tabla(contexto, idioma))
+    return tabla
+
+def traducir(clave, idioma, contexto="app"):
+    """Texto traducido de `clave`; la propia clave si no hay traducción."""
+    return tabla_traducciones(idioma, contexto).get(clave, clave)
+
+def invalidar_tablas_traduccion():
+    """Descarta las tablas compiladas (p. ej. tras modificar `textos` en tiempo de ejecución)."""
+    _tablas.clear()
@@ -1,44 +1,57 @@
 # modules/profile_manager.py
 """
 Módulo para gestionar perfiles de riesgo personalizados: carga, guardado,
-creación, edición y eliminación, interactuando con el estado de sesión y archivos JSON.
+creación, edición y eliminación, interactuando con el estado de sesión y el almacén
+SQLite de perfiles (cada cambio escribe solo el perfil afectado).
 """
+import copy
+import sqlite3
 import streamlit as st
-import pandas as pd
-import json
-import os
 from modules.data_config import PERFILES_BASE # Importar perfiles base
+from modules.profile_store import obtener_almacen_perfiles
 
 # --- Rutas de Archivos y Constantes ---
-PROFILE_FILE = "user_profiles.json"
+PROFILE_DB = "user_profiles.db"
+PROFILE_FILE = "user_profiles.json" # Formato anterior; se migra a PROFILE_DB si la base está vacía
+
+def _get_store():
+    return obtener_almacen_perfiles(PROFILE_DB, archivo_json_heredado=PROFILE_FILE)
 
 # --- Funciones de Gestión de Perfiles ---
 
 def load_profiles():
-    """Carga perfiles de un archivo JSON o devuelve los perfiles base si no existe."""
-    if os.path.exists(PROFILE_FILE):
-        try:
-            with open(PROFILE_FILE, 'r', encoding='utf-8') as f:
-                loaded_data = json.load(f)
-                if "perfiles_usuario" in loaded_data and isinstance(loaded_data["perfiles_usuario"], dict):
-                    return loaded_data["perfiles_usuario"]
-                else:
-                    st.warning("Archivo de perfiles inválido. Usando perfiles base.")
-                    return PERFILES_BASE.copy()
-        except json.JSONDecodeError:
-            st.warning("Error al decodificar el archivo de perfiles. Usando perfiles base.")
-            return PERFILES_BASE.copy()
-        except Exception as e:
-            st.warning(f"Error al leer el archivo de perfiles: {e}. Usando perfiles base.")
-            return PERFILES_BASE.copy()
-    else:
+    """
+    Carga los perfiles almacenados sobre los perfiles base y registra en la sesión
+    la versión cargada (ver `refresh_profiles`).
+    """
+    try:
+        store = _get_store()
+        version, stored_profiles, _ = store.cambios_desde(0)
+        st.session_state['perfiles_version'] = version
+        return {**copy.deepcopy(PERFILES_BASE), **stored_profiles}
+    except sqlite3.Error as e:
+        st.warning(f"Error al leer la base de perfiles: {e}. Usando perfiles base.")
         return PERFILES_BASE.copy()
 
+def refresh_profiles():
+    """Aplica a los perfiles de la sesión solo los cambios guardados por otras sesiones desde la última carga."""
+    try:
+        version, updated, deleted = _get_store().cambios_desde(st.session_state.get('perfiles_version', 0))
+    except sqlite3.Error as e:
+        print(f"Error al refrescar perfiles: {e}")
+        return False
+    if version == st.session_state.get('perfiles_version', 0): return False
+    st.session_state.perfiles_usuario.update(updated)
+    for profile_name in deleted:
+        if profile_name in PERFILES_BASE: st.session_state.perfiles_usuario[profile_name] = copy.deepcopy(PERFILES_BASE[profile_name])
+        else: st.session_state.perfiles_usuario.pop(profile_name, None)
+    st.session_state['perfiles_version'] = version
+    return True
+
 def save_profiles(profiles_data):
-    """Guarda los perfiles en un archivo JSON."""
+    """Guarda en el almacén los perfiles de `profiles_data` que hayan cambiado (una transacción)."""
     try:
-        with open(PROFILE_FILE, 'w', encoding='utf-8') as f:
-            json.dump({"perfiles_usuario": profiles_data}, f, indent=4, ensure_ascii=False)
+        _get_store().guardar_varios(profiles_data)
         return True
     except Exception as e:
         print(f"Error al guardar perfiles: {e}")
@@ -49,10 +62,13 @@ def get_profile_data(profile_name):
     return st.session_state.perfiles_usuario.get(profile_name)
 
 def delete_profile(profile_name):
-    """Elimina un perfil del estado y del archivo (si no es base)."""
+    """Elimina un perfil del estado y del almacén (si no es base)."""
     if profile_name in st.session_state.perfiles_usuario and profile_name not in PERFILES_BASE:
         del st.session_state.perfiles_usuario[profile_name]
-        save_profiles(st.session_state.perfiles_usuario)
+        try:
+            _get_store().eliminar(profile_name)
+        except Exception as e:
+            print(f"Error al eliminar perfil: {e}")
         return True
     return False
 
@@ -60,7 +76,7 @@ def update_profile(profile_name, new_data):
     """Actualiza un perfil existente en el estado y lo guarda."""
     if profile_name in st.session_state.perfiles_usuario:
         st.session_state.perfiles_usuario[profile_name] = new_data
-        save_profiles(st.session_state.perfiles_usuario)
+        save_profiles({profile_name: new_data})
         return True
     return False
 
@@ -69,5 +85,5 @@ def add_profile(profile_name, profile_data):
     if profile_name in st.session_state.perfiles_usuario:
         return False # Ya existe
     st.session_state.perfiles_usuario[profile_name] = profile_data
-    save_profiles(st.session_state.perfiles_usuario)
+    save_profiles({profile_name: profile_data})
     return True
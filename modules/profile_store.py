@@ -0,0 +1,146 @@
+# modules/profile_store.py
+"""
+Almacén transaccional de perfiles de riesgo sobre SQLite. Cada alta, edición o baja escribe
+solo la fila del perfil afectado dentro de una transacción; cada escritura recibe un número de
+versión creciente, de modo que las sesiones (y otros procesos) recargan solo lo que cambió
+desde la última versión que conocen. Un índice en memoria por base de datos se comparte entre
+todas las sesiones del proceso.
+"""
+import copy
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+# --- Constantes ---
+TIEMPO_ESPERA_BD_S = 10.0 # Espera máxima por el bloqueo de escritura de otra sesión/proceso
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS perfiles (
+    nombre TEXT PRIMARY KEY,
+    datos TEXT, -- JSON del perfil; NULL = perfil eliminado (se conserva para propagar la baja)
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_perfiles_version ON perfiles (version);
+"""
+
+class AlmacenPerfiles:
+    """
+    Perfiles persistidos en SQLite (modo WAL) con un índice en memoria versionado.
+    `version` es la última versión de la base de datos aplicada al índice.
+    """
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.version = 0
+        self._perfiles = {} # nombre -> datos (dict)
+        self._versiones = {} # nombre -> versión de su último cambio (incluye bajas)
+        self._bloqueo = threading.Lock()
+        with closing(self._conectar()) as conexion:
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.executescript(_ESQUEMA)
+
+    def _conectar(self):
+        # Una conexión por operación: seguro entre los hilos de las sesiones y entre procesos
+        conexion = sqlite3.connect(self.ruta, timeout=TIEMPO_ESPERA_BD_S, isolation_level=None)
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        return conexion
+
+    # --- Lectura ---
+
+    def refrescar(self):
+        """Aplica al índice los cambios con versión posterior a `self.version`. Devuelve los nombres cambiados."""
+        with self._bloqueo, closing(self._conectar()) as conexion:
+            filas = conexion.execute("SELECT nombre, datos, version FROM perfiles WHERE version > ? ORDER BY version",
+                                     (self.version,)).fetchall()
+            for nombre, datos, version in filas:
+                if datos is None: self._perfiles.pop(nombre, None)
+                else: self._perfiles[nombre] = json.loads(datos)
+                self._versiones[nombre] = version
+                self.version = version
+        return [fila[0] for fila in filas]
+
+    def perfiles(self):
+        """Copia de todos los perfiles vigentes."""
+        self.refrescar()
+        with self._bloqueo:
+            return copy.deepcopy(self._perfiles)
+
+    def cambios_desde(self, version):
+        """
+        Cambios posteriores a `version` (la última que conoce una sesión).
+
+        Returns:
+            tuple: (versión actual, {nombre: datos} de perfiles nuevos o editados, [nombres eliminados]).
+        """
+        self.refrescar()
+        with self._bloqueo:
+            cambiados = [nombre for nombre, version_nombre in self._versiones.items() if version_nombre > version]
+            actualizados = {nombre: copy.deepcopy(self._perfiles[nombre]) for nombre in cambiados if nombre in self._perfiles}
+            eliminados = [nombre for nombre in cambiados if nombre not in self._perfiles]
+            return self.version, actualizados, eliminados
+
+    def vacio(self):
+        with closing(self._conectar()) as conexion:
+            return conexion.execute("SELECT COUNT(*) FROM perfiles").fetchone()[0] == 0
+
+    # --- Escritura ---
+
+    def _escribir(self, cambios):
+        """Escribe `cambios` ({nombre: datos o None}) en una única transacción y refresca el índice."""
+        if not cambios: return
+        filas = [(nombre, None if datos is None else json.dumps(datos, ensure_ascii=False)) for nombre, datos in cambios.items()]
+        with closing(self._conectar()) as conexion:
+            conexion.execute("BEGIN IMMEDIATE") # Bloqueo de escritura desde el inicio: versiones sin colisiones
+            try:
+                version = conexion.execute("SELECT COALESCE(MAX(version), 0) FROM perfiles").fetchone()[0]
+                conexion.executemany(
+                    "INSERT INTO perfiles (nombre, datos, version) VALUES (?, ?, ?) "
+                    "ON CONFLICT(nombre) DO UPDATE SET datos = excluded.datos, version = excluded.version",
+                    [(nombre, datos, version + i + 1) for i, (nombre, datos) in enumerate(filas)])
+                conexion.execute("COMMIT")
+            except Exception:
+                conexion.execute("ROLLBACK")
+                raise
+        self.refrescar()
+
+    def guardar(self, nombre, datos):
+        self._escribir({nombre: datos})
+
+    def guardar_varios(self, perfiles):
+        """Guarda solo los perfiles de `perfiles` cuyo contenido difiere del almacenado."""
+        self.refrescar()
+        with self._bloqueo:
+            cambios = {nombre: datos for nombre, datos in perfiles.items() if self._perfiles.get(nombre) != datos}
+        self._escribir(cambios)
+
+    def eliminar(self, nombre):
+        self._escribir({nombre: None})
+
+    def importar_json(self, ruta_json):
+        """Importa un archivo heredado {'perfiles_usuario': {...}} en una sola transacción."""
+        with open(ruta_json, 'r', encoding='utf-8') as f:
+            perfiles = json.load(f).get("perfiles_usuario", {})
+        if isinstance(perfiles, dict): self._escribir(perfiles)
+
+# --- Instancias Compartidas ---
+_almacenes = {}
+_bloqueo_almacenes = threading.Lock()
+
+def obtener_almacen_perfiles(ruta, archivo_json_heredado=None):
+    """
+    Devuelve el almacén compartido por todas las sesiones para la base de datos `ruta`.
+    En su creación, si la base está vacía y existe `archivo_json_heredado`, lo migra.
+    """
+    clave = os.path.abspath(ruta)
+    with _bloqueo_almacenes:
+        almacen = _almacenes.get(clave)
+        if almacen is None:
+            almacen = AlmacenPerfiles(ruta)
+            if archivo_json_heredado and os.path.exists(archivo_json_heredado) and almacen.vacio():
+                try:
+                    almacen.importar_json(archivo_json_heredado)
+                except Exception as e:
+                    print(f"Error al migrar perfiles desde {archivo_json_heredado}: {e}")
+            _almacenes[clave] = almacen
+    return almacen
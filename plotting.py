@@ -3,53 +3,57 @@
 Este módulo contiene funciones para generar visualizaciones interactivas
 (mapas de calor, gráficos de Pareto, histogramas Monte Carlo, análisis de sensibilidad).
 """
-import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.graph_objects as go
-import plotly.express as px
 
 # --- Importaciones ---
 from modules.data_config import (criticidad_límites, matriz_probabilidad, matriz_impacto,
                                   tabla_tipo_impacto_global)
-from modules.utils import get_text # Para traducciones en títulos/labels
+from modules.calculations import clasificar_criticidad_vectorizado, agregar_celdas_mapa_calor
+from modules.streaming_stats import histograma_precalculado
+
+PARETO_TOP_N = 25 # Riesgos individuales mostrados en el Pareto; el resto se agrupa en "Otros"
+SENSIBILIDAD_TOP_N = 15 # Factores mostrados en el gráfico tornado
+
+_go = None
+
+def _graph_objects():
+    """Importa `plotly.graph_objects` en el primer gráfico, no al importar el módulo."""
+    global _go
+    if _go is None:
+        import plotly.graph_objects as go
+        _go = go
+    return _go
 
 # --- Funciones de Creación de Gráficos ---
 
-def create_heatmap(df_risks, matriz_probabilidad, matriz_impacto, idioma="es"):
-    """Crea un mapa de calor 5x5 del riesgo residual promedio."""
-    if df_risks.empty: return None
-    prob_bins = [0] + matriz_probabilidad['Valor'].tolist() + [1.0]
+def create_heatmap(df_risks, matriz_probabilidad, matriz_impacto, idioma="es", agregados_celdas=None):
+    """
+    Crea un mapa de calor 5x5 del riesgo residual promedio.
+
+    Args:
+        df_risks (pd.DataFrame): Registro de riesgos (se ignora si se pasan `agregados_celdas`).
+        agregados_celdas (tuple, optional): (sumas, conteos) por celda precalculados, p. ej.
+            `registro.agregados.celdas_mapa_calor()`; evita recorrer el registro.
+    """
+    if agregados_celdas is None:
+        if df_risks is None or df_risks.empty: return None
+        agregados_celdas = agregar_celdas_mapa_calor(df_risks['Probabilidad'], df_risks['Impacto Numérico'], df_risks['Riesgo Residual'])
+    sumas, conteos = (np.asarray(matriz, dtype=float) for matriz in agregados_celdas)
+    if conteos.sum() == 0: return None
     prob_labels = matriz_probabilidad['Clasificacion'].tolist()
-    impact_bins = [0, 20, 40, 60, 80, 100]
     impact_labels_es = ['Muy Bajo (0-20)', 'Bajo (21-40)', 'Medio (41-60)', 'Alto (61-80)', 'Muy Alto (81-100)']
     impact_labels_en = ['Very Low (0-20)', 'Low (21-40)', 'Medium (41-60)', 'High (61-80)', 'Very High (81-100)']
     impact_labels = impact_labels_es if idioma == "es" else impact_labels_en
 
-    df_risks_copy = df_risks.copy()
-    df_risks_copy['Prob_Bin'] = pd.cut(df_risks_copy['Probabilidad'], bins=prob_bins, labels=prob_labels, right=True, include_lowest=True)
-    df_risks_copy['Impact_Bin'] = pd.cut(df_risks_copy['Impacto Numérico'], bins=impact_bins, labels=impact_labels, right=True, include_lowest=True)
-    
-    pivot_table = df_risks_copy.pivot_table(values='Riesgo Residual', index='Prob_Bin', columns='Impact_Bin', aggfunc='mean')
-    pivot_table = pivot_table.reindex(index=prob_labels, columns=impact_labels)
-
-    z_values = pivot_table.values.tolist()
-    text_values = []
-    for r in range(len(prob_labels)):
-        row_text = []
-        for c in range(len(impact_labels)):
-            val = pivot_table.iloc[r, c]
-            if pd.isna(val): row_text.append('N/A')
-            else:
-                val_percent = val * 100
-                for v_min, v_max, clasif_es, _, clasif_en in criticidad_límites:
-                    if v_min <= val <= v_max:
-                        row_text.append(f"{val_percent:.1f}%\n" + (clasif_es if idioma == "es" else clasif_en))
-                        break
-        text_values.append(row_text)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z_array = np.where(conteos > 0, sumas / conteos, np.nan)
+    z_values = z_array.tolist()
+    _, cell_labels, _ = clasificar_criticidad_vectorizado(z_array, idioma)
+    text_values = np.where(np.isnan(z_array), 'N/A',
+                           np.char.add(np.char.mod("%.1f%%\n", np.nan_to_num(z_array) * 100), cell_labels.astype(str))).tolist()
 
+    go = _graph_objects()
     fig = go.Figure(data=go.Heatmap(
         z=z_values, x=impact_labels, y=prob_labels, text=text_values, texttemplate="%{text}", hoverinfo="text",
         colorscale=[[limit[0], limit[3]] for limit in criticidad_límites], showscale=True,
@@ -66,12 +70,42 @@ def create_heatmap(df_risks, matriz_probabilidad, matriz_impacto, idioma="es"):
     )
     return fig
 
-def create_pareto_chart(df_risks, idioma="es"):
-    """Crea un gráfico de Pareto mostrando el riesgo residual y el porcentaje acumulado."""
-    if df_risks.empty: return None
-    df_sorted = df_risks.sort_values(by='Riesgo Residual', ascending=False).copy()
+def create_pareto_chart(df_risks, idioma="es", top_n=PARETO_TOP_N, agregados_pareto=None):
+    """
+    Crea un gráfico de Pareto mostrando el riesgo residual y el porcentaje acumulado.
+    Solo se grafican los `top_n` riesgos de mayor riesgo residual; el resto se agrupa en una
+    barra "Otros", de modo que el tamaño del gráfico está acotado.
+
+    Args:
+        df_risks (pd.DataFrame): Registro de riesgos (se ignora si se pasan `agregados_pareto`);
+            los principales se seleccionan con `argpartition`.
+        agregados_pareto (tuple, optional): (nombres, riesgos residuales) de los principales ya
+            ordenados, riesgo residual total y número de riesgos, p. ej.
+            `registro.principales_pareto(top_n)`; evita recorrer el registro.
+    """
+    if agregados_pareto is None:
+        if df_risks is None or df_risks.empty: return None
+        valores = df_risks['Riesgo Residual'].to_numpy(dtype=float)
+        nombres = df_risks['Nombre del Riesgo'].to_numpy(dtype=object)
+        top_n = max(1, int(top_n)) if top_n else len(valores)
+        if top_n < len(valores):
+            indices_top = np.argpartition(-valores, top_n - 1)[:top_n]
+        else:
+            indices_top = np.arange(len(valores))
+        indices_top = indices_top[np.argsort(-valores[indices_top], kind='stable')]
+        agregados_pareto = (nombres[indices_top], valores[indices_top], valores.sum(), len(valores))
+    nombres_top, valores_top, total, num_riesgos = agregados_pareto
+    if num_riesgos == 0: return None
+
+    df_sorted = pd.DataFrame({'Nombre del Riesgo': np.asarray(nombres_top, dtype=object), 'Riesgo Residual': np.asarray(valores_top, dtype=float)})
+    num_restantes = num_riesgos - len(df_sorted)
+    if num_restantes > 0:
+        nombre_otros = f"Otros ({num_restantes} riesgos)" if idioma == "es" else f"Others ({num_restantes} risks)"
+        suma_otros = max(total - df_sorted['Riesgo Residual'].sum(), 0.0) # Sin negativos por redondeo de las sumas incrementales
+        df_sorted.loc[len(df_sorted)] = [nombre_otros, suma_otros]
     df_sorted['Riesgo Residual Acumulado'] = df_sorted['Riesgo Residual'].cumsum()
-    df_sorted['Porcentaje Acumulado'] = (df_sorted['Riesgo Residual Acumulado'] / df_sorted['Riesgo Residual'].sum()) * 100
+    df_sorted['Porcentaje Acumulado'] = (df_sorted['Riesgo Residual Acumulado'] / total) * 100 if total else 0.0
+    go = _graph_objects()
     fig = go.Figure()
     fig.add_trace(go.Bar(x=df_sorted['Nombre del Riesgo'], y=df_sorted['Riesgo Residual'], name=('Riesgo Residual' if idioma == "es" else 'Residual Risk'), marker_color='#1f77b4'))
     fig.add_trace(go.Scatter(x=df_sorted['Nombre del Riesgo'], y=df_sorted['Porcentaje Acumulado'], mode='lines+markers', name=('Porcentaje Acumulado' if idioma == "es" else 'Cumulative Percentage'), yaxis='y2', marker_color='#d62728'))
@@ -84,23 +118,46 @@ def create_pareto_chart(df_risks, idioma="es"):
     )
     return fig
 
-def plot_montecarlo_histogram(data, title, x_label, idioma="es"):
-    """Crea un histograma para los datos de la simulación Monte Carlo."""
-    if data is None or len(data) == 0: return None
-    fig, ax = plt.subplots(figsize=(8, 5))
-    sns.histplot(data, kde=True, ax=ax, color='#28a745')
-    ax.set_title(title)
-    ax.set_xlabel(x_label)
-    ax.set_ylabel('Frecuencia' if idioma == "es" else 'Frequency')
-    plt.tight_layout()
+def plot_montecarlo_histogram(data, title, x_label, idioma="es", histograma=None):
+    """
+    Crea un histograma con curva KDE para los datos de la simulación Monte Carlo.
+    Usa un histograma precalculado (`histograma_precalculado`), de modo que el coste de
+    graficar no depende del número de iteraciones; si no se pasa, se calcula a partir de `data`.
+    """
+    if histograma is None:
+        if data is None or len(data) == 0: return None
+        histograma = histograma_precalculado(data)
+    if histograma is None: return None
+    bordes = histograma['bordes']
+    centros = (bordes[:-1] + bordes[1:]) / 2
+    go = _graph_objects()
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=centros, y=histograma['conteos'], width=np.diff(bordes), name=('Frecuencia' if idioma == "es" else 'Frequency'),
+                         marker_color='#28a745', opacity=0.6))
+    fig.add_trace(go.Scatter(x=centros, y=histograma['kde'], mode='lines', name='KDE', line=dict(color='#1e7b34', width=2)))
+    fig.update_layout(
+        title=title, xaxis_title=x_label, yaxis_title=('Frecuencia' if idioma == "es" else 'Frequency'),
+        bargap=0, showlegend=False, height=400, margin=dict(t=80, b=20)
+    )
     return fig
 
-def create_sensitivity_plot(correlations, idioma="es"):
-    """Crea un gráfico de barras para el análisis de sensibilidad."""
+def create_sensitivity_plot(correlations, idioma="es", top_n=SENSIBILIDAD_TOP_N):
+    """
+    Crea un gráfico tornado con los `top_n` factores de mayor correlación de rangos (Spearman)
+    con la pérdida económica agregada. Las barras conservan el signo de la correlación.
+    """
     if correlations is None or correlations.empty: return None
-    fig = px.bar(x=correlations.index, y=correlations.values,
-                 title=('Análisis de Sensibilidad: Correlación con Pérdida Económica' if idioma == "es" else 'Sensitivity Analysis: Correlation with Economic Loss'),
-                 labels={'x': ('Factor de Riesgo' if idioma == "es" else 'Risk Factor'), 'y': ('Magnitud de Correlación' if idioma == "es" else 'Correlation Magnitude')},
-                 color_discrete_sequence=px.colors.qualitative.Plotly)
-    fig.update_layout(xaxis_tickangle=-45, height=400, margin=dict(t=80, b=20))
+    principales = correlations.iloc[np.argsort(-correlations.abs().to_numpy(), kind='stable')[:top_n]][::-1] # Mayor arriba
+    go = _graph_objects()
+    fig = go.Figure(go.Bar(
+        x=principales.values, y=principales.index, orientation='h',
+        marker_color=np.where(principales.values >= 0, '#d62728', '#1f77b4'),
+        text=[f"{valor:+.2f}" for valor in principales.values], textposition='auto'
+    ))
+    fig.update_layout(
+        title=('Análisis de Sensibilidad: Correlación de Rangos (Spearman) con Pérdida Económica' if idioma == "es" else 'Sensitivity Analysis: Rank Correlation (Spearman) with Economic Loss'),
+        xaxis_title=('Correlación de Spearman' if idioma == "es" else 'Spearman Correlation'),
+        yaxis_title=('Riesgo - Factor' if idioma == "es" else 'Risk - Factor'),
+        xaxis=dict(range=[-1, 1]), height=max(400, 28 * len(principales) + 120), margin=dict(t=80, b=20)
+    )
     return fig
@@ -0,0 +1,112 @@
+# modules/risk_export.py
+"""
+Exportación del registro de riesgos y de las muestras Monte Carlo a Parquet o Arrow
+(formato de archivo IPC), con CSV como alternativa cuando pyarrow no está disponible.
+Los datos se escriben por bloques de filas y los archivos se generan solo bajo demanda.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# --- Constantes ---
+FORMATOS_EXPORTACION = {
+    # formato: (extensión, tipo MIME)
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+    'csv': ('csv', 'text/csv'),
+}
+FILAS_POR_BLOQUE_EXPORTACION = 100_000
+
+def pyarrow_disponible():
+    try:
+        import pyarrow # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+# --- Generadores de Bloques ---
+
+def _bloques_registro(df_riesgos, filas_por_bloque):
+    for inicio in range(0, max(len(df_riesgos), 1), filas_por_bloque):
+        bloque = df_riesgos.iloc[inicio:inicio + filas_por_bloque].copy()
+        if "Impactos Detallados" in bloque:
+            # Diccionario de severidades como JSON: legible en cualquier formato de destino
+            bloque["Impactos Detallados"] = [json.dumps(d if isinstance(d, dict) else {}, ensure_ascii=False) for d in bloque["Impactos Detallados"]]
+        yield bloque
+
+def _bloques_muestras(perdidas_agg, riesgo_residual_agg, sim_data_per_risk, filas_por_bloque):
+    """Tabla ancha: una fila por iteración, columnas agregadas y una por riesgo y factor."""
+    columnas = {'perdida_usd_agg': perdidas_agg, 'riesgo_residual_agg': riesgo_residual_agg}
+    for nombre_riesgo, datos in (sim_data_per_risk or {}).items():
+        for clave, valores in datos.items():
+            columnas[f"{nombre_riesgo} | {clave}"] = valores
+    iteraciones = len(perdidas_agg)
+    for inicio in range(0, iteraciones, filas_por_bloque):
+        fin = min(inicio + filas_por_bloque, iteraciones)
+        bloque = {'iteracion': np.arange(inicio, fin, dtype=np.int64)}
+        # Las vistas del almacén de muestras (float32/memmap) se recortan sin copia
+        bloque.update({columna: np.asarray(valores[inicio:fin]) for columna, valores in columnas.items()})
+        yield pd.DataFrame(bloque)
+
+# --- Escritura ---
+
+def _escribir_bloques(bloques, destino, formato):
+    """Escribe los bloques en `destino` y devuelve el formato usado (CSV si falta pyarrow)."""
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+    if formato != 'csv' and not pyarrow_disponible():
+        formato = 'csv'
+
+    if formato == 'csv':
+        with open(destino, 'w', encoding='utf-8', newline='') as f:
+            for i, bloque in enumerate(bloques):
+                bloque.to_csv(f, index=False, header=(i == 0))
+        return formato
+
+    import pyarrow as pa
+    escritor, esquema = None, None
+    try:
+        for bloque in bloques:
+            tabla = pa.Table.from_pandas(bloque, preserve_index=False, schema=esquema) # Mismo esquema en todos los bloques
+            if escritor is None:
+                esquema = tabla.schema
+                if formato == 'parquet':
+                    import pyarrow.parquet as pq
+                    escritor = pq.ParquetWriter(destino, esquema)
+                else:
+                    escritor = pa.ipc.new_file(destino, esquema)
+            escritor.write_table(tabla)
+    finally:
+        if escritor is not None: escritor.close()
+    return formato
+
+def exportar_registro(df_riesgos, destino, formato='parquet', filas_por_bloque=FILAS_POR_BLOQUE_EXPORTACION):
+    """Exporta el registro de riesgos (DataFrame) a `destino`. Devuelve el formato usado."""
+    return _escribir_bloques(_bloques_registro(df_riesgos, filas_por_bloque), destino, formato)
+
+def exportar_muestras(perdidas_agg, riesgo_residual_agg, sim_data_per_risk, destino, formato='parquet',
+                      filas_por_bloque=FILAS_POR_BLOQUE_EXPORTACION):
+    """Exporta las muestras agregadas y por riesgo de una simulación a `destino`. Devuelve el formato usado."""
+    return _escribir_bloques(_bloques_muestras(perdidas_agg, riesgo_residual_agg, sim_data_per_risk, filas_por_bloque), destino, formato)
+
+def exportar_a_bytes(funcion_exportacion, *args, formato='parquet', **kwargs):
+    """
+    Ejecuta una función de exportación sobre un archivo temporal y devuelve su contenido,
+    para botones de descarga.
+
+    Returns:
+        tuple: (contenido en bytes, formato usado, extensión, tipo MIME).
+    """
+    descriptor, ruta = tempfile.mkstemp(suffix=".export")
+    os.close(descriptor)
+    try:
+        formato_usado = funcion_exportacion(*args, destino=ruta, formato=formato, **kwargs)
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+    finally:
+        os.remove(ruta)
+    extension, mime = FORMATOS_EXPORTACION[formato_usado]
+    return contenido, formato_usado, extension, mime
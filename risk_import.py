@@ -0,0 +1,163 @@
+# modules/risk_import.py
+"""
+Importación masiva de registros de riesgos desde CSV o Parquet. El archivo se lee por
+bloques; cada bloque se normaliza (clasificaciones a factores), se valida de forma
+vectorizada, se puntúa con `calcular_criticidad_batch` y se agrega al registro.
+Las filas inválidas se descartan y se informan sin detener la importación.
+"""
+import numpy as np
+import pandas as pd
+
+from modules.calculations import (matriz_probabilidad_vals, factor_exposicion_vals, calcular_criticidad_batch,
+                                  clasificar_criticidad_vectorizado, obtener_indice_impactos)
+
+# --- Constantes ---
+TAMANO_BLOQUE_IMPORTACION = 5000
+COLUMNAS_OBLIGATORIAS_IMPORTACION = ["Nombre del Riesgo", "Probabilidad", "Exposición",
+                                     "Efectividad del Control (%)", "Min Loss USD", "Max Loss USD"]
+VALORES_SI = {"sí", "si", "yes", "true", "1", "1.0"}
+
+# --- Lectura por Bloques ---
+
+def _formato_archivo(origen, formato=None):
+    if formato: return formato.lower()
+    nombre = str(getattr(origen, 'name', origen)).lower()
+    return 'parquet' if nombre.endswith(('.parquet', '.pq')) else 'csv'
+
+def _leer_bloques(origen, formato, tamano_bloque):
+    """Genera DataFrames de hasta `tamano_bloque` filas."""
+    if formato == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            # Sin pyarrow, pandas lee el archivo completo (p. ej. con fastparquet) y se trocea en memoria
+            df = pd.read_parquet(origen)
+            for inicio in range(0, len(df), tamano_bloque):
+                yield df.iloc[inicio:inicio + tamano_bloque]
+            return
+        for lote in pq.ParquetFile(origen).iter_batches(batch_size=tamano_bloque):
+            yield lote.to_pandas()
+    elif formato == 'csv':
+        yield from pd.read_csv(origen, chunksize=tamano_bloque)
+    else:
+        raise ValueError(f"Formato de importación no soportado: {formato}")
+
+# --- Normalización y Validación ---
+
+def _factor(serie, mapeo):
+    """Clasificación (según `mapeo`) o valor numérico (0-1) a factor; NaN si no es válido."""
+    mapeados = serie.map(mapeo)
+    numericos = pd.to_numeric(serie, errors='coerce')
+    return mapeados.fillna(numericos.where((numericos >= 0) & (numericos <= 1))).to_numpy(dtype=float)
+
+def _matriz_severidades_importacion(df_bloque):
+    """
+    Severidades por tipo de impacto: columnas con el nombre de un tipo de `tabla_tipo_impacto_global`
+    o, si no hay, el par 'Tipo de Impacto' / 'Impacto Numérico'. NaN = tipo no evaluado.
+    """
+    indice = obtener_indice_impactos()
+    tipos = [col for col in df_bloque.columns if col in indice.codigos]
+    if tipos:
+        return df_bloque[tipos].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float), tipos
+    matriz = np.full((len(df_bloque), len(indice.tipos)), np.nan)
+    if "Tipo de Impacto" in df_bloque and "Impacto Numérico" in df_bloque:
+        codigos = indice.codificar(df_bloque["Tipo de Impacto"].astype(str))
+        conocidos = np.flatnonzero(codigos >= 0)
+        matriz[conocidos, codigos[conocidos]] = pd.to_numeric(df_bloque["Impacto Numérico"], errors='coerce').to_numpy(dtype=float)[conocidos]
+    return matriz, list(indice.tipos)
+
+def preparar_bloque(df_bloque, idioma="es"):
+    """
+    Normaliza, valida y puntúa un bloque del archivo de importación.
+
+    Returns:
+        tuple: (df_valido, errores) donde `df_valido` tiene las columnas del registro y
+               `errores` es una lista de (posición en el bloque, mensaje).
+    """
+    faltantes = [col for col in COLUMNAS_OBLIGATORIAS_IMPORTACION if col not in df_bloque.columns]
+    if faltantes:
+        return pd.DataFrame(), [(i, f"Faltan columnas: {', '.join(faltantes)}") for i in range(len(df_bloque))]
+
+    df_bloque = df_bloque.reset_index(drop=True)
+    nombres = df_bloque["Nombre del Riesgo"].fillna("").astype(str).str.strip()
+    probabilidad = _factor(df_bloque["Probabilidad"], matriz_probabilidad_vals)
+    exposicion = _factor(df_bloque["Exposición"], factor_exposicion_vals)
+    efectividad = pd.to_numeric(df_bloque["Efectividad del Control (%)"], errors='coerce').to_numpy(dtype=float)
+    min_loss = pd.to_numeric(df_bloque["Min Loss USD"], errors='coerce').to_numpy(dtype=float)
+    max_loss = pd.to_numeric(df_bloque["Max Loss USD"], errors='coerce').to_numpy(dtype=float)
+    deliberada = (df_bloque["Amenaza Deliberada"].astype(str).str.strip().str.lower().isin(VALORES_SI).to_numpy()
+                  if "Amenaza Deliberada" in df_bloque else np.zeros(len(df_bloque), dtype=bool))
+    severidades, tipos = _matriz_severidades_importacion(df_bloque)
+    evaluadas = ~np.isnan(severidades)
+
+    # Reglas de validación: (máscara de filas inválidas, mensaje)
+    reglas = [
+        (nombres.eq("").to_numpy(), "Nombre del riesgo vacío"),
+        (np.isnan(probabilidad), "Probabilidad no reconocida"),
+        (np.isnan(exposicion), "Exposición no reconocida"),
+        (~((efectividad >= 0) & (efectividad <= 100)), "Efectividad del control fuera de 0-100"),
+        (np.isnan(min_loss) | np.isnan(max_loss) | (min_loss < 0), "Rango de pérdidas no numérico o negativo"),
+        (min_loss > max_loss, "Min Loss USD mayor que Max Loss USD"),
+        (~evaluadas.any(axis=1), "Sin severidad de impacto válida para un tipo conocido"),
+        (np.any(evaluadas & ((severidades < 0) | (severidades > 100)), axis=1), "Severidad de impacto fuera de 0-100"),
+    ]
+    errores = [(int(i), mensaje) for mascara, mensaje in reglas for i in np.flatnonzero(mascara)]
+    validas = ~np.logical_or.reduce([mascara for mascara, _ in reglas])
+    if not validas.any(): return pd.DataFrame(), errores
+
+    severidades_validas = severidades[validas]
+    metricas = calcular_criticidad_batch(probabilidad[validas], exposicion[validas], deliberada[validas].astype(float),
+                                         efectividad[validas], np.nan_to_num(severidades_validas), tipos_impacto=tipos)
+    _, clasificaciones, colores = clasificar_criticidad_vectorizado(metricas['Riesgo Residual'].to_numpy(), idioma)
+    evaluadas_validas = evaluadas[validas]
+
+    df_valido = pd.DataFrame({
+        "Nombre del Riesgo": nombres[validas].to_numpy(),
+        "Probabilidad": probabilidad[validas], "Exposición": exposicion[validas],
+        "Impacto Numérico": np.nanmax(severidades_validas, axis=1),
+        "Efectividad del Control (%)": efectividad[validas],
+        "Amenaza Deliberada": np.where(deliberada[validas], "Sí", "No"),
+        "Min Loss USD": min_loss[validas], "Max Loss USD": max_loss[validas],
+        "Impactos Detallados": [{tipo: float(valor) for tipo, valor, evaluado in zip(tipos, fila, mascara) if evaluado}
+                                for fila, mascara in zip(severidades_validas, evaluadas_validas)],
+        "Clasificación": clasificaciones, "Color": colores
+    })
+    for col in ["Descripción", "Tipo de Impacto", "Perfil", "Categoria", "Subcategoria"]:
+        if col in df_bloque: df_valido[col] = df_bloque[col].fillna("").astype(str).to_numpy()[validas]
+    # Sin 'Tipo de Impacto' la ponderación del motor sería 0: se usa el tipo de mayor severidad evaluada
+    tipo_dominante = np.asarray(tipos, dtype=object)[np.nanargmax(severidades_validas, axis=1)]
+    if "Tipo de Impacto" in df_valido:
+        df_valido["Tipo de Impacto"] = np.where(df_valido["Tipo de Impacto"].str.strip().eq("").to_numpy(), tipo_dominante, df_valido["Tipo de Impacto"].to_numpy())
+    else:
+        df_valido["Tipo de Impacto"] = tipo_dominante
+    for col, valores in metricas.items():
+        df_valido[col] = valores.to_numpy()
+    return df_valido, errores
+
+# --- Importación ---
+
+def importar_registro(origen, registro, formato=None, tamano_bloque=TAMANO_BLOQUE_IMPORTACION, idioma="es"):
+    """
+    Importa un archivo CSV o Parquet al registro de riesgos, bloque a bloque.
+
+    Args:
+        origen: Ruta o archivo abierto (p. ej. el resultado de `st.file_uploader`).
+        registro (RegistroRiesgos): Registro al que se agregan los riesgos válidos.
+        formato (str, opcional): 'csv' o 'parquet'; por defecto se deduce de la extensión.
+
+    Returns:
+        dict: {'importados': número de riesgos agregados,
+               'errores': DataFrame con 'Fila' (1 = primera fila de datos) y 'Error'}.
+    """
+    importados, errores = 0, []
+    fila_inicial = 0
+    try:
+        for df_bloque in _leer_bloques(origen, _formato_archivo(origen, formato), tamano_bloque):
+            df_valido, errores_bloque = preparar_bloque(df_bloque, idioma)
+            errores.extend((fila_inicial + posicion + 1, mensaje) for posicion, mensaje in errores_bloque)
+            importados += len(registro.agregar_lote(df_valido))
+            fila_inicial += len(df_bloque)
+    except Exception as e:
+        print(f"Error en importar_registro: {e}")
+        errores.append((fila_inicial + 1, f"Lectura interrumpida: {e}"))
+    return {'importados': importados, 'errores': pd.DataFrame(errores, columns=['Fila', 'Error']).sort_values('Fila', kind='stable').reset_index(drop=True)}
@@ -0,0 +1,95 @@
+# modules/risk_metrics.py
+"""
+Este módulo calcula las métricas de riesgo de una distribución de pérdidas simulada
+(media, desviación, percentiles, VaR y CVaR a varios niveles, máximo) con una sola
+partición de las muestras, y las devuelve en un resultado tipado compartido por el
+dashboard y las exportaciones.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+import numpy as np
+
+NIVELES_COLA = (0.90, 0.95, 0.99, 0.995) # Niveles de confianza de VaR/CVaR
+PERCENTILES_METRICAS = (5, 50, 90) # Percentiles (0-100) mostrados en el dashboard
+
+@dataclass(frozen=True)
+class MetricasRiesgo:
+    """Métricas de riesgo de una muestra de pérdidas."""
+    n: int
+    media: float
+    desviacion: float
+    minimo: float
+    maximo: float
+    percentiles: Dict[float, float] = field(default_factory=dict) # percentil (0-100) -> valor
+    var: Dict[float, float] = field(default_factory=dict) # nivel (0-1) -> VaR
+    cvar: Dict[float, float] = field(default_factory=dict) # nivel (0-1) -> CVaR (media de la cola)
+
+    @property
+    def mediana(self):
+        return self.percentiles.get(50, np.nan)
+
+    def como_diccionario(self):
+        """Diccionario plano con las claves del dashboard ('media', 'mediana', 'p5', 'p90', 'max', 'cvar95', ...)."""
+        metricas = {'iteraciones': self.n, 'media': self.media, 'desviacion': self.desviacion,
+                    'min': self.minimo, 'max': self.maximo, 'mediana': self.mediana}
+        metricas.update({f"p{percentil:g}": valor for percentil, valor in self.percentiles.items()})
+        metricas.update({f"var{nivel * 100:g}": valor for nivel, valor in self.var.items()})
+        metricas.update({f"cvar{nivel * 100:g}": valor for nivel, valor in self.cvar.items()})
+        return metricas
+
+    def tabla_colas(self):
+        """Filas (nivel, VaR, CVaR) ordenadas por nivel, para tablas y exportaciones."""
+        return [(nivel, self.var[nivel], self.cvar[nivel]) for nivel in sorted(self.var)]
+
+def _indices_percentil(n, q):
+    """Posiciones (inferior, superior, fracción) de la interpolación lineal de `np.percentile`."""
+    posicion = (n - 1) * q
+    inferior = int(np.floor(posicion))
+    return inferior, min(inferior + 1, n - 1), posicion - inferior
+
+def calcular_metricas_riesgo(perdidas, niveles_cola: Tuple[float, ...] = NIVELES_COLA,
+                             percentiles: Tuple[float, ...] = PERCENTILES_METRICAS):
+    """
+    Calcula las métricas de riesgo con una única llamada a `np.partition` sobre todos los
+    estadísticos de orden necesarios (sin ordenar el array completo).
+
+    - Percentiles y VaR usan la interpolación lineal de `np.percentile`.
+    - CVaR al nivel `alpha` es la media de las muestras desde la posición floor(n * alpha)
+      de la muestra ordenada (igual que el cálculo previo del dashboard).
+
+    Args:
+        perdidas (array-like): Muestras de pérdida.
+        niveles_cola (tuple): Niveles (0-1) de VaR/CVaR.
+        percentiles (tuple): Percentiles (0-100) adicionales.
+
+    Returns:
+        MetricasRiesgo o None si no hay muestras.
+    """
+    perdidas = np.asarray(perdidas).ravel() # Conserva float32 (p. ej. vistas del almacén de muestras)
+    if not np.issubdtype(perdidas.dtype, np.floating): perdidas = perdidas.astype(float)
+    n = perdidas.size
+    if n == 0: return None
+
+    posiciones_percentil = {q: _indices_percentil(n, q / 100) for q in percentiles}
+    posiciones_var = {nivel: _indices_percentil(n, nivel) for nivel in niveles_cola}
+    inicios_cola = {nivel: min(int(np.floor(n * nivel)), n - 1) for nivel in niveles_cola}
+    kth = {0, n - 1} | set(inicios_cola.values())
+    for inferior, superior, _ in list(posiciones_percentil.values()) + list(posiciones_var.values()):
+        kth.update((inferior, superior))
+    particion = np.partition(perdidas, sorted(kth))
+
+    def interpolar(posicion):
+        inferior, superior, fraccion = posicion
+        return float(particion[inferior] + (particion[superior] - particion[inferior]) * fraccion)
+
+    media = float(particion.mean(dtype=np.float64))
+    return MetricasRiesgo(
+        n=n, media=media,
+        desviacion=float(np.sqrt(np.sum((particion - media) ** 2, dtype=np.float64) / (n - 1))) if n > 1 else 0.0,
+        minimo=float(particion[0]), maximo=float(particion[-1]),
+        percentiles={q: interpolar(posicion) for q, posicion in posiciones_percentil.items()},
+        var={nivel: interpolar(posicion) for nivel, posicion in posiciones_var.items()},
+        # Tras la partición, las posiciones >= inicio contienen exactamente la cola superior
+        cvar={nivel: float(particion[inicio:].mean(dtype=np.float64)) for nivel, inicio in inicios_cola.items()}
+    )
@@ -0,0 +1,364 @@
+# modules/risk_register.py
+"""
+Almacén columnar del registro de riesgos. Guarda cada campo en arrays tipados
+preasignados con crecimiento amortizado, indexa las filas por ID para actualizaciones
+O(1) y mantiene las severidades de impacto en una matriz compacta aparte.
+Exporta a DataFrame bajo demanda (con caché por versión) y mantiene de forma
+incremental los agregados del dashboard.
+"""
+from bisect import bisect_left, insort
+
+import numpy as np
+import pandas as pd
+
+from modules import data_config
+from modules.data_config import criticidad_límites
+from modules.calculations import (clasificar_criticidad_vectorizado, celdas_mapa_calor,
+                                  BORDES_IMPACTO_MAPA_CALOR)
+
+# --- Esquema del Registro ---
+COLUMNAS_REGISTRO = [
+    "ID", "Nombre del Riesgo", "Descripción", "Tipo de Impacto",
+    "Probabilidad", "Exposición", "Impacto Numérico",
+    "Efectividad del Control (%)", "Amenaza Deliberada",
+    "Min Loss USD", "Max Loss USD",
+    "Perfil", "Categoria", "Subcategoria",
+    "Impactos Detallados",
+    "Amenaza Inherente", "Amenaza Residual", "Amenaza Residual Ajustada",
+    "Riesgo Residual", "Clasificación", "Color"
+]
+COLUMNAS_NUMERICAS = ["Probabilidad", "Exposición", "Impacto Numérico", "Efectividad del Control (%)",
+                      "Min Loss USD", "Max Loss USD", "Amenaza Inherente", "Amenaza Residual",
+                      "Amenaza Residual Ajustada", "Riesgo Residual"]
+COLUMNAS_TEXTO = ["Nombre del Riesgo", "Descripción", "Tipo de Impacto", "Perfil", "Categoria",
+                  "Subcategoria", "Clasificación", "Color"]
+CAPACIDAD_INICIAL_REGISTRO = 64
+
+# --- Agregados Incrementales del Dashboard ---
+class AgregadosPortafolio:
+    """
+    Agregados del portafolio que se actualizan en cada alta, edición o baja de un riesgo:
+    conteos por clase de criticidad, suma del riesgo residual (para la media), sumas y
+    conteos por celda del mapa de calor y un índice ordenado por riesgo residual para el Pareto.
+    El coste de consultarlos depende del número de clases/celdas, no del tamaño del registro.
+    """
+    def __init__(self):
+        self.forma_mapa = (len(data_config.matriz_probabilidad), len(BORDES_IMPACTO_MAPA_CALOR) + 1)
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.n = 0
+        self.suma_riesgo = 0.0
+        self.conteos_clase = np.zeros(len(criticidad_límites) + 1, dtype=np.int64) # Última posición = DESCONOCIDO
+        self.sumas_celda = np.zeros(self.forma_mapa[0] * self.forma_mapa[1])
+        self.conteos_celda = np.zeros(self.forma_mapa[0] * self.forma_mapa[1], dtype=np.int64)
+        self._orden_pareto = [] # (-riesgo residual, ID), ascendente = mayor riesgo primero
+
+    def _aplicar(self, id_riesgo, riesgo_residual, probabilidad, impacto, signo):
+        codigo = clasificar_criticidad_vectorizado([riesgo_residual])[0][0]
+        celda = celdas_mapa_calor([probabilidad], [impacto])[0]
+        self.n += signo
+        self.suma_riesgo += signo * riesgo_residual
+        self.conteos_clase[codigo] += signo # codigo -1 = DESCONOCIDO
+        if celda >= 0:
+            self.sumas_celda[celda] += signo * riesgo_residual
+            self.conteos_celda[celda] += signo
+        clave = (-riesgo_residual, id_riesgo)
+        if signo > 0: insort(self._orden_pareto, clave)
+        else:
+            posicion = bisect_left(self._orden_pareto, clave)
+            if posicion < len(self._orden_pareto) and self._orden_pareto[posicion] == clave: del self._orden_pareto[posicion]
+
+    def sumar_lote(self, ids, riesgos_residuales, probabilidades, impactos):
+        """Incorpora un lote de riesgos nuevos con operaciones vectorizadas."""
+        riesgos_residuales = np.asarray(riesgos_residuales, dtype=float)
+        self.n += len(riesgos_residuales)
+        self.suma_riesgo += float(riesgos_residuales.sum())
+        codigos = clasificar_criticidad_vectorizado(riesgos_residuales)[0]
+        self.conteos_clase += np.bincount(np.where(codigos < 0, len(criticidad_límites), codigos), minlength=len(criticidad_límites) + 1)
+        celdas = celdas_mapa_calor(probabilidades, impactos)
+        validas = celdas >= 0
+        self.sumas_celda += np.bincount(celdas[validas], weights=riesgos_residuales[validas], minlength=self.sumas_celda.size)
+        self.conteos_celda += np.bincount(celdas[validas], minlength=self.conteos_celda.size)
+        # Timsort fusiona en tiempo lineal las dos secuencias ya ordenadas
+        self._orden_pareto.extend(sorted(zip((-riesgos_residuales).tolist(), np.asarray(ids).tolist())))
+        self._orden_pareto.sort()
+
+    def sumar(self, id_riesgo, riesgo_residual, probabilidad, impacto):
+        self._aplicar(id_riesgo, riesgo_residual, probabilidad, impacto, 1)
+
+    def restar(self, id_riesgo, riesgo_residual, probabilidad, impacto):
+        self._aplicar(id_riesgo, riesgo_residual, probabilidad, impacto, -1)
+
+    def reconstruir(self, ids, riesgos_residuales, probabilidades, impactos):
+        """Recalcula todos los agregados de una vez (elimina la deriva de las sumas incrementales)."""
+        self.reiniciar()
+        riesgos_residuales = np.asarray(riesgos_residuales, dtype=float)
+        self.n = len(riesgos_residuales)
+        self.suma_riesgo = float(riesgos_residuales.sum())
+        codigos = clasificar_criticidad_vectorizado(riesgos_residuales)[0]
+        self.conteos_clase = np.bincount(np.where(codigos < 0, len(criticidad_límites), codigos), minlength=len(criticidad_límites) + 1)
+        celdas = celdas_mapa_calor(probabilidades, impactos)
+        validas = celdas >= 0
+        self.sumas_celda = np.bincount(celdas[validas], weights=riesgos_residuales[validas], minlength=self.sumas_celda.size)
+        self.conteos_celda = np.bincount(celdas[validas], minlength=self.conteos_celda.size)
+        self._orden_pareto = sorted(zip((-riesgos_residuales).tolist(), np.asarray(ids).tolist()))
+
+    # --- Consultas ---
+    def riesgo_promedio(self):
+        return self.suma_riesgo / self.n if self.n > 0 else 0.0
+
+    def distribucion_clasificacion(self, idioma="es"):
+        """Número de riesgos por clase de criticidad (incluye DESCONOCIDO solo si hay alguno)."""
+        etiquetas = [limite[2] if idioma == "es" else limite[4] for limite in criticidad_límites]
+        conteos = pd.Series(self.conteos_clase[:-1], index=etiquetas, name="Riesgos")
+        if self.conteos_clase[-1] > 0: conteos["DESCONOCIDO"] = self.conteos_clase[-1]
+        return conteos
+
+    def celdas_mapa_calor(self):
+        """Sumas y conteos del riesgo residual por celda, como matrices (probabilidad x impacto)."""
+        return self.sumas_celda.reshape(self.forma_mapa).copy(), self.conteos_celda.reshape(self.forma_mapa).copy()
+
+    def orden_pareto(self, limite=None):
+        """IDs ordenados de mayor a menor riesgo residual (los `limite` primeros si se indica)."""
+        claves = self._orden_pareto if limite is None else self._orden_pareto[:limite]
+        return [id_riesgo for _, id_riesgo in claves]
+
+class RegistroRiesgos:
+    """
+    Registro de riesgos en formato columnar.
+
+    - Columnas numéricas en arrays float64, 'Amenaza Deliberada' como bool e IDs como int64.
+    - Altas con crecimiento amortizado (la capacidad se duplica al llenarse).
+    - Actualizaciones y bajas O(1) por ID; las bajas marcan la fila y se compactan por lotes.
+    - 'Impactos Detallados' se guarda en una matriz float32 (filas x tipos de impacto), NaN = no evaluado.
+    """
+    def __init__(self, capacidad_inicial=CAPACIDAD_INICIAL_REGISTRO):
+        self._capacidad = max(1, capacidad_inicial)
+        self._filas = 0 # Filas usadas (incluye filas eliminadas pendientes de compactar)
+        self._ids = np.zeros(self._capacidad, dtype=np.int64)
+        self._activas = np.zeros(self._capacidad, dtype=bool)
+        self._deliberada = np.zeros(self._capacidad, dtype=bool)
+        self._numericas = {col: np.zeros(self._capacidad, dtype=np.float64) for col in COLUMNAS_NUMERICAS}
+        self._texto = {col: np.full(self._capacidad, "", dtype=object) for col in COLUMNAS_TEXTO}
+        self.tipos_impacto = []
+        self._codigos_impacto = {}
+        self._severidades = np.full((self._capacidad, 0), np.nan, dtype=np.float32)
+        self._fila_por_id = {}
+        self._siguiente_id = 1
+        self.version = 0 # Se incrementa en cada cambio
+        self._cache_df = None # (version, DataFrame)
+        self.agregados = AgregadosPortafolio()
+
+    def __len__(self):
+        return len(self._fila_por_id)
+
+    def __contains__(self, id_riesgo):
+        return id_riesgo in self._fila_por_id
+
+    # --- Gestión de Capacidad ---
+    def _asegurar_capacidad(self, filas_necesarias):
+        if filas_necesarias <= self._capacidad: return
+        nueva_capacidad = max(filas_necesarias, 2 * self._capacidad)
+        def crecer(array, relleno):
+            nuevo = np.full((nueva_capacidad,) + array.shape[1:], relleno, dtype=array.dtype)
+            nuevo[:self._filas] = array[:self._filas]
+            return nuevo
+        self._ids = crecer(self._ids, 0)
+        self._activas = crecer(self._activas, False)
+        self._deliberada = crecer(self._deliberada, False)
+        self._numericas = {col: crecer(valores, 0.0) for col, valores in self._numericas.items()}
+        self._texto = {col: crecer(valores, "") for col, valores in self._texto.items()}
+        self._severidades = crecer(self._severidades, np.nan)
+        self._capacidad = nueva_capacidad
+
+    def _codigo_impacto(self, tipo_impacto):
+        """Devuelve la columna de la matriz de severidades para un tipo, agregándola si es nuevo."""
+        if tipo_impacto not in self._codigos_impacto:
+            self._codigos_impacto[tipo_impacto] = len(self.tipos_impacto)
+            self.tipos_impacto.append(tipo_impacto)
+            columna_nueva = np.full((self._capacidad, 1), np.nan, dtype=np.float32)
+            self._severidades = np.hstack([self._severidades, columna_nueva])
+        return self._codigos_impacto[tipo_impacto]
+
+    def _compactar(self):
+        """Elimina físicamente las filas marcadas como borradas, conservando el orden."""
+        activas = np.flatnonzero(self._activas[:self._filas])
+        n = len(activas)
+        self._ids[:n] = self._ids[activas]
+        self._deliberada[:n] = self._deliberada[activas]
+        for valores in list(self._numericas.values()) + list(self._texto.values()):
+            valores[:n] = valores[activas]
+        self._severidades[:n] = self._severidades[activas]
+        self._activas[:n] = True
+        self._activas[n:self._filas] = False
+        self._filas = n
+        self._fila_por_id = {int(id_riesgo): fila for fila, id_riesgo in enumerate(self._ids[:n])}
+        self.agregados.reconstruir(self._ids[:n], self._numericas["Riesgo Residual"][:n],
+                                   self._numericas["Probabilidad"][:n], self._numericas["Impacto Numérico"][:n])
+
+    # --- Operaciones ---
+    def _valores_agregados(self, fila):
+        return (int(self._ids[fila]), float(self._numericas["Riesgo Residual"][fila]),
+                float(self._numericas["Probabilidad"][fila]), float(self._numericas["Impacto Numérico"][fila]))
+
+    def _escribir_fila(self, fila, riesgo):
+        for col in COLUMNAS_NUMERICAS:
+            valor = riesgo.get(col, 0.0)
+            self._numericas[col][fila] = float(valor) if valor not in (None, "") else 0.0
+        for col in COLUMNAS_TEXTO:
+            self._texto[col][fila] = "" if riesgo.get(col) is None else str(riesgo.get(col))
+        deliberada = riesgo.get("Amenaza Deliberada", False)
+        self._deliberada[fila] = deliberada == "Sí" if isinstance(deliberada, str) else bool(deliberada)
+        severidades = riesgo.get("Impactos Detallados") or {}
+        codigos = [self._codigo_impacto(tipo) for tipo in severidades]
+        self._severidades[fila] = np.nan
+        if codigos: self._severidades[fila, codigos] = np.fromiter(severidades.values(), dtype=np.float32, count=len(codigos))
+
+    def agregar(self, riesgo):
+        """Agrega un riesgo (dict con las columnas del registro) y devuelve su ID."""
+        id_riesgo = int(riesgo.get("ID") or self._siguiente_id)
+        if id_riesgo in self._fila_por_id: id_riesgo = self._siguiente_id
+        self._asegurar_capacidad(self._filas + 1)
+        fila = self._filas
+        self._ids[fila] = id_riesgo
+        self._activas[fila] = True
+        self._escribir_fila(fila, riesgo)
+        self._fila_por_id[id_riesgo] = fila
+        self._filas += 1
+        self._siguiente_id = max(self._siguiente_id, id_riesgo + 1)
+        self.agregados.sumar(*self._valores_agregados(fila))
+        self.version += 1
+        return id_riesgo
+
+    def agregar_lote(self, df_riesgos):
+        """
+        Agrega un lote de riesgos (DataFrame con columnas del registro) con escrituras por columna.
+        La columna 'ID' se ignora: se asignan IDs nuevos consecutivos.
+
+        Returns:
+            np.ndarray: IDs asignados, en el orden de las filas.
+        """
+        n = len(df_riesgos)
+        if n == 0: return np.empty(0, dtype=np.int64)
+        ids = np.arange(self._siguiente_id, self._siguiente_id + n, dtype=np.int64)
+        self._asegurar_capacidad(self._filas + n)
+        filas = slice(self._filas, self._filas + n)
+        self._ids[filas] = ids
+        self._activas[filas] = True
+        for col in COLUMNAS_NUMERICAS:
+            self._numericas[col][filas] = pd.to_numeric(df_riesgos[col], errors='coerce').fillna(0.0).to_numpy(dtype=float) if col in df_riesgos else 0.0
+        for col in COLUMNAS_TEXTO:
+            self._texto[col][filas] = df_riesgos[col].fillna("").astype(str).to_numpy(dtype=object) if col in df_riesgos else ""
+        if "Amenaza Deliberada" in df_riesgos:
+            deliberada = df_riesgos["Amenaza Deliberada"]
+            # Solo columnas booleanas (o 0/1) se convierten directamente; el texto ("Sí"/"No", dtype object o str) se compara con "Sí"
+            if pd.api.types.is_bool_dtype(deliberada) or pd.api.types.is_numeric_dtype(deliberada):
+                self._deliberada[filas] = deliberada.fillna(0).astype(bool).to_numpy()
+            else:
+                self._deliberada[filas] = deliberada.astype(str).str.strip().eq("Sí").to_numpy()
+        else:
+            self._deliberada[filas] = False
+        self._severidades[filas] = np.nan
+        if "Impactos Detallados" in df_riesgos:
+            df_severidades = pd.DataFrame([d if isinstance(d, dict) else {} for d in df_riesgos["Impactos Detallados"]])
+            for tipo in df_severidades.columns:
+                codigo = self._codigo_impacto(tipo) # Puede ampliar la matriz: obtenerlo antes de indexar
+                self._severidades[filas, codigo] = df_severidades[tipo].to_numpy(dtype=np.float32)
+
+        self._fila_por_id.update(zip(ids.tolist(), range(self._filas, self._filas + n)))
+        self._filas += n
+        self._siguiente_id += n
+        self.agregados.sumar_lote(ids, self._numericas["Riesgo Residual"][filas], self._numericas["Probabilidad"][filas],
+                                  self._numericas["Impacto Numérico"][filas])
+        self.version += 1
+        return ids
+
+    def actualizar(self, id_riesgo, riesgo):
+        """Reemplaza los campos del riesgo `id_riesgo`. Devuelve False si no existe."""
+        fila = self._fila_por_id.get(id_riesgo)
+        if fila is None: return False
+        self.agregados.restar(*self._valores_agregados(fila))
+        self._escribir_fila(fila, riesgo)
+        self.agregados.sumar(*self._valores_agregados(fila))
+        self.version += 1
+        return True
+
+    def eliminar(self, id_riesgo):
+        """Elimina el riesgo `id_riesgo`. Devuelve False si no existe."""
+        fila = self._fila_por_id.pop(id_riesgo, None)
+        if fila is None: return False
+        self.agregados.restar(*self._valores_agregados(fila))
+        self._activas[fila] = False
+        if self._filas - len(self._fila_por_id) > max(CAPACIDAD_INICIAL_REGISTRO, self._filas // 2):
+            self._compactar()
+        self.version += 1
+        return True
+
+    def obtener(self, id_riesgo):
+        """Devuelve el riesgo `id_riesgo` como diccionario (o None si no existe)."""
+        fila = self._fila_por_id.get(id_riesgo)
+        if fila is None: return None
+        riesgo = {"ID": id_riesgo, "Amenaza Deliberada": "Sí" if self._deliberada[fila] else "No",
+                  "Impactos Detallados": self._impactos_fila(fila)}
+        riesgo.update({col: float(valores[fila]) for col, valores in self._numericas.items()})
+        riesgo.update({col: valores[fila] for col, valores in self._texto.items()})
+        return {col: riesgo[col] for col in COLUMNAS_REGISTRO}
+
+    def _impactos_fila(self, fila):
+        severidades = self._severidades[fila]
+        return {self.tipos_impacto[codigo]: float(severidades[codigo]) for codigo in np.flatnonzero(~np.isnan(severidades))}
+
+    # --- Acceso Columnar y Exportación ---
+    def _filas_activas(self):
+        return np.flatnonzero(self._activas[:self._filas])
+
+    def ids(self):
+        return self._ids[self._filas_activas()]
+
+    def columna(self, nombre):
+        """Devuelve los valores de una columna para los riesgos activos, en orden de alta."""
+        filas = self._filas_activas()
+        if nombre == "ID": return self._ids[filas]
+        if nombre == "Amenaza Deliberada": return np.where(self._deliberada[filas], "Sí", "No")
+        if nombre in self._numericas: return self._numericas[nombre][filas]
+        if nombre in self._texto: return self._texto[nombre][filas]
+        if nombre == "Impactos Detallados": return [self._impactos_fila(fila) for fila in filas]
+        raise KeyError(nombre)
+
+    def principales_pareto(self, limite):
+        """
+        Los `limite` riesgos de mayor riesgo residual, leídos del índice ordenado de `agregados`
+        sin recorrer el registro.
+
+        Returns:
+            tuple: (nombres, riesgos residuales, riesgo residual total, número de riesgos),
+                   el formato de `agregados_pareto` en `create_pareto_chart`.
+        """
+        filas = [self._fila_por_id[id_riesgo] for id_riesgo in self.agregados.orden_pareto(limite)]
+        return (self._texto["Nombre del Riesgo"][filas], self._numericas["Riesgo Residual"][filas],
+                self.agregados.suma_riesgo, self.agregados.n)
+
+    def matriz_severidades(self):
+        """Matriz (riesgos x tipos) de severidades con 0 en los tipos no evaluados, y la lista de tipos."""
+        return np.nan_to_num(self._severidades[self._filas_activas()], nan=0.0), list(self.tipos_impacto)
+
+    def a_dataframe(self):
+        """Exporta el registro a un DataFrame con las columnas de `COLUMNAS_REGISTRO` (caché por versión)."""
+        if self._cache_df is not None and self._cache_df[0] == self.version:
+            return self._cache_df[1]
+        df = pd.DataFrame({col: self.columna(col) for col in COLUMNAS_REGISTRO}, columns=COLUMNAS_REGISTRO)
+        self._cache_df = (self.version, df)
+        return df
+
+    def a_registros(self):
+        """Exporta el registro como lista de diccionarios (equivalente a `to_dict('records')`)."""
+        return self.a_dataframe().to_dict('records')
+
+    @classmethod
+    def desde_dataframe(cls, df_riesgos):
+        """Crea un registro a partir de un DataFrame con columnas del registro."""
+        registro = cls(capacidad_inicial=max(CAPACIDAD_INICIAL_REGISTRO, len(df_riesgos)))
+        for riesgo in df_riesgos.to_dict('records'):
+            registro.agregar(riesgo)
+        return registro
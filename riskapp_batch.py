@@ -0,0 +1,231 @@
+# riskapp_batch.py
+"""
+Ejecución por lotes (sin interfaz) de la evaluación de riesgos: carga uno o varios registros
+(CSV/Parquet), los puntúa, calcula el riesgo máximo teórico según los perfiles, simula cada
+portafolio con Monte Carlo en un pool de procesos y escribe métricas y muestras en disco,
+informando los tiempos de cada etapa.
+
+Uso:
+    python riskapp_batch.py registros/ --perfiles user_profiles.json --salida resultados --iteraciones 100000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from modules.data_config import PERFILES_BASE
+from modules.calculations import (matriz_probabilidad_vals, factor_exposicion_vals, calcular_max_theoretical_risk,
+                                  simular_montecarlo, simular_portafolio, admite_muestras_por_riesgo,
+                                  sensibilidad_resultado, FACTORES_MUESTREADOS_MC)
+from modules.risk_register import RegistroRiesgos
+from modules.risk_import import importar_registro
+from modules.risk_metrics import calcular_metricas_riesgo
+from modules.risk_export import FORMATOS_EXPORTACION, exportar_registro, exportar_muestras
+from modules.sampling import metodo_muestreo_efectivo
+
+EXTENSIONES_REGISTRO = ('.csv', '.parquet', '.pq')
+
+# --- Carga de Entradas ---
+
+def buscar_registros(rutas):
+    """Expande archivos y directorios a la lista ordenada de registros a procesar."""
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            archivos.extend(os.path.join(ruta, nombre) for nombre in sorted(os.listdir(ruta)) if nombre.lower().endswith(EXTENSIONES_REGISTRO))
+        elif os.path.isfile(ruta):
+            archivos.append(ruta)
+        else:
+            print(f"Aviso: no se encontró {ruta}", file=sys.stderr)
+    return archivos
+
+def cargar_archivo_perfiles(ruta):
+    """Carga perfiles desde un JSON ({'perfiles_usuario': {...}} o el diccionario directo); perfiles base si no se indica."""
+    if not ruta: return PERFILES_BASE.copy()
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+        perfiles = datos.get("perfiles_usuario", datos) if isinstance(datos, dict) else None
+        if isinstance(perfiles, dict): return perfiles
+        print(f"Aviso: archivo de perfiles inválido ({ruta}). Usando perfiles base.", file=sys.stderr)
+    except Exception as e:
+        print(f"Aviso: error al leer perfiles ({ruta}): {e}. Usando perfiles base.", file=sys.stderr)
+    return PERFILES_BASE.copy()
+
+# --- Etapas ---
+
+def _riesgos_maximos_teoricos(df_riesgos, perfiles):
+    """Riesgo máximo teórico por riesgo, calculado una vez por combinación distinta de parámetros."""
+    clasificacion_probabilidad = {valor: clave for clave, valor in matriz_probabilidad_vals.items()}
+    clasificacion_exposicion = {valor: clave for clave, valor in factor_exposicion_vals.items()}
+    columnas = ['Probabilidad', 'Exposición', 'Amenaza Deliberada', 'Perfil', 'Categoria']
+    combinaciones = df_riesgos[columnas].drop_duplicates()
+    resultados = {
+        tuple(fila): calcular_max_theoretical_risk(
+            clasificacion_probabilidad.get(fila[0]), clasificacion_exposicion.get(fila[1]), 1 if fila[2] == "Sí" else 0, 0,
+            perfiles.get(fila[3], {}), fila[4])
+        for fila in combinaciones.itertuples(index=False, name=None)
+    }
+    return [resultados[tuple(fila)] for fila in df_riesgos[columnas].itertuples(index=False, name=None)]
+
+def procesar_portafolio(tarea):
+    """
+    Procesa un portafolio completo en un proceso del pool y devuelve su resumen.
+    `tarea` = (ruta del registro, directorio de salida, perfiles, opciones).
+    """
+    ruta, directorio_salida, perfiles, opciones = tarea
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    os.makedirs(directorio_salida, exist_ok=True)
+    tiempos = {}
+    resumen = {'portafolio': nombre, 'registro': ruta, 'tiempos_s': tiempos}
+
+    inicio = time.perf_counter()
+    registro = RegistroRiesgos()
+    resultado_importacion = importar_registro(ruta, registro)
+    df_riesgos = registro.a_dataframe()
+    tiempos['carga_y_puntuacion'] = time.perf_counter() - inicio
+    resumen['riesgos'] = len(df_riesgos)
+    resumen['filas_descartadas'] = len(resultado_importacion['errores'])
+    if not resultado_importacion['errores'].empty:
+        resultado_importacion['errores'].to_csv(os.path.join(directorio_salida, "errores_importacion.csv"), index=False)
+    if df_riesgos.empty:
+        resumen['error'] = "Registro sin riesgos válidos"
+        return resumen
+
+    if {'Perfil', 'Categoria'}.issubset(df_riesgos.columns):
+        inicio = time.perf_counter()
+        df_riesgos = df_riesgos.assign(**{"Riesgo Máximo Teórico": _riesgos_maximos_teoricos(df_riesgos, perfiles)})
+        tiempos['riesgo_teorico'] = time.perf_counter() - inicio
+
+    if not admite_muestras_por_riesgo(len(df_riesgos), opciones['iteraciones']):
+        return _procesar_portafolio_agregado(df_riesgos, directorio_salida, opciones, resumen)
+
+    resumen['metodo_muestreo'] = metodo_muestreo_efectivo(opciones['metodo_muestreo'], FACTORES_MUESTREADOS_MC * len(df_riesgos))
+    inicio = time.perf_counter()
+    registros = df_riesgos.to_dict('records')
+    resultado = simular_montecarlo(registros, opciones['valor_economico'], opciones['iteraciones'],
+                                   metodo_muestreo=resumen['metodo_muestreo'], semilla=opciones['semilla'])
+    riesgo_residual_agg, perdidas_agg, _, sim_data_per_risk = resultado
+    tiempos['simulacion'] = time.perf_counter() - inicio
+    if perdidas_agg is None or len(perdidas_agg) == 0:
+        resumen['error'] = "La simulación no produjo resultados"
+        return resumen
+
+    inicio = time.perf_counter()
+    metricas = calcular_metricas_riesgo(perdidas_agg)
+    resumen['metricas_perdidas'] = metricas.como_diccionario()
+    resumen['riesgo_residual_medio_simulado'] = float(riesgo_residual_agg.mean())
+    tiempos['metricas'] = time.perf_counter() - inicio
+
+    if opciones['sensibilidad']:
+        inicio = time.perf_counter()
+        correlaciones = sensibilidad_resultado(registros, resultado)
+        resumen['principales_factores'] = correlaciones.head(10).to_dict() if correlaciones is not None else {}
+        tiempos['sensibilidad'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    formato = opciones['formato']
+    formato_usado = _escribir_registro(df_riesgos, directorio_salida, formato)
+    if opciones['guardar_muestras']:
+        exportar_muestras(perdidas_agg, riesgo_residual_agg, sim_data_per_risk,
+                          os.path.join(directorio_salida, f"muestras.{FORMATOS_EXPORTACION[formato][0]}"), formato)
+    resumen['formato'] = formato_usado
+    tiempos['escritura'] = time.perf_counter() - inicio # Antes de escribir metricas.json para que lo incluya
+    _escribir_resumen(resumen, directorio_salida)
+    return resumen
+
+def _procesar_portafolio_agregado(df_riesgos, directorio_salida, opciones, resumen):
+    """
+    Portafolios cuyas muestras por riesgo no caben en memoria: simulación por bloques del
+    portafolio (muestreo pseudoaleatorio) que conserva solo los agregados; sin muestras por
+    riesgo ni sensibilidad.
+    """
+    tiempos = resumen['tiempos_s']
+    inicio = time.perf_counter()
+    riesgo_residual_agg, perdidas_agg = simular_portafolio(df_riesgos.to_dict('records'), opciones['valor_economico'],
+                                                           opciones['iteraciones'], semilla=opciones['semilla'])
+    tiempos['simulacion'] = time.perf_counter() - inicio
+    if len(perdidas_agg) == 0:
+        resumen['error'] = "La simulación no produjo resultados"
+        return resumen
+
+    resumen['modo'] = 'portafolio'
+    resumen['metodo_muestreo'] = 'aleatorio'
+    inicio = time.perf_counter()
+    resumen['metricas_perdidas'] = calcular_metricas_riesgo(perdidas_agg).como_diccionario()
+    resumen['riesgo_residual_medio_simulado'] = float(riesgo_residual_agg.mean())
+    tiempos['metricas'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    formato = opciones['formato']
+    resumen['formato'] = _escribir_registro(df_riesgos, directorio_salida, formato)
+    if opciones['guardar_muestras']:
+        exportar_muestras(perdidas_agg, riesgo_residual_agg, None,
+                          os.path.join(directorio_salida, f"muestras.{FORMATOS_EXPORTACION[formato][0]}"), formato)
+    tiempos['escritura'] = time.perf_counter() - inicio # Antes de escribir metricas.json para que lo incluya
+    _escribir_resumen(resumen, directorio_salida)
+    return resumen
+
+def _escribir_registro(df_riesgos, directorio_salida, formato):
+    return exportar_registro(df_riesgos, os.path.join(directorio_salida, f"registro.{FORMATOS_EXPORTACION[formato][0]}"), formato)
+
+def _escribir_resumen(resumen, directorio_salida):
+    with open(os.path.join(directorio_salida, "metricas.json"), 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, indent=4, ensure_ascii=False)
+
+# --- Punto de Entrada ---
+
+def construir_parser():
+    parser = argparse.ArgumentParser(description="Puntuación y simulación Monte Carlo por lotes de registros de riesgos.")
+    parser.add_argument("registros", nargs="+", help="Archivos CSV/Parquet o directorios con registros (un portafolio por archivo).")
+    parser.add_argument("--perfiles", help="Archivo JSON de perfiles (por defecto, los perfiles base).")
+    parser.add_argument("--salida", default="resultados_batch", help="Directorio de salida.")
+    parser.add_argument("--valor-economico", type=float, default=100000.0, help="Valor económico del activo (USD).")
+    parser.add_argument("--iteraciones", type=int, default=10000, help="Iteraciones Monte Carlo por portafolio.")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla de la simulación (reproducible).")
+    parser.add_argument("--muestreo", default="aleatorio", choices=["aleatorio", "sobol", "lhs"], help="Método de muestreo.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos del pool (por defecto, todos los núcleos).")
+    parser.add_argument("--formato", default="parquet", choices=list(FORMATOS_EXPORTACION), help="Formato de los archivos de salida.")
+    parser.add_argument("--sin-muestras", action="store_true", help="No escribir las muestras de la simulación.")
+    parser.add_argument("--sensibilidad", action="store_true", help="Calcular los principales factores (correlación de Spearman).")
+    return parser
+
+def main(argv=None):
+    args = construir_parser().parse_args(argv)
+    inicio_total = time.perf_counter()
+    registros = buscar_registros(args.registros)
+    if not registros:
+        print("No se encontraron registros para procesar.", file=sys.stderr)
+        return 1
+
+    perfiles = cargar_archivo_perfiles(args.perfiles)
+    opciones = {'valor_economico': args.valor_economico, 'iteraciones': args.iteraciones, 'semilla': args.semilla,
+                'metodo_muestreo': args.muestreo, 'formato': args.formato, 'guardar_muestras': not args.sin_muestras,
+                'sensibilidad': args.sensibilidad}
+    tareas = [(ruta, os.path.join(args.salida, os.path.splitext(os.path.basename(ruta))[0]), perfiles, opciones) for ruta in registros]
+
+    if args.procesos == 1 or len(tareas) == 1:
+        resumenes = [procesar_portafolio(tarea) for tarea in tareas]
+    else:
+        with ProcessPoolExecutor(max_workers=args.procesos) as executor:
+            resumenes = list(executor.map(procesar_portafolio, tareas))
+
+    # Informe de tiempos por etapa
+    df_tiempos = pd.DataFrame([{'portafolio': r['portafolio'], 'riesgos': r.get('riesgos', 0), **r['tiempos_s']} for r in resumenes]).fillna(0.0)
+    print(df_tiempos.to_string(index=False, float_format=lambda t: f"{t:.3f}"))
+    tiempo_total = time.perf_counter() - inicio_total
+    print(f"Tiempo total: {tiempo_total:.3f} s")
+    for resumen in resumenes:
+        if 'error' in resumen: print(f"Error en {resumen['portafolio']}: {resumen['error']}", file=sys.stderr)
+
+    os.makedirs(args.salida, exist_ok=True)
+    with open(os.path.join(args.salida, "resumen.json"), 'w', encoding='utf-8') as f:
+        json.dump({'portafolios': resumenes, 'tiempo_total_s': tiempo_total}, f, indent=4, ensure_ascii=False)
+    return 1 if any('error' in resumen for resumen in resumenes) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# modules/sample_store.py
+"""
+Almacén compacto de muestras de simulación por sesión. Guarda las muestras agregadas y
+por riesgo en float32 dentro de un presupuesto de memoria; al superarlo, las nuevas
+muestras se escriben en archivos .npy de un directorio temporal y se leen como mapas
+de memoria, de modo que el resto de la aplicación recibe vistas sin copia.
+"""
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy as np
+
+# --- Constantes ---
+PRESUPUESTO_MB_MUESTRAS = 256 # Memoria máxima por sesión antes de pasar a disco
+DTYPE_MUESTRAS = np.float32
+DIRECTORIO_MUESTRAS = os.environ.get("RISKAPP_SAMPLES_DIR") or None # None = directorio temporal del sistema
+
+class AlmacenMuestras:
+    """
+    Almacén de arrays de muestras con presupuesto de memoria. Los arrays devueltos son de
+    solo lectura: en memoria (float32) o `np.memmap` sobre un .npy temporal.
+    """
+    def __init__(self, presupuesto_mb=PRESUPUESTO_MB_MUESTRAS, directorio=DIRECTORIO_MUESTRAS):
+        self.presupuesto_bytes = int(presupuesto_mb * 1024 * 1024)
+        self.directorio_base = directorio
+        self._directorio = None # Se crea en el primer volcado a disco
+        self._finalizador = None
+        self._arrays = {}
+        self._archivos_creados = 0
+        self.bytes_en_memoria = 0
+        self.bytes_en_disco = 0
+
+    def _directorio_temporal(self):
+        if self._directorio is None:
+            self._directorio = tempfile.mkdtemp(prefix="riskapp_muestras_", dir=self.directorio_base)
+            # Borra los archivos aunque la sesión termine sin llamar a liberar()
+            self._finalizador = weakref.finalize(self, shutil.rmtree, self._directorio, True)
+        return self._directorio
+
+    def guardar(self, nombre, valores):
+        """Guarda `valores` como float32 bajo `nombre` y devuelve la vista almacenada."""
+        valores = np.asarray(valores)
+        if nombre in self._arrays: self.eliminar(nombre)
+        tamano = valores.size * np.dtype(DTYPE_MUESTRAS).itemsize
+        if self.bytes_en_memoria + tamano <= self.presupuesto_bytes:
+            almacenado = valores.astype(DTYPE_MUESTRAS, copy=True)
+            almacenado.flags.writeable = False
+            self.bytes_en_memoria += tamano
+        else:
+            ruta = os.path.join(self._directorio_temporal(), f"muestra_{self._archivos_creados}.npy")
+            self._archivos_creados += 1
+            mapa = np.lib.format.open_memmap(ruta, mode='w+', dtype=DTYPE_MUESTRAS, shape=valores.shape)
+            mapa[...] = valores
+            mapa.flush()
+            del mapa
+            almacenado = np.load(ruta, mmap_mode='r')
+            self.bytes_en_disco += tamano
+        self._arrays[nombre] = almacenado
+        return almacenado
+
+    def obtener(self, nombre):
+        return self._arrays.get(nombre)
+
+    def eliminar(self, nombre):
+        almacenado = self._arrays.pop(nombre, None)
+        if almacenado is None: return
+        if isinstance(almacenado, np.memmap):
+            self.bytes_en_disco -= almacenado.nbytes
+            ruta = almacenado.filename
+            del almacenado
+            try:
+                os.remove(ruta)
+            except OSError as e:
+                print(f"Error al eliminar muestras en disco: {e}")
+        else:
+            self.bytes_en_memoria -= almacenado.nbytes
+
+    def liberar(self):
+        """Elimina todas las muestras (memoria y archivos temporales)."""
+        self._arrays.clear()
+        self.bytes_en_memoria = 0
+        self.bytes_en_disco = 0
+        if self._finalizador is not None:
+            self._finalizador()
+            self._directorio, self._finalizador = None, None
+
+    def guardar_resultado(self, resultado):
+        """
+        Sustituye el contenido del almacén por un resultado de `simular_montecarlo`
+        y lo devuelve con la misma estructura, con las muestras como vistas del almacén.
+        """
+        riesgo_residual_agg, perdidas_agg, correlaciones, sim_data_per_risk = resultado
+        self.liberar()
+        riesgo_residual_agg = self.guardar('riesgo_residual_agg', riesgo_residual_agg)
+        perdidas_agg = self.guardar('perdidas_usd_agg', perdidas_agg)
+        datos_por_riesgo = {}
+        for nombre_riesgo, datos in (sim_data_per_risk or {}).items():
+            datos_por_riesgo[nombre_riesgo] = {clave: self.guardar(f"{nombre_riesgo}/{clave}", valores) for clave, valores in datos.items()}
+        return riesgo_residual_agg, perdidas_agg, correlaciones, datos_por_riesgo
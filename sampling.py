@@ -0,0 +1,151 @@
+# modules/sampling.py
+"""
+Estrategias de muestreo para la simulación Monte Carlo: pseudoaleatorio,
+Sobol aleatorizado (cuasi-Monte Carlo) e Hipercubo Latino. Los métodos de baja
+discrepancia generan uniformes que se convierten a normales mediante la CDF inversa.
+"""
+import warnings
+
+import numpy as np
+from scipy.special import ndtri
+
+# --- Métodos Disponibles ---
+# clave: (etiqueta_es, etiqueta_en)
+METODOS_MUESTREO = {
+    'aleatorio': ('Aleatorio (pseudoaleatorio)', 'Random (pseudo-random)'),
+    'sobol': ('Sobol aleatorizado (cuasi-Monte Carlo)', 'Scrambled Sobol (quasi-Monte Carlo)'),
+    'lhs': ('Hipercubo Latino', 'Latin Hypercube'),
+}
+EPSILON_UNIFORME = 1e-12 # Evita ±inf en la CDF inversa
+DIMENSIONES_MAX_SOBOL = 21201 # Límite de los números de dirección de `scipy.stats.qmc.Sobol`
+MEMORIA_BLOQUE_CUASI_MB = 64 # Uniformes de Sobol materializados a la vez (un bloque de iteraciones)
+
+def etiqueta_metodo_muestreo(metodo, idioma="es"):
+    """Devuelve la etiqueta legible de un método de muestreo."""
+    etiqueta_es, etiqueta_en = METODOS_MUESTREO.get(metodo, (metodo, metodo))
+    return etiqueta_es if idioma == "es" else etiqueta_en
+
+def metodo_muestreo_efectivo(metodo, num_dimensiones):
+    """
+    Método que se usará para `num_dimensiones` dimensiones: Sobol por encima de
+    DIMENSIONES_MAX_SOBOL recurre al muestreo 'aleatorio' (con aviso).
+    """
+    if metodo == 'sobol' and num_dimensiones > DIMENSIONES_MAX_SOBOL:
+        print(f"Aviso: Sobol admite hasta {DIMENSIONES_MAX_SOBOL} dimensiones y se necesitan {num_dimensiones}; "
+              f"se usa muestreo aleatorio.")
+        return 'aleatorio'
+    return metodo
+
+def _validar_dimensiones(metodo, num_dimensiones):
+    if metodo == 'sobol' and num_dimensiones > DIMENSIONES_MAX_SOBOL:
+        raise ValueError(f"Sobol admite hasta {DIMENSIONES_MAX_SOBOL} dimensiones; se pidieron {num_dimensiones} "
+                         f"(use `metodo_muestreo_efectivo` para recurrir al muestreo aleatorio).")
+
+def generar_uniformes(metodo, num_dimensiones, iteraciones, semilla=None):
+    """
+    Genera una matriz (iteraciones x num_dimensiones) de uniformes en (0, 1).
+
+    Args:
+        metodo (str): 'sobol', 'lhs' o 'aleatorio'.
+        semilla: Semilla o `np.random.SeedSequence` para la aleatorización.
+    """
+    _validar_dimensiones(metodo, num_dimensiones)
+    generador = np.random.default_rng(semilla)
+    if metodo in ('sobol', 'lhs'):
+        from scipy.stats import qmc # Carga diferida: el muestreo aleatorio no necesita scipy.stats
+    if metodo == 'sobol':
+        with warnings.catch_warnings():
+            # Sobol avisa cuando `iteraciones` no es potencia de 2; la secuencia sigue siendo válida
+            warnings.simplefilter("ignore", UserWarning)
+            uniformes = qmc.Sobol(num_dimensiones, scramble=True, seed=generador).random(iteraciones)
+    elif metodo == 'lhs':
+        uniformes = qmc.LatinHypercube(num_dimensiones, seed=generador).random(iteraciones)
+    elif metodo == 'aleatorio':
+        uniformes = generador.random((iteraciones, num_dimensiones))
+    else:
+        raise ValueError(f"Método de muestreo desconocido: {metodo}")
+    return np.clip(uniformes, EPSILON_UNIFORME, 1 - EPSILON_UNIFORME)
+
+def _tamano_bloque_sobol(num_dimensiones):
+    """Iteraciones por bloque de Sobol dentro de MEMORIA_BLOQUE_CUASI_MB (potencia de 2: conserva el balance de la secuencia)."""
+    filas = max(1, MEMORIA_BLOQUE_CUASI_MB * 1024 * 1024 // (num_dimensiones * 8))
+    return 1 << (filas.bit_length() - 1)
+
+def _normales_sobol(num_dimensiones, iteraciones, generador):
+    """
+    Normales estándar (num_dimensiones x iteraciones) de una única secuencia de Sobol aleatorizada,
+    generada por bloques consecutivos de iteraciones: los puntos son los mismos que en una sola
+    llamada, sin materializar a la vez todas las uniformes ni su transpuesta.
+    """
+    from scipy.stats import qmc # Carga diferida: el muestreo aleatorio no necesita scipy.stats
+    motor = qmc.Sobol(num_dimensiones, scramble=True, seed=generador)
+    normales = np.empty((num_dimensiones, iteraciones))
+    tamano_bloque = _tamano_bloque_sobol(num_dimensiones)
+    for inicio in range(0, iteraciones, tamano_bloque):
+        fin = min(inicio + tamano_bloque, iteraciones)
+        with warnings.catch_warnings():
+            # Sobol avisa cuando el bloque no es potencia de 2; la secuencia sigue siendo válida
+            warnings.simplefilter("ignore", UserWarning)
+            uniformes = motor.random(fin - inicio)
+        normales[:, inicio:fin] = ndtri(np.clip(uniformes, EPSILON_UNIFORME, 1 - EPSILON_UNIFORME)).T
+    return normales
+
+class GeneradorCuasiAleatorio:
+    """
+    Adaptador con la interfaz `normal(loc, scale, size)` de `np.random.Generator`.
+    Una dimensión por factor y riesgo, un punto de la secuencia por iteración; entrega un factor
+    en cada llamada, en orden. Sobol precalcula las normales de todos los factores por bloques de
+    iteraciones (sus dimensiones forman una única secuencia); en el Hipercubo Latino las dimensiones
+    son independientes y cada factor se genera al pedirlo.
+    """
+    def __init__(self, metodo, num_factores, size, semilla=None):
+        if metodo not in ('sobol', 'lhs'):
+            raise ValueError(f"Método de muestreo cuasi-aleatorio desconocido: {metodo}")
+        self._forma = (size,) if np.isscalar(size) else tuple(size)
+        self._dimensiones_por_factor = int(np.prod(self._forma[:-1], dtype=np.int64))
+        _validar_dimensiones(metodo, num_factores * self._dimensiones_por_factor)
+        self.metodo = metodo
+        self._num_factores = num_factores
+        self._generador = np.random.default_rng(semilla)
+        self._normales = None
+        if metodo == 'sobol':
+            self._normales = _normales_sobol(num_factores * self._dimensiones_por_factor, self._forma[-1],
+                                             self._generador).reshape((num_factores,) + self._forma)
+        self._siguiente = 0
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        if self._siguiente >= self._num_factores:
+            raise RuntimeError("Se agotaron las dimensiones precalculadas del generador cuasi-aleatorio.")
+        if self._normales is not None:
+            normales_estandar = self._normales[self._siguiente]
+        else:
+            uniformes = generar_uniformes('lhs', self._dimensiones_por_factor, self._forma[-1], self._generador)
+            normales_estandar = ndtri(uniformes.T).reshape(self._forma)
+        self._siguiente += 1
+        return loc + scale * normales_estandar
+
+def crear_generador(metodo, num_factores, size, semilla=None):
+    """
+    Crea el generador para un bloque de muestreo: `np.random.Generator` para el método
+    'aleatorio' o un `GeneradorCuasiAleatorio` para 'sobol' y 'lhs'.
+    """
+    if metodo == 'aleatorio':
+        return np.random.default_rng(semilla)
+    return GeneradorCuasiAleatorio(metodo, num_factores, size, semilla)
+
+class GeneradorAntitetico:
+    """
+    Adaptador de variables antitéticas con la interfaz `normal(loc, scale, size)`.
+    Cada llamada genera normales estándar para la mitad de las iteraciones y completa la otra
+    mitad con sus opuestas: la iteración i y la i + mitad forman un par antitético.
+    """
+    def __init__(self, generador):
+        self.generador = generador
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        forma = (size,) if np.isscalar(size) else tuple(size)
+        iteraciones = forma[-1]
+        mitad = (iteraciones + 1) // 2
+        normales_estandar = self.generador.standard_normal(forma[:-1] + (mitad,))
+        normales_estandar = np.concatenate([normales_estandar, -normales_estandar], axis=-1)[..., :iteraciones]
+        return loc + scale * normales_estandar
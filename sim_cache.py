@@ -0,0 +1,199 @@
+# modules/sim_cache.py
+"""
+Caché de resultados de simulación Monte Carlo direccionada por contenido.
+La clave es un hash estable de los registros simulados, los parámetros y la semilla.
+Incluye un nivel en memoria (LRU con presupuesto de tamaño) y un nivel opcional
+en disco con archivos .npz que sobreviven a un reinicio de la aplicación.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from modules.calculations import obtener_indice_impactos
+
+# --- Constantes ---
+VERSION_MOTOR_MC = 3 # Incrementar si cambia el modelo de simulación para invalidar entradas antiguas
+CAMPOS_SIMULACION = ['Nombre del Riesgo', 'Probabilidad', 'Exposición', 'Efectividad del Control (%)',
+                     'Amenaza Deliberada', 'Min Loss USD', 'Max Loss USD', 'Riesgo Residual', 'Tipo de Impacto']
+MEMORIA_MAX_MB_CACHE = 512
+DISCO_MAX_MB_CACHE = 2048
+DIRECTORIO_CACHE_MC = os.environ.get("RISKAPP_SIM_CACHE_DIR") or None # None = sin nivel en disco (se activa con la variable)
+
+def _valor_canonico(valor):
+    """Normaliza un valor para el hash (numéricos como float, el resto como texto)."""
+    if isinstance(valor, (bool, np.bool_)): return bool(valor)
+    if isinstance(valor, (int, float, np.integer, np.floating)): return float(valor)
+    return str(valor)
+
+def clave_simulacion(riesgos_para_simular, valor_economico_global, iteraciones, semilla, **parametros_extra):
+    """
+    Calcula la clave SHA-256 de una simulación a partir de los campos que afectan al resultado.
+    Devuelve None si la semilla es None (resultado no reproducible, no se cachea).
+    """
+    if semilla is None: return None
+    contenido = {
+        'version': VERSION_MOTOR_MC,
+        'riesgos': [[_valor_canonico(riesgo.get(campo, 0.0)) for campo in CAMPOS_SIMULACION] for riesgo in riesgos_para_simular],
+        'ponderaciones': obtener_indice_impactos().como_diccionario(),
+        'valor_economico_global': float(valor_economico_global),
+        'iteraciones': int(iteraciones),
+        'semilla': int(semilla),
+        'extra': {clave: _valor_canonico(valor) for clave, valor in parametros_extra.items()}
+    }
+    return hashlib.sha256(json.dumps(contenido, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+# --- Serialización del resultado de simular_montecarlo ---
+
+def _tamano_resultado(resultado):
+    riesgo_residual_agg, perdidas_agg, _, sim_data_per_risk = resultado
+    tamano = riesgo_residual_agg.nbytes + perdidas_agg.nbytes
+    for datos in (sim_data_per_risk or {}).values():
+        tamano += sum(np.asarray(valores).nbytes for valores in datos.values())
+    return tamano
+
+def _resultado_a_arrays(resultado):
+    riesgo_residual_agg, perdidas_agg, correlaciones, sim_data_per_risk = resultado
+    arrays = {'riesgo_residual_agg': riesgo_residual_agg, 'perdidas_usd_agg': perdidas_agg}
+    if correlaciones is not None:
+        arrays['correlaciones_indice'] = np.array(correlaciones.index, dtype=str)
+        arrays['correlaciones_valores'] = correlaciones.to_numpy(dtype=float)
+    sim_data_per_risk = sim_data_per_risk or {}
+    arrays['nombres_riesgos'] = np.array(list(sim_data_per_risk), dtype=str)
+    for i, datos in enumerate(sim_data_per_risk.values()):
+        arrays[f'claves_{i}'] = np.array(list(datos), dtype=str)
+        for j, valores in enumerate(datos.values()):
+            arrays[f'datos_{i}_{j}'] = np.asarray(valores)
+    return arrays
+
+def _arrays_a_resultado(arrays):
+    correlaciones = None
+    if 'correlaciones_indice' in arrays:
+        correlaciones = pd.Series(arrays['correlaciones_valores'], index=arrays['correlaciones_indice'].tolist(), dtype=float)
+    sim_data_per_risk = {}
+    for i, nombre in enumerate(arrays['nombres_riesgos'].tolist()):
+        claves = arrays[f'claves_{i}'].tolist()
+        sim_data_per_risk[nombre] = {clave: arrays[f'datos_{i}_{j}'] for j, clave in enumerate(claves)}
+    return arrays['riesgo_residual_agg'], arrays['perdidas_usd_agg'], correlaciones, sim_data_per_risk
+
+class CacheSimulaciones:
+    """
+    Caché de dos niveles para resultados de `simular_montecarlo`/`simular_montecarlo_paralelo`.
+    Los resultados devueltos se comparten entre llamadas y no deben modificarse.
+    Las simulaciones sin semilla no se cachean: `clave_simulacion` devuelve None y `obtener`/`guardar`
+    no hacen nada con esa clave. El nivel en disco solo existe si se indica `directorio`
+    (por defecto, la variable de entorno RISKAPP_SIM_CACHE_DIR).
+    """
+    def __init__(self, memoria_max_mb=MEMORIA_MAX_MB_CACHE, directorio=DIRECTORIO_CACHE_MC, disco_max_mb=DISCO_MAX_MB_CACHE):
+        self.memoria_max_bytes = int(memoria_max_mb * 1024 * 1024)
+        self.disco_max_bytes = int(disco_max_mb * 1024 * 1024)
+        self.directorio = directorio or None
+        self._entradas = OrderedDict() # clave -> (resultado, tamaño en bytes)
+        self._bytes_en_memoria = 0
+        self._lock = threading.Lock()
+        if self.directorio: os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.npz")
+
+    def obtener(self, clave):
+        """Devuelve el resultado cacheado para `clave` o None si no existe."""
+        if clave is None: return None
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                return self._entradas[clave][0]
+        if self.directorio and os.path.exists(self._ruta(clave)):
+            try:
+                with np.load(self._ruta(clave), allow_pickle=False) as datos:
+                    resultado = _arrays_a_resultado({nombre: datos[nombre] for nombre in datos.files})
+                os.utime(self._ruta(clave)) # Marca de uso para la expulsión en disco
+                self._guardar_en_memoria(clave, resultado)
+                return resultado
+            except Exception as e:
+                print(f"Error al leer la caché de simulación: {e}")
+        return None
+
+    def guardar(self, clave, resultado):
+        """Guarda un resultado en memoria y, si está habilitado, en disco."""
+        if clave is None: return
+        self._guardar_en_memoria(clave, resultado)
+        if self.directorio:
+            try:
+                self._guardar_en_disco(clave, resultado)
+            except Exception as e:
+                print(f"Error al escribir la caché de simulación: {e}")
+
+    def guardar_sensibilidad(self, clave, correlaciones):
+        """
+        Añade al resultado cacheado de `clave` su sensibilidad, calculada bajo demanda, para que
+        una simulación repetida la reutilice. Sin efecto si el resultado ya no está en memoria.
+        """
+        if clave is None or correlaciones is None: return
+        with self._lock:
+            if clave not in self._entradas: return
+            (riesgo_residual_agg, perdidas_agg, _, sim_data_per_risk), tamano = self._entradas[clave]
+            resultado = (riesgo_residual_agg, perdidas_agg, correlaciones, sim_data_per_risk)
+            self._entradas[clave] = (resultado, tamano)
+        if self.directorio:
+            try:
+                self._guardar_en_disco(clave, resultado)
+            except Exception as e:
+                print(f"Error al escribir la caché de simulación: {e}")
+
+    def _guardar_en_memoria(self, clave, resultado):
+        tamano = _tamano_resultado(resultado)
+        if tamano > self.memoria_max_bytes: return
+        with self._lock:
+            if clave in self._entradas:
+                self._bytes_en_memoria -= self._entradas.pop(clave)[1]
+            self._entradas[clave] = (resultado, tamano)
+            self._bytes_en_memoria += tamano
+            while self._bytes_en_memoria > self.memoria_max_bytes:
+                _, (_, tamano_expulsado) = self._entradas.popitem(last=False)
+                self._bytes_en_memoria -= tamano_expulsado
+
+    def _guardar_en_disco(self, clave, resultado):
+        # Escritura atómica: archivo temporal en el mismo directorio y reemplazo
+        descriptor, ruta_tmp = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                np.savez(f, **_resultado_a_arrays(resultado))
+            os.replace(ruta_tmp, self._ruta(clave))
+        except BaseException:
+            # Sin reemplazo no debe quedar el temporal (p. ej. disco lleno o interrupción)
+            try:
+                os.remove(ruta_tmp)
+            except OSError:
+                pass
+            raise
+
+        archivos = [os.path.join(self.directorio, nombre) for nombre in os.listdir(self.directorio) if nombre.endswith(".npz")]
+        archivos.sort(key=os.path.getmtime)
+        bytes_en_disco = sum(os.path.getsize(ruta) for ruta in archivos)
+        while archivos and bytes_en_disco > self.disco_max_bytes:
+            ruta = archivos.pop(0)
+            bytes_en_disco -= os.path.getsize(ruta)
+            os.remove(ruta)
+
+    def limpiar(self):
+        """Vacía el nivel en memoria."""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes_en_memoria = 0
+
+_cache_global = None
+_lock_cache_global = threading.Lock()
+
+def obtener_cache_simulaciones():
+    """Devuelve la caché compartida por todas las sesiones del proceso (se crea en el primer uso)."""
+    global _cache_global
+    with _lock_cache_global:
+        if _cache_global is None:
+            _cache_global = CacheSimulaciones()
+    return _cache_global
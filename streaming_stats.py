@@ -0,0 +1,167 @@
+# modules/streaming_stats.py
+"""
+Este módulo contiene estimadores en flujo (streaming) para resultados Monte Carlo:
+un sketch t-digest para percentiles y colas de riesgo (CVaR), acumuladores de
+media/desviación e histogramas precalculados con KDE por FFT, de modo que la memoria
+usada y el coste de graficar no dependan del número de iteraciones.
+"""
+import numpy as np
+
+from modules.risk_metrics import MetricasRiesgo, NIVELES_COLA, PERCENTILES_METRICAS
+
+COMPRESION_TDIGEST = 1000 # Mayor compresión = más centroides y más precisión
+NUM_BINS_HISTOGRAMA = 200
+
+# --- Histogramas Precalculados ---
+
+def _ancho_banda_silverman(centros, pesos):
+    """Regla de Silverman calculada sobre datos agrupados (centros de bin ponderados)."""
+    n = pesos.sum()
+    if n <= 1: return 0.0
+    media = np.sum(pesos * centros) / n
+    desviacion = np.sqrt(np.sum(pesos * (centros - media) ** 2) / n)
+    acumulado = np.cumsum(pesos) / n
+    q25, q75 = np.interp([0.25, 0.75], acumulado, centros)
+    dispersion = min(desviacion, (q75 - q25) / 1.34) if q75 > q25 else desviacion
+    return 0.9 * dispersion * n ** (-0.2)
+
+def kde_fft(conteos, ancho_bin, ancho_banda):
+    """
+    KDE gaussiana sobre un histograma: convoluciona los conteos con el núcleo muestreado
+    en la rejilla de bins mediante FFT. Devuelve la densidad en escala de conteos por bin.
+    """
+    conteos = np.asarray(conteos, dtype=float)
+    if ancho_banda <= 0 or ancho_bin <= 0: return conteos.copy()
+    radio = int(min(len(conteos), np.ceil(4 * ancho_banda / ancho_bin)))
+    desplazamientos = np.arange(-radio, radio + 1) * ancho_bin
+    nucleo = np.exp(-0.5 * (desplazamientos / ancho_banda) ** 2)
+    nucleo /= nucleo.sum()
+    longitud = 1 << int(np.ceil(np.log2(len(conteos) + len(nucleo) - 1)))
+    convolucion = np.fft.irfft(np.fft.rfft(conteos, longitud) * np.fft.rfft(nucleo, longitud), longitud)
+    return np.maximum(convolucion[radio:radio + len(conteos)], 0.0)
+
+def histograma_precalculado(datos, num_bins=NUM_BINS_HISTOGRAMA, pesos=None, rango=None):
+    """
+    Agrupa las muestras en `num_bins` bins y calcula su KDE por FFT, para graficar una sola vez
+    el resumen (tamaño fijo) en lugar de las muestras crudas.
+
+    Returns:
+        dict: {'bordes', 'conteos', 'kde', 'n'} o None si no hay datos.
+    """
+    datos = np.asarray(datos).ravel() # Sin copia para vistas float32/memmap
+    if datos.size == 0: return None
+    conteos, bordes = np.histogram(datos, bins=num_bins, weights=pesos, range=rango)
+    centros = (bordes[:-1] + bordes[1:]) / 2
+    ancho_bin = bordes[1] - bordes[0]
+    kde = kde_fft(conteos, ancho_bin, _ancho_banda_silverman(centros, conteos.astype(float)))
+    return {'bordes': bordes, 'conteos': conteos.astype(float), 'kde': kde, 'n': float(conteos.sum())}
+
+class TDigest:
+    """
+    Sketch t-digest (variante por fusión en bloque) para estimar cuantiles y medias
+    de cola sobre un flujo de valores. Cada bloque se fusiona con los centroides
+    existentes usando la función de escala k1, que conserva centroides pequeños en las colas.
+    """
+    def __init__(self, compresion=COMPRESION_TDIGEST):
+        self.compresion = compresion
+        self.medias = np.empty(0)
+        self.pesos = np.empty(0)
+        self.n = 0
+        self.minimo = np.inf
+        self.maximo = -np.inf
+
+    def actualizar(self, valores):
+        """Fusiona un bloque de valores en el sketch."""
+        valores = np.asarray(valores, dtype=float).ravel()
+        if valores.size == 0: return
+        self.n += valores.size
+        self.minimo = min(self.minimo, float(valores.min()))
+        self.maximo = max(self.maximo, float(valores.max()))
+        self._comprimir(np.concatenate([self.medias, valores]), np.concatenate([self.pesos, np.ones(valores.size)]))
+
+    def _comprimir(self, medias, pesos):
+        orden = np.argsort(medias, kind='mergesort')
+        medias, pesos = medias[orden], pesos[orden]
+        total = pesos.sum()
+        q_centro = (np.cumsum(pesos) - pesos / 2) / total
+        k = self.compresion / (2 * np.pi) * np.arcsin(2 * q_centro - 1)
+        grupos = np.floor(k - k[0]).astype(np.int64)
+
+        pesos_grupo = np.bincount(grupos, weights=pesos)
+        sumas_grupo = np.bincount(grupos, weights=pesos * medias)
+        validos = pesos_grupo > 0
+        self.pesos = pesos_grupo[validos]
+        self.medias = sumas_grupo[validos] / self.pesos
+
+    def cuantil(self, q):
+        """Estima el cuantil `q` (0-1, escalar o array) interpolando entre centroides."""
+        if self.n == 0: return np.nan
+        acumulado = np.cumsum(self.pesos)
+        posiciones = np.concatenate([[0.0], acumulado - self.pesos / 2, [acumulado[-1]]])
+        valores = np.concatenate([[self.minimo], self.medias, [self.maximo]])
+        return np.interp(np.asarray(q, dtype=float) * acumulado[-1], posiciones, valores)
+
+    def media_cola(self, alpha=0.95):
+        """Estima la media de la cola superior a partir del cuantil `alpha` (CVaR)."""
+        if self.n == 0: return np.nan
+        acumulado = np.cumsum(self.pesos)
+        umbral = alpha * acumulado[-1]
+        masa_cola = np.clip(acumulado - umbral, 0, self.pesos)
+        if masa_cola.sum() <= 0: return self.maximo
+        return float(np.sum(masa_cola * self.medias) / masa_cola.sum())
+
+    def histograma(self, num_bins=NUM_BINS_HISTOGRAMA):
+        """Histograma aproximado a partir de los centroides (cada uno aporta su peso a su bin)."""
+        if self.n == 0: return None
+        return histograma_precalculado(self.medias, num_bins, pesos=self.pesos, rango=(self.minimo, self.maximo))
+
+class EstadisticasStreaming:
+    """
+    Acumula en flujo las métricas del dashboard Monte Carlo: media, desviación,
+    máximo, percentiles (vía t-digest) y CVaR95, con memoria constante.
+    """
+    def __init__(self, compresion=COMPRESION_TDIGEST):
+        self.digest = TDigest(compresion)
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+
+    def actualizar(self, valores):
+        """Incorpora un bloque de muestras combinando sus momentos con los acumulados."""
+        valores = np.asarray(valores, dtype=float).ravel()
+        if valores.size == 0: return
+        n_bloque = valores.size
+        media_bloque = float(valores.mean())
+        m2_bloque = float(np.sum((valores - media_bloque) ** 2))
+
+        n_total = self.n + n_bloque
+        delta = media_bloque - self.media
+        self.media += delta * n_bloque / n_total
+        self.m2 += m2_bloque + delta ** 2 * self.n * n_bloque / n_total
+        self.n = n_total
+        self.digest.actualizar(valores)
+
+    def resumen(self):
+        """Devuelve un diccionario con las métricas estimadas."""
+        if self.n == 0: return {}
+        p5, mediana, p90 = self.digest.cuantil([0.05, 0.5, 0.90])
+        return {
+            'iteraciones': self.n,
+            'media': self.media,
+            'desviacion': float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else 0.0,
+            'mediana': float(mediana), 'p5': float(p5), 'p90': float(p90),
+            'max': self.digest.maximo,
+            'cvar95': self.digest.media_cola(0.95)
+        }
+
+    def metricas(self, niveles_cola=NIVELES_COLA, percentiles=PERCENTILES_METRICAS):
+        """Métricas estimadas con la misma estructura que `calcular_metricas_riesgo`."""
+        if self.n == 0: return None
+        return MetricasRiesgo(
+            n=self.n, media=self.media,
+            desviacion=float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else 0.0,
+            minimo=self.digest.minimo, maximo=self.digest.maximo,
+            percentiles={q: float(self.digest.cuantil(q / 100)) for q in percentiles},
+            var={nivel: float(self.digest.cuantil(nivel)) for nivel in niveles_cola},
+            cvar={nivel: float(self.digest.media_cola(nivel)) for nivel in niveles_cola}
+        )
@@ -0,0 +1,40 @@
+"""
+Presupuesto de arranque en frío del núcleo de cálculo: importarlo en un proceso nuevo no debe
+cargar la interfaz (streamlit), los gráficos (plotly) ni scipy.stats, y debe tardar menos de
+PRESUPUESTO_IMPORTACION_S.
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import modules
+
+PRESUPUESTO_IMPORTACION_S = 1.5
+MODULOS_NUCLEO = ["modules.data_config", "modules.risk_metrics", "modules.calculations"]
+MODULOS_PROHIBIDOS = ["streamlit", "plotly", "scipy.stats"]
+
+_SCRIPT = """
+import json, sys, time
+inicio = time.perf_counter()
+for nombre in {modulos!r}:
+    __import__(nombre)
+duracion = time.perf_counter() - inicio
+print(json.dumps({{'duracion_s': duracion, 'cargados': [m for m in {prohibidos!r} if m in sys.modules]}}))
+"""
+
+def _importar_en_frio():
+    raiz = str(Path(modules.__path__[0]).parent) # Directorio que contiene el paquete `modules`
+    entorno = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [raiz, os.environ.get("PYTHONPATH")]))}
+    salida = subprocess.run([sys.executable, "-c", _SCRIPT.format(modulos=MODULOS_NUCLEO, prohibidos=MODULOS_PROHIBIDOS)],
+                            cwd=raiz, env=entorno, capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+def test_nucleo_sin_dependencias_de_interfaz():
+    assert _importar_en_frio()['cargados'] == []
+
+def test_nucleo_dentro_del_presupuesto_de_importacion():
+    # Mejor de varios arranques: descarta la variación de la caché de disco en la primera ejecución
+    duracion = min(_importar_en_frio()['duracion_s'] for _ in range(3))
+    assert duracion < PRESUPUESTO_IMPORTACION_S, f"Importar el núcleo tardó {duracion:.2f} s (presupuesto {PRESUPUESTO_IMPORTACION_S} s)"
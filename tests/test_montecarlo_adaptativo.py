@@ -0,0 +1,19 @@
+"""Parada adaptativa: la convergencia se evalúa por debajo del techo de iteraciones."""
+import numpy as np
+
+from modules.calculations import (simular_montecarlo_adaptativo, _errores_relativos_lotes, LOTES_MINIMOS_MC)
+
+RIESGOS = [{"Nombre del Riesgo": f"R{i}", "Probabilidad": 0.5, "Exposición": 0.6, "Efectividad del Control (%)": 50,
+            "Amenaza Deliberada": "No", "Min Loss USD": 1000, "Max Loss USD": 5000,
+            "Impactos Detallados": {"Económico": 60}, "Impacto Numérico": 60} for i in range(10)]
+
+def test_techo_por_defecto_del_dashboard_evalua_convergencia():
+    _, info = simular_montecarlo_adaptativo(RIESGOS, 100000, {'media': 0.05, 'cvar95': 0.05}, iteraciones_max=10000, semilla=7)
+    assert info['lotes'] >= LOTES_MINIMOS_MC
+    assert all(np.isfinite(error) for error in info['errores_relativos'].values())
+    assert info['convergido'] and info['iteraciones'] < 10000
+
+def test_lotes_iguales_equivalen_a_medias_por_lotes():
+    estimaciones = np.random.default_rng(0).random(8) + 1.0
+    error = _errores_relativos_lotes({'media': estimaciones}, [100] * 8)['media']
+    assert np.isclose(error, estimaciones.std(ddof=1) / np.sqrt(8) / estimaciones.mean())
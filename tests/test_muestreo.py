@@ -0,0 +1,28 @@
+"""Muestreo cuasi-aleatorio: generación por bloques y límite de dimensiones de Sobol."""
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy.stats")
+
+from modules import sampling
+from modules.sampling import GeneradorCuasiAleatorio, metodo_muestreo_efectivo, DIMENSIONES_MAX_SOBOL
+
+def test_sobol_por_bloques_reproduce_la_secuencia(monkeypatch):
+    referencia = GeneradorCuasiAleatorio('sobol', 4, (20, 3000), semilla=11)
+    monkeypatch.setattr(sampling, "_tamano_bloque_sobol", lambda num_dimensiones: 128)
+    por_bloques = GeneradorCuasiAleatorio('sobol', 4, (20, 3000), semilla=11)
+    assert all(np.array_equal(referencia.normal(), por_bloques.normal()) for _ in range(4))
+
+def test_hipercubo_latino_estratifica_cada_dimension():
+    from scipy.special import ndtr
+    generador = GeneradorCuasiAleatorio('lhs', 4, (5, 1000), semilla=3)
+    for _ in range(4):
+        estratos = np.sort(np.floor(ndtr(generador.normal()) * 1000), axis=1)
+        assert (estratos == np.arange(1000)).all()
+
+def test_limite_de_dimensiones_de_sobol():
+    num_riesgos = DIMENSIONES_MAX_SOBOL // 4 + 1
+    with pytest.raises(ValueError, match="dimensiones"):
+        GeneradorCuasiAleatorio('sobol', 4, (num_riesgos, 8), semilla=1)
+    assert metodo_muestreo_efectivo('sobol', 4 * num_riesgos) == 'aleatorio'
+    assert metodo_muestreo_efectivo('sobol', 4 * (num_riesgos - 1)) == 'sobol'
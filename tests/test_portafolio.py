@@ -0,0 +1,18 @@
+"""Simulación de portafolio por bloques: reproducible y equivalente a la simulación con muestras por riesgo."""
+import numpy as np
+
+from modules.calculations import simular_portafolio, simular_montecarlo_paralelo, simular_montecarlo_streaming
+
+RIESGOS = [{"Nombre del Riesgo": f"R{i}", "Probabilidad": 0.5, "Exposición": 0.6, "Efectividad del Control (%)": 50,
+            "Amenaza Deliberada": "No", "Min Loss USD": 1000, "Max Loss USD": 5000 * (i + 1),
+            "Impactos Detallados": {"Económico": 60}, "Impacto Numérico": 60} for i in range(6)]
+
+def test_portafolio_coincide_con_la_simulacion_por_riesgo():
+    riesgo_residual, perdidas = simular_portafolio(RIESGOS, 100000, 20000, semilla=5)
+    riesgo_residual_ref, perdidas_ref, _, _ = simular_montecarlo_paralelo(RIESGOS, 100000, 20000, semilla=5, num_procesos=1)
+    assert np.array_equal(perdidas, perdidas_ref) and np.array_equal(riesgo_residual, riesgo_residual_ref)
+
+def test_streaming_reproducible_con_semilla():
+    primero = simular_montecarlo_streaming(RIESGOS, 100000, 5000, semilla=9)
+    segundo = simular_montecarlo_streaming(RIESGOS, 100000, 5000, semilla=9)
+    assert primero['perdidas'] == segundo['perdidas']
@@ -0,0 +1,14 @@
+"""Reducción de varianza: la variable de control del riesgo residual no puede ser el propio estimando."""
+import numpy as np
+
+from modules.calculations import simular_montecarlo_reduccion_varianza
+
+RIESGOS = [{"Nombre del Riesgo": f"R{i}", "Probabilidad": 0.3 + 0.1 * i, "Exposición": 0.6, "Efectividad del Control (%)": 10 * i,
+            "Amenaza Deliberada": "No", "Min Loss USD": 1000, "Max Loss USD": 5000 * (i + 1),
+            "Impactos Detallados": {"Económico": 60}, "Impacto Numérico": 60} for i in range(5)]
+
+def test_control_del_riesgo_residual_no_degenerado():
+    _, informe = simular_montecarlo_reduccion_varianza(RIESGOS, 100000, 20000, semilla=1, antiteticas=False)
+    datos = informe['riesgo_residual']
+    assert 1.0 < datos['factor_reduccion_varianza'] < np.inf
+    assert datos['ic95_crudo'][0] <= datos['estimacion'] <= datos['ic95_crudo'][1]
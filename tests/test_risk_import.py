@@ -0,0 +1,51 @@
+"""Importación de registros: 'Amenaza Deliberada' debe conservarse desde CSV y Parquet."""
+import pandas as pd
+import pytest
+
+from modules.risk_import import importar_registro
+from modules.risk_register import RegistroRiesgos
+
+def _registro_origen():
+    return pd.DataFrame({
+        "Nombre del Riesgo": ["Incendio", "Fraude interno", "Fallo de red"],
+        "Probabilidad": ["Media", "Alta", "Baja"],
+        "Exposición": ["Media", "Baja", "Alta"],
+        "Efectividad del Control (%)": [50, 20, 80],
+        "Min Loss USD": [1000, 500, 100],
+        "Max Loss USD": [5000, 2000, 900],
+        "Amenaza Deliberada": ["No", "Sí", "No"],
+        "Tipo de Impacto": ["Económico", "Económico", "Operacional"],
+        "Impacto Numérico": [60, 40, 30],
+    })
+
+def _importar(ruta):
+    registro = RegistroRiesgos()
+    resultado = importar_registro(ruta, registro)
+    assert resultado['importados'] == 3 and resultado['errores'].empty
+    return registro.a_dataframe()
+
+def test_amenaza_deliberada_desde_csv(tmp_path):
+    ruta = tmp_path / "registro.csv"
+    _registro_origen().to_csv(ruta, index=False)
+    df = _importar(ruta)
+    assert df["Amenaza Deliberada"].tolist() == ["No", "Sí", "No"]
+
+def test_amenaza_deliberada_desde_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    ruta = tmp_path / "registro.parquet"
+    _registro_origen().to_parquet(ruta, index=False)
+    df = _importar(ruta)
+    assert df["Amenaza Deliberada"].tolist() == ["No", "Sí", "No"]
+
+def test_agregar_lote_columna_booleana():
+    df = _registro_origen().assign(**{"Amenaza Deliberada": [False, True, False]})
+    registro = RegistroRiesgos()
+    registro.agregar_lote(df)
+    assert registro.a_dataframe()["Amenaza Deliberada"].tolist() == ["No", "Sí", "No"]
+
+def test_tipo_de_impacto_ausente_usa_el_de_mayor_severidad(tmp_path):
+    ruta = tmp_path / "registro.csv"
+    origen = _registro_origen().drop(columns=["Tipo de Impacto", "Impacto Numérico"])
+    origen.assign(**{"Económico": [60, 10, 0], "Operacional": [20, 40, 30]}).to_csv(ruta, index=False)
+    df = _importar(ruta)
+    assert df["Tipo de Impacto"].tolist() == ["Económico", "Operacional", "Operacional"]
@@ -0,0 +1,24 @@
+"""Sensibilidad bajo demanda: la simulación no calcula rangos; se obtienen del resultado al pedirlos."""
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy.stats")
+
+from modules.calculations import simular_montecarlo, sensibilidad_resultado
+
+RIESGOS = [{"Nombre del Riesgo": f"R{i}", "Probabilidad": 0.5, "Exposición": 0.6, "Efectividad del Control (%)": 50,
+            "Amenaza Deliberada": "No", "Min Loss USD": 1000, "Max Loss USD": 5000 * (i + 1),
+            "Impactos Detallados": {"Económico": 60}, "Impacto Numérico": 60} for i in range(5)]
+
+def test_simulacion_sin_sensibilidad_en_el_camino_critico():
+    resultado = simular_montecarlo(RIESGOS, 100000, 4000, semilla=3)
+    assert resultado[2] is None
+    correlaciones = sensibilidad_resultado(RIESGOS, resultado)
+    assert len(correlaciones) == 4 * len(RIESGOS)
+    assert correlaciones.index[0] == "5. R4 - Pérdida" # El rango de pérdida más amplio domina
+
+def test_submuestra_acotada_aproxima_la_sensibilidad_completa():
+    resultado = simular_montecarlo(RIESGOS, 100000, 8000, semilla=3)
+    completa = sensibilidad_resultado(RIESGOS, resultado, iteraciones_max=8000)
+    submuestra = sensibilidad_resultado(RIESGOS, resultado, iteraciones_max=2000)
+    assert np.abs(submuestra - completa.reindex(submuestra.index)).max() < 0.1
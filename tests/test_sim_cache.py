@@ -0,0 +1,30 @@
+"""Caché de simulaciones: nivel en disco opcional y escritura atómica sin temporales huérfanos."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules import sim_cache
+from modules.sim_cache import CacheSimulaciones
+
+def _resultado():
+    perdidas = np.arange(8, dtype=float)
+    return perdidas / 10, perdidas, pd.Series([0.5], index=["1. R - Pérdida"]), {"Riesgo 1 (R)": {"loss_0": perdidas}}
+
+def test_sin_directorio_no_hay_nivel_en_disco(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    cache = CacheSimulaciones()
+    cache.guardar("clave", _resultado())
+    assert cache.directorio is None and list(tmp_path.iterdir()) == []
+
+def test_fallo_al_escribir_no_deja_temporales(monkeypatch, tmp_path):
+    cache = CacheSimulaciones(directorio=str(tmp_path))
+    def savez_fallido(*args, **kwargs): raise OSError("disco lleno")
+    monkeypatch.setattr(sim_cache.np, "savez", savez_fallido)
+    with pytest.raises(OSError):
+        cache._guardar_en_disco("clave", _resultado())
+    assert list(tmp_path.iterdir()) == []
+
+def test_resultado_persistido_en_disco(tmp_path):
+    CacheSimulaciones(directorio=str(tmp_path)).guardar("clave", _resultado())
+    _, perdidas, correlaciones, _ = CacheSimulaciones(directorio=str(tmp_path)).obtener("clave")
+    assert np.array_equal(perdidas, np.arange(8)) and correlaciones.iloc[0] == 0.5
@@ -10,7 +10,8 @@ import json
 import os
 from modules.data_config import criticidad_límites, PERFILES_BASE # Importar datos necesarios
 from modules.data_config import matriz_probabilidad_vals, factor_exposicion_vals # Mapeos
-from modules.data_config import textos # Diccionario de textos generales
+from modules.localization import traducir # Tablas de textos precompiladas por idioma
+from modules.calculations import clasificar_criticidad_vectorizado
 
 # --- Funciones de Utilidad para la UI ---
 
@@ -37,11 +38,10 @@ def reset_form_fields():
 def format_risk_dataframe(df_risks, idioma="es"):
     """Formatea el DataFrame de riesgos aplicando colores a la columna 'Riesgo Residual'."""
     if df_risks.empty: return df_risks
-    def get_color(val):
-        for v_min, v_max, _, color, _ in criticidad_límites:
-            if v_min <= val <= v_max: return f'background-color: {color};'
-        return ''
-    styled_df = df_risks.style.applymap(get_color, subset=['Riesgo Residual'])
+    def get_colors(column):
+        codigos, _, colores = clasificar_criticidad_vectorizado(pd.to_numeric(column, errors='coerce'), idioma)
+        return [f'background-color: {color};' if codigo >= 0 else '' for codigo, color in zip(codigos, colores)]
+    styled_df = df_risks.style.apply(get_colors, subset=['Riesgo Residual'])
     return styled_df
 
 # --- Funciones para Gestión de Perfiles (deben estar definidas o importadas) ---
@@ -54,19 +54,9 @@ def get_text(key, context="app"):
     """
     Obtiene el texto traducido.
     Contexto: 'app' para textos generales, 'hierarchy' para perfiles, categorías, subcategorías.
+    Las búsquedas usan las tablas precompiladas por idioma de `modules.localization`.
     """
-    lang = st.session_state.get('idioma', 'es')
-    
-    if context == "app":
-        return textos.get(lang, {}).get(key, key)
-    elif context == "hierarchy":
-        # Acceder a HIERARCHY_TRANSLATIONS importado desde data_config
-        try:
-            from modules.data_config import HIERARCHY_TRANSLATIONS # Asegura la importación
-            return HIERARCHY_TRANSLATIONS.get(lang, {}).get(key, HIERARCHY_TRANSLATIONS.get('es', {}).get(key, key))
-        except ImportError:
-            return key # Fallback si no se importa
-    return key # Fallback general
+    return traducir(key, st.session_state.get('idioma', 'es'), context)
 
 def render_impact_sliders(profile_data, selected_category, current_severities_state, idioma="es"):
     """